@@ -0,0 +1,23 @@
+import pytest
+
+
+class Clock:
+    """
+    A clock which only moves when a test moves it, or sleeps on it
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock() -> Clock:
+    return Clock()
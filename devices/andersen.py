@@ -1,17 +1,75 @@
 import andersen_ev
+import asyncio
 import datetime as dt
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from metrics import span
+
+from .ratelimit import RateLimiter, Unlimited
+
+
+class AndersenAccount:
+    """
+    An authenticated andersen_ev client, shared by every charger on the
+    same account
+    """
+
+    # Cognito tokens issued to the Andersen API last an hour; re-authenticate
+    # a little before that rather than waiting for a request to fail
+    TOKEN_LIFETIME = dt.timedelta(minutes=55)
+
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        client: andersen_ev.AndersenA2 | None = None,
+    ):
+        self._username = username
+        self._password = password
+        self._a2 = client or andersen_ev.AndersenA2()
+        self._authenticated_at: dt.datetime | None = None
+        self._device_ids: dict[str, str] = {}
+
+    def client(self) -> andersen_ev.AndersenA2:
+        now = dt.datetime.now()
+        if (
+            self._authenticated_at is None
+            or now - self._authenticated_at > self.TOKEN_LIFETIME
+        ):
+            logging.info("authenticating with Andersen API")
+            self._a2.authenticate(self._username, self._password)
+            self._authenticated_at = now
+        return self._a2
+
+    def device_id(self, device_name: str) -> str:
+        if device_name not in self._device_ids:
+            device = self.client().device_by_name(device_name)
+            self._device_ids[device_name] = device["id"]
+        return self._device_ids[device_name]
 
 
 class AndersenA2:
-    def __init__(self, username: str, password: str, device_name: str):
-        self._a2 = andersen_ev.AndersenA2()
-        self._a2.authenticate(username, password)
-        self._device = self._a2.device_by_name(device_name)
-        self._deviceId = self._device["id"]
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        device_name: str,
+        account: AndersenAccount | None = None,
+    ):
+        self._device_name = device_name
+        self._account = account or AndersenAccount(username, password)
+        self._a2: andersen_ev.AndersenA2 | None = None
+        self._deviceId: str | None = None
+
+    def _connect(self):
+        self._a2 = self._account.client()
+        self._deviceId = self._account.device_id(self._device_name)
 
     def get_solar_override(self) -> bool:
         try:
+            self._connect()
             solar = self._a2.get_device_solar(self._deviceId)
             start_str = (
                 solar.get("getDevice", {})
@@ -26,20 +84,32 @@ class AndersenA2:
             logging.error(f"failed to fetch solar override: {e}")
             return False
 
-    def get_max_grid_charge_percent(self):
+    def get_max_grid_charge_percent(self) -> int | None:
+        """
+        None if the charger could not be read
+        """
         try:
+            self._connect()
             status = self._a2.get_device_status(self._deviceId)
             return int(status.get("deviceStatus", {}).get("solarMaxGridChargePercent"))
         except Exception as e:
             logging.error(f"failed to fetch max grid charge: {e}")
-            return 0
+            return None
 
-    def set_charge_from_grid(self, charge_from_grid: bool):
-        current_charge_from_grid = self.get_max_grid_charge_percent() == 100
+    def get_charge_from_grid(self) -> bool | None:
+        percent = self.get_max_grid_charge_percent()
+        return None if percent is None else percent == 100
+
+    def set_charge_from_grid(
+        self, charge_from_grid: bool, current_charge_from_grid: bool | None = None
+    ):
+        if current_charge_from_grid is None:
+            current_charge_from_grid = self.get_charge_from_grid()
         if charge_from_grid == current_charge_from_grid:
             logging.info(f"set_charge_from_grid {charge_from_grid} already set")
             return
         try:
+            self._connect()
             override = self.get_solar_override()
             logging.info(f"set_charge_from_grid {charge_from_grid} override={override}")
             self._a2.set_solar(
@@ -50,6 +120,97 @@ class AndersenA2:
             )
         except Exception as e:
             logging.error(f"failed to set charge mode: {e}")
+            raise
+
+
+class AsyncAndersenA2:
+    """
+    Runs the blocking andersen_ev calls of an AndersenA2 on a worker thread
+    so they never stall the event loop. Chargers on the same account share
+    a single worker, which keeps the calls to their client serialised.
+    """
+
+    def __init__(
+        self,
+        a2: AndersenA2,
+        executor: ThreadPoolExecutor | None = None,
+        rate_limiter: RateLimiter | Unlimited | None = None,
+    ):
+        self._a2 = a2
+        self._executor = executor or ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="andersen"
+        )
+        self._rate_limiter = rate_limiter or Unlimited()
+
+    async def _run(self, name: str, fn, *args):
+        loop = asyncio.get_running_loop()
+        async with self._rate_limiter:
+            with span(name):
+                return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def get_max_grid_charge_percent(self) -> int | None:
+        return await self._run(
+            "andersen.get_max_grid_charge_percent", self._a2.get_max_grid_charge_percent
+        )
+
+    async def get_charge_from_grid(self) -> bool | None:
+        return await self._run(
+            "andersen.get_charge_from_grid", self._a2.get_charge_from_grid
+        )
+
+    async def set_charge_from_grid(
+        self, charge_from_grid: bool, current_charge_from_grid: bool | None = None
+    ):
+        await self._run(
+            "andersen.set_charge_from_grid",
+            self._a2.set_charge_from_grid,
+            charge_from_grid,
+            current_charge_from_grid,
+        )
+
+
+class AndersenConnection:
+    """
+    Hands out chargers which share one authenticated client and one worker
+    thread per Andersen account, and one rate limit across all accounts
+    """
+
+    def __init__(
+        self,
+        rate_limiter: RateLimiter | Unlimited | None = None,
+        client_factory: Callable[[], andersen_ev.AndersenA2] = andersen_ev.AndersenA2,
+    ):
+        self._rate_limiter = rate_limiter or Unlimited()
+        # one client per account; load tests pass a stand-in for the API
+        self._client_factory = client_factory
+        self._accounts: dict[tuple[str, str], AndersenAccount] = {}
+        self._executors: dict[tuple[str, str], ThreadPoolExecutor] = {}
+        self._chargers: dict[tuple[str, str, str], AsyncAndersenA2] = {}
+
+    def get_charger(
+        self, username: str, password: str, device_name: str
+    ) -> AsyncAndersenA2:
+        key = (username, password)
+        charger = self._chargers.get((*key, device_name))
+        if charger is None:
+            if key not in self._accounts:
+                self._accounts[key] = AndersenAccount(
+                    username, password, self._client_factory()
+                )
+                self._executors[key] = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="andersen"
+                )
+            charger = AsyncAndersenA2(
+                AndersenA2(username, password, device_name, self._accounts[key]),
+                self._executors[key],
+                self._rate_limiter,
+            )
+            self._chargers[(*key, device_name)] = charger
+        return charger
+
+    def close(self):
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
 
 
 if __name__ == "__main__":
@@ -65,4 +226,3 @@ if __name__ == "__main__":
     )
     enable = "on" in sys.argv
     a2.set_charge_from_grid(enable)
-
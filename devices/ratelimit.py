@@ -0,0 +1,59 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+
+class RateLimiter:
+    """
+    Token bucket limiting the rate of requests to one API provider. A single
+    limiter is shared by every vehicle or charger using that provider, so
+    the fleet as a whole stays within the provider's quota.
+    """
+
+    def __init__(
+        self,
+        rate_per_minute: float,
+        burst: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ):
+        self._rate = rate_per_minute / 60
+        self._burst = burst
+        self._tokens = float(burst)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(
+            self._burst, self._tokens + (now - self._updated) * self._rate
+        )
+        self._updated = now
+
+    async def acquire(self):
+        # the lock makes waiters queue up in order rather than racing
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await self._sleep((1 - self._tokens) / self._rate)
+                self._refill()
+            self._tokens -= 1
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class Unlimited:
+    async def acquire(self):
+        pass
+
+    async def __aenter__(self):
+        pass
+
+    async def __aexit__(self, *exc):
+        return False
@@ -0,0 +1,63 @@
+import datetime as dt
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Known(Generic[T]):
+    state: T
+    checked_at: dt.datetime
+
+
+class Reconciler:
+    """
+    Remembers the state last applied to each device, so that a device is only
+    written to when its desired state differs from it. Every drift_interval
+    the real state is read back instead, to catch changes made elsewhere
+    (by the app, or by the device itself).
+    """
+
+    def __init__(self, drift_interval: dt.timedelta = dt.timedelta(hours=1)):
+        self._drift_interval = drift_interval
+        self._known: dict[str, _Known[Any]] = {}
+
+    def forget(self, device: str):
+        self._known.pop(device, None)
+
+    async def reconcile(
+        self,
+        device: str,
+        desired: T,
+        read: Callable[[], Awaitable[T | None]],
+        write: Callable[[T, T | None], Awaitable[None]],
+        now: dt.datetime,
+    ) -> bool:
+        """
+        Bring a device to the desired state. The write callback is given the
+        desired state and the device's current state (None if that couldn't
+        be read), so it can send only the commands which differ. Returns
+        True if anything was written.
+        """
+        known = self._known.get(device)
+        if known is not None and now - known.checked_at < self._drift_interval:
+            current, checked_at = known.state, known.checked_at
+        else:
+            current, checked_at = await read(), now
+
+        if current == desired:
+            logging.info(f"{device} already in state {desired}")
+            self._known[device] = _Known(desired, checked_at)
+            return False
+
+        logging.info(f"{device} changing from {current} to {desired}")
+        try:
+            await write(desired, current)
+        except Exception:
+            # the device may be in any state now, so read it next time
+            self.forget(device)
+            raise
+        self._known[device] = _Known(desired, checked_at)
+        return True
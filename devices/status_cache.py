@@ -0,0 +1,139 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+
+@dataclass
+class _Entry:
+    value: Any
+    fetched_at: float
+
+
+class StatusCache:
+    """
+    A cache of vehicle readings, kept in a JSON file so that it survives
+    restarts. A reading older than its ttl is fetched again and waited for.
+    Callers which only report a reading, and don't decide anything from it,
+    may pass stale_ok to have it returned straight away while a fresh one is
+    fetched in the background; even they wait for one older than max_stale.
+    Values must be JSON serialisable.
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        max_stale: float = 12 * 3600,
+        clock: Callable[[], float] = time.time,
+    ):
+        self._path = path
+        self._max_stale = max_stale
+        self._clock = clock
+        self._entries: dict[str, _Entry] = {}
+        self._fetching: dict[str, asyncio.Task] = {}
+        self._saving: asyncio.Task | None = None
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        if self._path is None or not os.path.exists(self._path):
+            return
+        try:
+            with open(self._path) as f:
+                data = json.load(f)
+            self._entries = {key: _Entry(**entry) for key, entry in data.items()}
+        except Exception as e:
+            logging.warning(f"ignoring unreadable status cache {self._path}: {e}")
+
+    def _write(self, data: dict):
+        # write then rename, so a crash never leaves a half-written file
+        tmp = f"{self._path}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self._path)
+        except OSError as e:
+            logging.warning(f"failed to write status cache {self._path}: {e}")
+
+    def _snapshot(self) -> dict:
+        return {key: vars(entry).copy() for key, entry in self._entries.items()}
+
+    async def _write_while_dirty(self):
+        # changes made during a write are picked up by the next one, so
+        # there is never more than one write in flight
+        while self._dirty:
+            self._dirty = False
+            await asyncio.to_thread(self._write, self._snapshot())
+
+    def _save(self):
+        if self._path is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(self._snapshot())
+            return
+        self._dirty = True
+        if self._saving is None or self._saving.done():
+            self._saving = loop.create_task(self._write_while_dirty())
+
+    def put(self, key: str, value: Any):
+        self._entries[key] = _Entry(value, self._clock())
+        self._save()
+
+    def invalidate(self, key: str):
+        if self._entries.pop(key, None) is not None:
+            self._save()
+
+    def _fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        # one fetch of a key at a time, shared by everyone asking for it
+        task = self._fetching.get(key)
+        if task is None:
+
+            async def run():
+                try:
+                    value = await fetch()
+                    self.put(key, value)
+                    return value
+                finally:
+                    del self._fetching[key]
+
+            task = asyncio.create_task(run())
+            self._fetching[key] = task
+        return task
+
+    def _refresh(self, key: str, fetch: Callable[[], Awaitable[Any]]):
+        def done(task: asyncio.Task):
+            if not task.cancelled() and task.exception() is not None:
+                logging.warning(
+                    f"background refresh of {key} failed: {task.exception()}"
+                )
+
+        self._fetch(key, fetch).add_done_callback(done)
+
+    async def get(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        ttl: float,
+        stale_ok: bool = False,
+    ) -> Any:
+        entry = self._entries.get(key)
+        age = None if entry is None else self._clock() - entry.fetched_at
+        if age is None or age > self._max_stale or (age > ttl and not stale_ok):
+            # shielded so that one cancelled caller doesn't cancel the others
+            return await asyncio.shield(self._fetch(key, fetch))
+        if age > ttl:
+            self._refresh(key, fetch)
+        return entry.value
+
+    async def close(self):
+        """
+        Wait for any fetches and writes still in flight
+        """
+        await asyncio.gather(*self._fetching.values(), return_exceptions=True)
+        if self._saving is not None:
+            await self._saving
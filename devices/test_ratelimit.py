@@ -0,0 +1,30 @@
+import pytest
+from .ratelimit import RateLimiter
+
+
+@pytest.mark.asyncio
+async def test_burst_is_not_delayed(clock):
+    limiter = RateLimiter(60, burst=3, clock=clock, sleep=clock.sleep)
+    for _ in range(3):
+        await limiter.acquire()
+    assert clock.sleeps == []
+
+
+@pytest.mark.asyncio
+async def test_requests_beyond_burst_are_spaced_at_rate(clock):
+    limiter = RateLimiter(30, burst=1, clock=clock, sleep=clock.sleep)
+    for _ in range(3):
+        async with limiter:
+            pass
+    assert clock.now == pytest.approx(4.0)
+
+
+@pytest.mark.asyncio
+async def test_tokens_refill_while_idle(clock):
+    limiter = RateLimiter(60, burst=2, clock=clock, sleep=clock.sleep)
+    await limiter.acquire()
+    await limiter.acquire()
+    clock.now += 10
+    await limiter.acquire()
+    await limiter.acquire()
+    assert clock.sleeps == []
@@ -0,0 +1,78 @@
+import datetime as dt
+import pytest
+from .reconciler import Reconciler
+
+NOW = dt.datetime(2024, 7, 28, 0, 0)
+
+
+class FakeDevice:
+    def __init__(self, state):
+        self.state = state
+        self.reads = 0
+        self.writes = []
+
+    async def read(self):
+        self.reads += 1
+        return self.state
+
+    async def write(self, desired, current):
+        self.writes.append((desired, current))
+        self.state = desired
+
+
+@pytest.mark.asyncio
+async def test_first_reconcile_reads_and_writes_if_different():
+    device = FakeDevice(False)
+    reconciler = Reconciler()
+    assert await reconciler.reconcile("a2", True, device.read, device.write, NOW)
+    assert device.reads == 1
+    assert device.writes == [(True, False)]
+
+
+@pytest.mark.asyncio
+async def test_unchanged_desired_state_sends_nothing():
+    device = FakeDevice(False)
+    reconciler = Reconciler()
+    await reconciler.reconcile("a2", True, device.read, device.write, NOW)
+    later = NOW + dt.timedelta(minutes=15)
+    assert not await reconciler.reconcile("a2", True, device.read, device.write, later)
+    assert device.reads == 1
+    assert len(device.writes) == 1
+
+
+@pytest.mark.asyncio
+async def test_changed_desired_state_is_written_without_reading():
+    device = FakeDevice(False)
+    reconciler = Reconciler()
+    await reconciler.reconcile("a2", True, device.read, device.write, NOW)
+    later = NOW + dt.timedelta(minutes=15)
+    assert await reconciler.reconcile("a2", False, device.read, device.write, later)
+    assert device.reads == 1
+    assert device.writes[-1] == (False, True)
+
+
+@pytest.mark.asyncio
+async def test_drift_is_detected_after_interval():
+    device = FakeDevice(False)
+    reconciler = Reconciler(drift_interval=dt.timedelta(hours=1))
+    await reconciler.reconcile("a2", True, device.read, device.write, NOW)
+    device.state = False
+    later = NOW + dt.timedelta(minutes=30)
+    assert not await reconciler.reconcile("a2", True, device.read, device.write, later)
+    later = NOW + dt.timedelta(hours=1)
+    assert await reconciler.reconcile("a2", True, device.read, device.write, later)
+    assert device.reads == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_write_forgets_device_state():
+    device = FakeDevice(False)
+    reconciler = Reconciler()
+
+    async def fail(desired, current):
+        raise RuntimeError("offline")
+
+    with pytest.raises(RuntimeError):
+        await reconciler.reconcile("a2", True, device.read, fail, NOW)
+    await reconciler.reconcile("a2", True, device.read, device.write, NOW)
+    assert device.reads == 2
@@ -0,0 +1,117 @@
+import asyncio
+import pytest
+from .status_cache import StatusCache
+
+
+class Source:
+    def __init__(self):
+        self.value = 50
+        self.fetches = 0
+
+    async def fetch(self):
+        self.fetches += 1
+        return self.value
+
+
+@pytest.mark.asyncio
+async def test_fresh_reading_is_served_from_cache(clock):
+    source = Source()
+    cache = StatusCache(clock=clock)
+    assert await cache.get("zoe/battery", source.fetch, ttl=60) == 50
+    source.value = 60
+    clock.now += 30
+    assert await cache.get("zoe/battery", source.fetch, ttl=60) == 50
+    assert source.fetches == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_reading_is_served_while_refreshing(clock):
+    source = Source()
+    cache = StatusCache(clock=clock)
+    await cache.get("zoe/battery", source.fetch, ttl=60)
+    source.value = 60
+    clock.now += 120
+    assert await cache.get("zoe/battery", source.fetch, 60, stale_ok=True) == 50
+    assert await cache.get("zoe/battery", source.fetch, 60, stale_ok=True) == 50
+    await cache.close()
+    assert source.fetches == 2
+    assert await cache.get("zoe/battery", source.fetch, ttl=60) == 60
+
+
+@pytest.mark.asyncio
+async def test_reading_older_than_ttl_is_waited_for(clock):
+    source = Source()
+    cache = StatusCache(clock=clock)
+    await cache.get("zoe/battery", source.fetch, ttl=60)
+    source.value = 60
+    clock.now += 61
+    assert await cache.get("zoe/battery", source.fetch, ttl=60) == 60
+
+
+@pytest.mark.asyncio
+async def test_reading_older_than_max_stale_is_waited_for(clock):
+    source = Source()
+    cache = StatusCache(max_stale=3600, clock=clock)
+    await cache.get("zoe/battery", source.fetch, ttl=60)
+    source.value = 60
+    clock.now += 3601
+    assert await cache.get("zoe/battery", source.fetch, 60, stale_ok=True) == 60
+
+
+@pytest.mark.asyncio
+async def test_concurrent_readers_share_one_fetch(clock):
+    source = Source()
+    cache = StatusCache(clock=clock)
+    results = await asyncio.gather(
+        cache.get("zoe/battery", source.fetch, ttl=60),
+        cache.get("zoe/battery", source.fetch, ttl=60),
+    )
+    assert results == [50, 50]
+    assert source.fetches == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_keeps_stale_reading(clock):
+    source = Source()
+    cache = StatusCache(clock=clock)
+    await cache.get("zoe/battery", source.fetch, ttl=60)
+    clock.now += 120
+
+    async def fail():
+        raise Exception("timeout")
+
+    assert await cache.get("zoe/battery", fail, 60, stale_ok=True) == 50
+    await cache.close()
+    assert await cache.get("zoe/battery", fail, 60, stale_ok=True) == 50
+
+
+@pytest.mark.asyncio
+async def test_readings_survive_restart(tmp_path, clock):
+    path = str(tmp_path / "status_cache.json")
+    source = Source()
+    cache = StatusCache(path, clock=clock)
+    await cache.get("zoe/battery", source.fetch, ttl=60)
+    # written in the background, and finished by close
+    await cache.close()
+
+    source.value = 60
+    cache = StatusCache(path, clock=clock)
+    assert await cache.get("zoe/battery", source.fetch, ttl=60) == 50
+    assert source.fetches == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidated_reading_is_fetched_again(tmp_path, clock):
+    source = Source()
+    cache = StatusCache(str(tmp_path / "status_cache.json"), clock=clock)
+    await cache.get("zoe/hvac", source.fetch, ttl=60)
+    source.value = 60
+    cache.invalidate("zoe/hvac")
+    assert await cache.get("zoe/hvac", source.fetch, ttl=60) == 60
+
+
+def test_unreadable_file_is_ignored(tmp_path):
+    path = tmp_path / "status_cache.json"
+    path.write_text("{not json")
+    cache = StatusCache(str(path))
+    assert asyncio.run(cache.get("zoe/battery", Source().fetch, ttl=60)) == 50
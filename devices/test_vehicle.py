@@ -0,0 +1,25 @@
+import datetime as dt
+import pytest
+from .vehicle import reading_time
+
+
+def local(utc: dt.datetime) -> dt.datetime:
+    return utc.replace(tzinfo=dt.timezone.utc).astimezone().replace(tzinfo=None)
+
+
+@pytest.mark.parametrize(
+    "timestamp,expect",
+    [
+        ("2024-08-01T09:06:48", dt.datetime(2024, 8, 1, 9, 6, 48)),
+        ("2024-08-01T09:06:48Z", local(dt.datetime(2024, 8, 1, 9, 6, 48))),
+        ("2024-08-01T10:06:48+01:00", local(dt.datetime(2024, 8, 1, 9, 6, 48))),
+    ],
+)
+def test_reading_time(timestamp, expect):
+    assert reading_time(timestamp) == expect
+
+
+@pytest.mark.parametrize("timestamp", [None, "", "not a time"])
+def test_reading_without_a_time_was_taken_now(timestamp):
+    before = dt.datetime.now()
+    assert before <= reading_time(timestamp) <= dt.datetime.now()
@@ -1,11 +1,22 @@
 from aiohttp import ClientSession
 from dataclasses import dataclass
 from datetime import datetime, timedelta
+from renault_api.exceptions import NotAuthenticatedException
+from renault_api.renault_account import RenaultAccount
 from renault_api.renault_client import RenaultClient
 from renault_api.renault_vehicle import RenaultVehicle
 from renault_api.kamereon.models import ChargeSchedule, ChargeDaySchedule
+from typing import Awaitable, Callable, TypeVar
+import asyncio
 import logging
 
+from metrics import retry, span
+
+from .ratelimit import RateLimiter, Unlimited
+from .status_cache import StatusCache
+
+T = TypeVar("T")
+
 
 @dataclass
 class Credentials:
@@ -14,56 +25,248 @@ class Credentials:
     registration: str
 
 
-class Vehicle:
-    def __init__(self, session: ClientSession, credentials: Credentials):
+@dataclass(frozen=True)
+class BatteryStatus:
+    battery_level: int
+    estimated_range: int
+    # when the car took the reading, which may be well before it was fetched
+    read_at: datetime | None = None
+
+
+def reading_time(timestamp: str | None) -> datetime:
+    """
+    The local time of a Kamereon reading's timestamp, or now if it has none
+    """
+    try:
+        read_at = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return datetime.now()
+    if read_at.tzinfo is not None:
+        read_at = read_at.astimezone().replace(tzinfo=None)
+    return read_at
+
+
+@dataclass(frozen=True)
+class ChargeScheduleState:
+    enabled: bool
+    start: str | None = None
+    duration: int | None = None
+
+
+class RenaultLogin:
+    """
+    A login to a Renault account, shared by all the vehicles registered to it.
+    renault_api refreshes the JWT itself; the login only has to be repeated
+    when the Gigya login token expires.
+    """
+
+    def __init__(
+        self,
+        session: ClientSession,
+        username: str,
+        password: str,
+        rate_limiter: RateLimiter | Unlimited | None = None,
+    ):
         self._session = session
-        self._credentials = credentials
-        self._battery = (datetime.fromordinal(1), None)
+        self._username = username
+        self._password = password
+        self.rate_limiter = rate_limiter or Unlimited()
+        self._lock = asyncio.Lock()
+        self._account: RenaultAccount | None = None
 
-    async def connect(self):
+    async def account(self) -> RenaultAccount:
+        async with self._lock:
+            if self._account is None:
+                self._account = await self._login()
+            return self._account
+
+    async def _login(self) -> RenaultAccount:
         client = RenaultClient(websession=self._session, locale="fr_FR")
-        await client.session.login(
-            self._credentials.username, self._credentials.password
-        )
-        person = await client.get_person()
+        async with self.rate_limiter:
+            with span("renault.login"):
+                await client.session.login(self._username, self._password)
+        async with self.rate_limiter:
+            with span("renault.get_person"):
+                person = await client.get_person()
         account_id = next(
             account.accountId
             for account in person.accounts
             if account.accountType == "MYRENAULT"
         )
-        account = await client.get_api_account(account_id)
-        vehicles = await account.get_vehicles()
-        vin = next(
-            vehicle.vin
-            for vehicle in vehicles.vehicleLinks
-            if vehicle.vehicleDetails.registrationNumber
-            == self._credentials.registration
+        return await client.get_api_account(account_id)
+
+    def expire(self, account: RenaultAccount):
+        # several vehicles may notice the expiry at once; only the first
+        # one to do so should cause a new login
+        if self._account is account:
+            self._account = None
+
+
+class Vehicle:
+    def __init__(
+        self,
+        session: ClientSession,
+        credentials: Credentials,
+        login: RenaultLogin | None = None,
+        cache: StatusCache | None = None,
+        battery_ttl: timedelta = timedelta(minutes=15),
+        hvac_ttl: timedelta = timedelta(minutes=5),
+    ):
+        self._credentials = credentials
+        self.login = login or RenaultLogin(
+            session, credentials.username, credentials.password
         )
-        self._vehicle = await account.get_api_vehicle(vin)
+        self._account: RenaultAccount | None = None
+        self._vehicle: RenaultVehicle | None = None
+        self._cache = cache or StatusCache()
+        self._battery_ttl = battery_ttl.total_seconds()
+        self._hvac_ttl = hvac_ttl.total_seconds()
+
+    def _cache_key(self, reading: str) -> str:
+        return f"{self._credentials.registration}/{reading}"
+
+    async def connect(self):
+        """
+        Log in and resolve the VIN. Each step is skipped if it has already
+        been done, so this is cheap to call on every tick.
+        """
+        account = await self.login.account()
+        if self._vehicle is None or account is not self._account:
+            vin = self._vehicle.vin if self._vehicle else None
+            if vin is None:
+                async with self.login.rate_limiter:
+                    with span("renault.get_vehicles"):
+                        vehicles = await account.get_vehicles()
+                vin = next(
+                    vehicle.vin
+                    for vehicle in vehicles.vehicleLinks
+                    if vehicle.vehicleDetails.registrationNumber
+                    == self._credentials.registration
+                )
+                logging.info(f"resolved {self._credentials.registration} to {vin}")
+            self._account = account
+            self._vehicle = await account.get_api_vehicle(vin)
+
+    async def _call(
+        self, name: str, request: Callable[[RenaultVehicle], Awaitable[T]]
+    ) -> T:
+        # name is the span name in full, such as renault.get_hvac_status
+        try:
+            async with self.login.rate_limiter:
+                with span(name):
+                    return await request(self._vehicle)
+        except NotAuthenticatedException:
+            logging.info("Renault login expired, logging in again")
+            retry(name)
+            self.login.expire(self._account)
+            await self.connect()
+            async with self.login.rate_limiter:
+                with span(name):
+                    return await request(self._vehicle)
 
-    async def get_battery_status(self):
-        now = datetime.now()
-        if self._battery[0] + timedelta(minutes=15) < now:
-            self._battery = (now, await self._vehicle.get_battery_status())
-            logging.debug(f"battery: {self._battery[1]}")
-        return self._battery[1]
+    async def _fetch_battery_status(self) -> dict:
+        battery = await self._call(
+            "renault.get_battery_status", lambda v: v.get_battery_status()
+        )
+        logging.debug(f"battery: {battery}")
+        return {
+            "battery_level": battery.batteryLevel,
+            "estimated_range": battery.batteryAutonomy,
+            "read_at": reading_time(battery.timestamp).isoformat(),
+        }
 
-    async def get_hvac_state(self) -> bool:
-        hvac = await self._vehicle.get_hvac_status()
+    async def _fetch_hvac_state(self) -> bool:
+        hvac = await self._call(
+            "renault.get_hvac_status", lambda v: v.get_hvac_status()
+        )
         return hvac == "on"
 
+    async def get_battery_status(self, stale_ok: bool = False) -> BatteryStatus:
+        """
+        The battery reading, fetched again once older than its ttl. The
+        battery endpoint is slow, so callers only reporting the reading may
+        pass stale_ok to take an older one at once, refreshed in the
+        background.
+        """
+        battery = await self._cache.get(
+            self._cache_key("battery"),
+            self._fetch_battery_status,
+            self._battery_ttl,
+            stale_ok,
+        )
+        read_at = battery.get("read_at")
+        return BatteryStatus(
+            battery["battery_level"],
+            battery["estimated_range"],
+            datetime.fromisoformat(read_at) if read_at else None,
+        )
+
+    async def get_hvac_state(self, stale_ok: bool = False) -> bool:
+        return await self._cache.get(
+            self._cache_key("hvac"), self._fetch_hvac_state, self._hvac_ttl, stale_ok
+        )
+
     async def set_hvac_state(self, state: bool, temperature: int):
         if state:
-            await self._vehicle.set_ac_start(temperature=temperature)
+            await self._call(
+                "renault.set_ac_start",
+                lambda v: v.set_ac_start(temperature=temperature),
+            )
         else:
-            await self._vehicle.set_ac_stop()
+            await self._call("renault.set_ac_stop", lambda v: v.set_ac_stop())
+        self._cache.invalidate(self._cache_key("hvac"))
 
     async def enable_charge_schedule(self, enable: bool):
         logging.debug(f"enable_charge_schedule {enable}")
-        await self._vehicle.set_charge_mode(
-            "schedule_mode" if enable else "always_charging"
+        await self._call(
+            "renault.set_charge_mode",
+            lambda v: v.set_charge_mode(
+                "schedule_mode" if enable else "always_charging"
+            ),
+        )
+
+    async def get_charge_schedule_state(self) -> ChargeScheduleState | None:
+        """
+        None if the car could not be read
+        """
+        try:
+            mode, settings = await asyncio.gather(
+                self._call("renault.get_charge_mode", lambda v: v.get_charge_mode()),
+                self._call(
+                    "renault.get_charging_settings",
+                    lambda v: v.get_charging_settings(),
+                ),
+            )
+        except Exception as e:
+            logging.error(f"failed to fetch charge schedule: {e}")
+            return None
+        if mode.chargeMode != "schedule_mode":
+            return ChargeScheduleState(enabled=False)
+        day = next(
+            (s.monday for s in settings.schedules or [] if s.activated and s.monday),
+            None,
+        )
+        if day is None:
+            return ChargeScheduleState(enabled=True)
+        return ChargeScheduleState(
+            enabled=True, start=(day.startTime or "").strip("TZ"), duration=day.duration
         )
 
+    async def set_charge_schedule_state(
+        self, desired: ChargeScheduleState, current: ChargeScheduleState | None
+    ):
+        """
+        Send only the commands needed to move from the current to the
+        desired state
+        """
+        if desired.enabled and (
+            current is None
+            or (current.start, current.duration) != (desired.start, desired.duration)
+        ):
+            await self.set_charge_schedule(desired.start, desired.duration)
+        if current is None or current.enabled != desired.enabled:
+            await self.enable_charge_schedule(desired.enabled)
+
     async def set_charge_schedule(self, start: str, duration: int):
         logging.debug(f"set_charge_schedule {start},{duration}")
         day_schedule = ChargeDaySchedule(
@@ -81,7 +284,71 @@ class Vehicle:
             sunday=day_schedule,
             raw_data={},
         )
-        await self._vehicle.set_charge_schedules([schedule])
+        await self._call(
+            "renault.set_charge_schedules", lambda v: v.set_charge_schedules([schedule])
+        )
+
+
+class VehicleConnection:
+    """
+    Keeps one pooled HTTP session to the Renault API alive across scheduler
+    ticks, shared by every vehicle. Logins are shared by the vehicles on the
+    same account, and each vehicle's VIN is only looked up once. Battery and
+    HVAC readings are kept in a status cache which outlives the vehicles.
+    """
+
+    def __init__(
+        self,
+        rate_limiter: RateLimiter | Unlimited | None = None,
+        cache: StatusCache | None = None,
+        battery_ttl: timedelta = timedelta(minutes=15),
+        hvac_ttl: timedelta = timedelta(minutes=5),
+        login_factory: Callable[..., RenaultLogin] = RenaultLogin,
+    ):
+        self._rate_limiter = rate_limiter or Unlimited()
+        self._cache = cache or StatusCache()
+        self._battery_ttl = battery_ttl
+        self._hvac_ttl = hvac_ttl
+        # called as RenaultLogin is; lets load tests log in to a stand-in
+        self._login_factory = login_factory
+        self._session: ClientSession | None = None
+        self._logins: dict[tuple[str, str], RenaultLogin] = {}
+        self._vehicles: dict[str, Vehicle] = {}
+
+    async def get_vehicle(self, credentials: Credentials) -> Vehicle:
+        if self._session is None or self._session.closed:
+            self._session = ClientSession()
+            self._logins.clear()
+            self._vehicles.clear()
+
+        key = (credentials.username, credentials.password)
+        login = self._logins.get(key)
+        if login is None:
+            login = self._login_factory(self._session, *key, self._rate_limiter)
+            self._logins[key] = login
+
+        vehicle = self._vehicles.get(credentials.registration)
+        if vehicle is None or vehicle.login is not login:
+            vehicle = Vehicle(
+                self._session,
+                credentials,
+                login,
+                self._cache,
+                self._battery_ttl,
+                self._hvac_ttl,
+            )
+            self._vehicles[credentials.registration] = vehicle
+
+        await vehicle.connect()
+        return vehicle
+
+    async def close(self):
+        await self._cache.close()
+        if self._session is not None:
+            await self._session.close()
+        self._session = None
+        self._logins.clear()
+        self._vehicles.clear()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+import json
+import os
+from dataclasses import dataclass, field
+from devices.vehicle import Credentials
+
+
+def require_env(name: str) -> str:
+    """
+    Read an environment variable, raising an Error if not defined
+    """
+    value = os.getenv(name)
+    if not value:
+        raise Exception(f"Required environment variable {name} not defined")
+    return value
+
+
+@dataclass
+class AndersenCredentials:
+    username: str
+    password: str
+    device_name: str
+
+
+@dataclass
+class CarConfig:
+    """
+    The vehicle, charger and IoT shadows making up one car
+    """
+
+    name: str
+    renault: Credentials
+    andersen: AndersenCredentials
+    heater_thing: str = "car_heater"
+    status_thing: str = "car_status"
+    charge_intent_shadow: str = "charge_intent"
+
+
+@dataclass
+class RateLimit:
+    requests_per_minute: float = 60
+    burst: int = 10
+
+
+@dataclass
+class StatusCacheConfig:
+    path: str | None = "status_cache.json"
+    battery_ttl_minutes: float = 15
+    hvac_ttl_minutes: float = 5
+    # oldest reading served to callers which accept a stale one
+    max_stale_minutes: float = 720
+
+
+@dataclass
+class FleetConfig:
+    cars: list[CarConfig]
+    max_concurrent_cars: int = 4
+    # longest time between updates when no tariff or plan boundary is due
+    heartbeat_minutes: int = 60
+    renault_rate_limit: RateLimit = field(default_factory=RateLimit)
+    andersen_rate_limit: RateLimit = field(default_factory=RateLimit)
+    status_cache: StatusCacheConfig = field(default_factory=StatusCacheConfig)
+    # Prometheus metrics are served at this address when a port is given;
+    # use 0.0.0.0 to reach them from outside a container
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int | None = None
+    # every tick's readings are kept here, one file per car per day
+    telemetry_path: str | None = "data/telemetry"
+    # CSV of slot prices; charging uses the cheapest slots wherever it covers
+    tariff_path: str | None = None
+
+
+def _expand(value):
+    # lets secrets in the fleet file be given as "$ENV_VAR" references
+    if isinstance(value, str):
+        return os.path.expandvars(value)
+    if isinstance(value, dict):
+        return {k: _expand(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_expand(v) for v in value]
+    return value
+
+
+def _shadows(car: CarConfig) -> list[tuple[str, str | None]]:
+    return [
+        (car.heater_thing, None),
+        (car.status_thing, None),
+        (car.status_thing, car.charge_intent_shadow),
+    ]
+
+
+def _check_shadows(cars: list[CarConfig]):
+    # each shadow's deltas go to one car only, so two cars sharing one
+    # would leave the first without them
+    owners: dict[tuple[str, str | None], str] = {}
+    for car in cars:
+        for shadow in _shadows(car):
+            if shadow in owners:
+                thing, name = shadow
+                shadow_desc = thing if name is None else f"{thing}/{name}"
+                raise ValueError(
+                    f"cars {owners[shadow]} and {car.name} both use shadow"
+                    f" {shadow_desc}; give each car its own heater_thing and"
+                    " status_thing"
+                )
+            owners[shadow] = car.name
+
+
+def parse_fleet_config(data: dict) -> FleetConfig:
+    data = _expand(data)
+    cars = [
+        CarConfig(
+            name=car["name"],
+            renault=Credentials(**car["renault"]),
+            andersen=AndersenCredentials(**car["andersen"]),
+            **{
+                k: car[k]
+                for k in ["heater_thing", "status_thing", "charge_intent_shadow"]
+                if k in car
+            },
+        )
+        for car in data["cars"]
+    ]
+    _check_shadows(cars)
+    limits = data.get("rate_limits", {})
+    return FleetConfig(
+        cars=cars,
+        max_concurrent_cars=data.get("max_concurrent_cars", 4),
+        heartbeat_minutes=data.get("heartbeat_minutes", 60),
+        renault_rate_limit=RateLimit(**limits.get("renault", {})),
+        andersen_rate_limit=RateLimit(**limits.get("andersen", {})),
+        status_cache=StatusCacheConfig(**data.get("status_cache", {})),
+        metrics_host=data.get("metrics_host", "127.0.0.1"),
+        metrics_port=data.get("metrics_port"),
+        telemetry_path=data.get("telemetry_path", "data/telemetry"),
+        tariff_path=data.get("tariff_path"),
+    )
+
+
+def single_car_config_from_env() -> FleetConfig:
+    return FleetConfig(
+        cars=[
+            CarConfig(
+                name=require_env("RENAULT_REGISTRATION"),
+                renault=Credentials(
+                    username=require_env("RENAULT_USERNAME"),
+                    password=require_env("RENAULT_PASSWORD"),
+                    registration=require_env("RENAULT_REGISTRATION"),
+                ),
+                andersen=AndersenCredentials(
+                    username=require_env("ANDERSEN_USERNAME"),
+                    password=require_env("ANDERSEN_PASSWORD"),
+                    device_name=require_env("ANDERSEN_DEVICE_NAME"),
+                ),
+            )
+        ]
+    )
+
+
+def load_fleet_config() -> FleetConfig:
+    """
+    Read the fleet from the JSON file named by FLEET_CONFIG, or make a fleet
+    of one car from the single-car environment variables
+    """
+    path = os.getenv("FLEET_CONFIG")
+    if not path:
+        return single_car_config_from_env()
+    with open(path) as f:
+        return parse_fleet_config(json.load(f))
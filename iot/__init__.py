@@ -1 +1,3 @@
-from .shadow import IoTClient, IoTThing
+from .buffer import ShadowWriteBuffer
+from .router import ShadowRouter
+from .shadow import IoTClient, IoTThing, IoTShadowDocument
@@ -0,0 +1,89 @@
+import asyncio
+from numbers import Number
+from typing import Any, Protocol
+
+
+class ShadowWriter(Protocol):
+    def change_shadow_value(self, value: Any): ...
+
+    def change_shadow_fields(self, fields: dict): ...
+
+
+# Numeric readings are only reported once they have moved this far from the
+# value last sent, so that noise doesn't cost an MQTT message per tick
+DEFAULT_THRESHOLDS = {
+    "battery_level": 1,
+    "estimated_range": 5,
+}
+
+
+class ShadowWriteBuffer:
+    """
+    Collects the values reported to each thing's shadow and sends them after
+    a short window, so several reports to the same thing become one message.
+    Only the keys of a dict value which have changed since they were last
+    sent are included, and the message is skipped altogether if none have.
+    """
+
+    def __init__(
+        self,
+        window: float = 1.0,
+        thresholds: dict[str, float] = DEFAULT_THRESHOLDS,
+    ):
+        self._window = window
+        self._thresholds = thresholds
+        self._pending: dict[ShadowWriter, Any] = {}
+        self._sent: dict[ShadowWriter, Any] = {}
+        self._timer: asyncio.TimerHandle | None = None
+
+    def report(self, thing: ShadowWriter, value: Any):
+        if isinstance(value, dict) and isinstance(self._pending.get(thing), dict):
+            value = {**self._pending[thing], **value}
+        self._pending[thing] = value
+        if self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(self._window, self.flush)
+
+    def _changed(self, key: str, value: Any, sent: Any) -> bool:
+        threshold = self._thresholds.get(key)
+        if (
+            threshold is not None
+            and isinstance(value, Number)
+            and isinstance(sent, Number)
+        ):
+            return abs(value - sent) >= threshold
+        return value != sent
+
+    def flush(self):
+        """
+        Send everything reported since the last flush
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, {}
+
+        for thing, value in pending.items():
+            sent = self._sent.get(thing)
+            if isinstance(value, dict) and isinstance(sent, dict):
+                changed = {
+                    key: v
+                    for key, v in value.items()
+                    if key not in sent or self._changed(key, v, sent[key])
+                }
+                if changed:
+                    thing.change_shadow_fields(changed)
+                    self._sent[thing] = {**sent, **changed}
+            else:
+                # the thing compares single values with its own copy of the
+                # shadow, which also follows changes made by other clients
+                thing.change_shadow_value(value)
+                if isinstance(value, dict):
+                    self._sent[thing] = value
+
+    def forget(self, thing: ShadowWriter):
+        """
+        Send the next value reported to a thing in full, such as after its
+        shadow has been changed by someone else
+        """
+        self._sent.pop(thing, None)
@@ -0,0 +1,205 @@
+from awscrt import mqtt
+from awsiot import iotshadow
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable
+from uuid import uuid4
+import json
+import logging
+import threading
+import time
+
+from .stats import ShadowStats
+
+# Two wildcard subscriptions cover the response and event topics of every
+# classic and named shadow, however many things are registered. The request
+# topics ("get", "update") are one level shorter, so our own requests are
+# not echoed back.
+CLASSIC_TOPIC = "$aws/things/+/shadow/+/+"
+NAMED_TOPIC = "$aws/things/+/shadow/name/+/+/+"
+
+PAYLOAD_TYPES = {
+    "get/accepted": iotshadow.GetShadowResponse,
+    "get/rejected": iotshadow.ErrorResponse,
+    "update/accepted": iotshadow.UpdateShadowResponse,
+    "update/rejected": iotshadow.ErrorResponse,
+    "update/delta": iotshadow.ShadowDeltaUpdatedEvent,
+    "update/documents": iotshadow.ShadowUpdatedEvent,
+}
+
+# responses to our own requests are matched to them by client token; other
+# clients' responses arrive on the same topics and are dropped
+RESPONSES = {"get/accepted", "get/rejected", "update/accepted", "update/rejected"}
+
+ShadowKey = tuple[str, str | None]
+
+
+@dataclass
+class _Request:
+    key: ShadowKey
+    operation: str
+    sent_at: float
+
+
+def parse_topic(topic: str) -> tuple[ShadowKey, str] | None:
+    """
+    Split a shadow topic into the (thing name, shadow name) it concerns and
+    the operation, such as "get/accepted". The shadow name is None for a
+    classic shadow.
+    """
+    parts = topic.split("/")
+    if len(parts) < 6 or parts[:2] != ["$aws", "things"] or parts[3] != "shadow":
+        return None
+    thing_name, rest = parts[2], parts[4:]
+    if rest[0] == "name" and len(rest) == 4:
+        return (thing_name, rest[1]), "/".join(rest[2:])
+    if len(rest) == 2:
+        return (thing_name, None), "/".join(rest)
+    return None
+
+
+class ShadowRouter:
+    """
+    Receives the messages for every shadow over a fixed pair of wildcard
+    subscriptions, and dispatches each one to the callbacks registered for
+    its thing and shadow name. The round trip time of each request is
+    recorded in stats, and requests unanswered after timeout seconds are
+    counted as timed out.
+    """
+
+    def __init__(
+        self,
+        connection: mqtt.Connection,
+        timeout: float = 30,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._lock = threading.Lock()
+        self._callbacks: dict[ShadowKey, dict[str, Callable[[Any], None]]] = {}
+        self._requests: dict[str, _Request] = {}
+        self._timeout = timeout
+        self._clock = clock
+        self.stats = ShadowStats()
+
+        self.subscribed = all_of(
+            [
+                connection.subscribe(
+                    topic=topic, qos=mqtt.QoS.AT_LEAST_ONCE, callback=self._on_message
+                )[0]
+                for topic in [CLASSIC_TOPIC, NAMED_TOPIC]
+            ]
+        )
+
+    def register(
+        self,
+        thing_name: str,
+        shadow_name: str | None,
+        callbacks: dict[str, Callable[[Any], None]],
+    ):
+        """
+        Route messages for a shadow to callbacks keyed by operation, such as
+        "update/delta". Operations without a callback are ignored. Each
+        shadow can be registered once only.
+        """
+        key = (thing_name, shadow_name)
+        with self._lock:
+            if key in self._callbacks:
+                raise ValueError(f"shadow already registered: {key}")
+            self._callbacks[key] = callbacks
+
+    def new_token(
+        self, operation: str, thing_name: str, shadow_name: str | None = None
+    ) -> str:
+        """
+        A client token for a "get" or "update" request about to be published,
+        under which its response will be routed back
+        """
+        self.expire_requests()
+        token = str(uuid4())
+        with self._lock:
+            self._requests[token] = _Request(
+                (thing_name, shadow_name), operation, self._clock()
+            )
+        return token
+
+    def expire_requests(self):
+        """
+        Give up on requests which have waited too long for a response
+        """
+        now = self._clock()
+        with self._lock:
+            expired = [
+                (token, request)
+                for token, request in self._requests.items()
+                if now - request.sent_at > self._timeout
+            ]
+            for token, _ in expired:
+                del self._requests[token]
+        for _, request in expired:
+            name = self.stats.name(*request.key, request.operation)
+            logging.warning("shadow request timed out request=%s", name)
+            self.stats.timeout(name)
+
+    def _complete(self, token: str, key: ShadowKey, operation: str) -> bool:
+        with self._lock:
+            request = self._requests.pop(token, None)
+        if request is None or request.key != key:
+            return False
+        latency_ms = (self._clock() - request.sent_at) * 1000
+        name = self.stats.name(*key, request.operation)
+        accepted = operation.endswith("accepted")
+        self.stats.record(name, latency_ms, accepted)
+        logging.debug(
+            "shadow response request=%s accepted=%s latency_ms=%.0f",
+            name,
+            accepted,
+            latency_ms,
+        )
+        return True
+
+    def _on_message(self, topic: str, payload: bytes, **kwargs):
+        try:
+            parsed = parse_topic(topic)
+            if parsed is None or parsed[1] not in PAYLOAD_TYPES:
+                return
+            key, operation = parsed
+            message = PAYLOAD_TYPES[operation].from_payload(json.loads(payload))
+
+            if operation in RESPONSES:
+                if not self._complete(message.client_token, key, operation):
+                    return
+            with self._lock:
+                callback = self._callbacks.get(key, {}).get(operation)
+
+            if callback:
+                callback(message)
+
+        except Exception as e:
+            logging.error("failed to route shadow message topic=%s error=%s", topic, e)
+
+
+def all_of(futures: list[Future]) -> Future:
+    """
+    A future which completes once all of the given futures have, or fails
+    as soon as any one of them does. Nothing blocks while waiting.
+    """
+    combined = Future()
+    lock = threading.Lock()
+    remaining = [len(futures)]
+
+    def on_done(future: Future):
+        error = future.exception()
+        with lock:
+            if combined.done():
+                return
+            if error is not None:
+                combined.set_exception(error)
+                return
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                combined.set_result(None)
+
+    if not futures:
+        combined.set_result(None)
+    for future in futures:
+        future.add_done_callback(on_done)
+    return combined
@@ -3,15 +3,16 @@
 
 from awscrt import mqtt, http
 from awsiot import iotshadow, mqtt_connection_builder
-from concurrent.futures import Future
+from concurrent.futures import Future, InvalidStateError
 from time import sleep
 from typing import Any, Callable
-from uuid import uuid4
 import logging
 import sys
 import threading
 import traceback
 
+from .router import ShadowRouter, all_of
+
 # - Overview -
 # This sample uses the AWS IoT Device Shadow Service to keep a property in
 # sync between device and server. Imagine a light whose color may be changed
@@ -37,11 +38,30 @@ class LockedData:
         self.lock = threading.Lock()
         self.shadow_value = None
         self.disconnect_called = False
-        self.request_tokens = set()
+
+
+def _set_ready(ready: Future, error: Exception | None = None):
+    # several responses may race to complete the same readiness future
+    try:
+        if error is None:
+            ready.set_result(None)
+        else:
+            ready.set_exception(error)
+    except InvalidStateError:
+        pass
 
 
 class IoTClient:
-    def __init__(self):
+    def __init__(self, mqtt_connection: mqtt.Connection | None = None):
+        self._documents: list["IoTShadowDocument"] = []
+        self._ready: list[Future] = []
+
+        if mqtt_connection is not None:
+            # already connected, such as to a load test's stand-in broker
+            self._shadow_client = iotshadow.IotShadowClient(mqtt_connection)
+            self._router = ShadowRouter(mqtt_connection)
+            return
+
         mqtt_connection = mqtt_connection_builder.mtls_from_path(
             endpoint="aa40w08kkflrp-ats.iot.eu-west-1.amazonaws.com",
             cert_filepath="./thing.crt",
@@ -50,21 +70,25 @@ class IoTClient:
             client_id="car_iot",
             clean_session=False,
             keep_alive_secs=30,
+            on_connection_resumed=self._on_connection_resumed,
         )
 
-        print("Connecting to endpoint with client ID")
+        logging.info("connecting to AWS IoT client_id=car_iot")
 
         connected_future = mqtt_connection.connect()
 
         self._shadow_client = iotshadow.IotShadowClient(mqtt_connection)
 
+        # one pair of wildcard subscriptions serves every registered shadow
+        self._router = ShadowRouter(mqtt_connection)
+
         # Wait for connection to be fully established.
         # Note that it's not necessary to wait, commands issued to the
         # mqtt_connection before its fully connected will simply be queued.
         # But this sample waits here so it's obvious when a connection
         # fails or succeeds.
         connected_future.result()
-        print("Connected!")
+        logging.info("connected to AWS IoT")
 
     def register_thing(
         self,
@@ -73,136 +97,134 @@ class IoTClient:
         default_value: Any,
         callback: Callable[[str], None] | None = None,
     ) -> "IoTThing":
-        return IoTThing(
-            self._shadow_client, thing_name, property, default_value, callback
+        thing = IoTThing(
+            self._shadow_client,
+            self._router,
+            thing_name,
+            property,
+            default_value,
+            callback,
         )
+        self._ready.append(thing.ready)
+        return thing
+
+    def register_shadow_document(
+        self,
+        thing_name: str,
+        shadow_name: str,
+        callback: Callable[[dict], None] | None = None,
+    ) -> "IoTShadowDocument":
+        document = IoTShadowDocument(
+            self._shadow_client, self._router, thing_name, shadow_name, callback
+        )
+        self._documents.append(document)
+        self._ready.append(document.ready)
+        return document
+
+    def ready(self) -> Future:
+        """
+        A future which completes when every thing and shadow document
+        registered so far has received its initial state. Registration never
+        blocks, so registering several things at once costs about one broker
+        round trip.
+        """
+        return all_of(list(self._ready))
+
+    def shadow_stats(self) -> dict[str, dict]:
+        """
+        Round trip latency, rejections and timeouts of shadow requests, by
+        thing, shadow and operation
+        """
+        self._router.expire_requests()
+        return self._router.stats.snapshot()
+
+    def _on_connection_resumed(
+        self, connection, return_code, session_present, **kwargs
+    ):
+        # updates may have been missed while we were disconnected
+        logging.info("connection resumed, refreshing shadow documents")
+        for document in self._documents:
+            document.refresh()
 
 
 class IoTThing:
     def __init__(
         self,
-        shadow_client: IoTClient,
+        shadow_client: iotshadow.IotShadowClient,
+        router: ShadowRouter,
         thing_name: str,
         property: str,
         default_value: Any,
         callback: Callable[[str], None] | None = None,
     ):
         self._shadow_client = shadow_client
+        self._router = router
         self._thing_name = thing_name
         self._callback = callback
         self._property = property
         self._default_value = default_value
         self._locked_data = LockedData()
-
+        self.ready = Future()
+
+        callbacks = {
+            "update/accepted": self._on_update_shadow_accepted,
+            "update/rejected": self._on_update_shadow_rejected,
+            "get/accepted": self._on_get_shadow_accepted,
+            "get/rejected": self._on_get_shadow_rejected,
+        }
+        if callback:
+            callbacks["update/delta"] = self._on_shadow_delta_updated
+        router.register(thing_name, None, callbacks)
+
+        # Note that is **is** important that the "accepted/rejected"
+        # subscriptions succeed before publishing the corresponding "request"
+        router.subscribed.add_done_callback(self._on_subscribed)
+
+    def _on_subscribed(self, future):
+        # type: (Future) -> None
         try:
-            # Note that is **is** important to wait for "accepted/rejected" subscriptions
-            # to succeed before publishing the corresponding "request".
-            print("Subscribing to Update responses...")
-            update_accepted_subscribed_future, _ = (
-                shadow_client.subscribe_to_update_shadow_accepted(
-                    request=iotshadow.UpdateShadowSubscriptionRequest(
-                        thing_name=thing_name
-                    ),
-                    qos=mqtt.QoS.AT_LEAST_ONCE,
-                    callback=self._on_update_shadow_accepted,
-                )
-            )
-
-            update_rejected_subscribed_future, _ = (
-                shadow_client.subscribe_to_update_shadow_rejected(
-                    request=iotshadow.UpdateShadowSubscriptionRequest(
-                        thing_name=thing_name
-                    ),
-                    qos=mqtt.QoS.AT_LEAST_ONCE,
-                    callback=self._on_update_shadow_rejected,
-                )
-            )
-
-            # Wait for subscriptions to succeed
-            update_accepted_subscribed_future.result()
-            update_rejected_subscribed_future.result()
-
-            print("Subscribing to Get responses...")
-            get_accepted_subscribed_future, _ = (
-                shadow_client.subscribe_to_get_shadow_accepted(
-                    request=iotshadow.GetShadowSubscriptionRequest(
-                        thing_name=thing_name
-                    ),
-                    qos=mqtt.QoS.AT_LEAST_ONCE,
-                    callback=self._on_get_shadow_accepted,
-                )
-            )
+            future.result()
+            if not self._callback:
+                _set_ready(self.ready)
+                return
 
-            get_rejected_subscribed_future, _ = (
-                shadow_client.subscribe_to_get_shadow_rejected(
-                    request=iotshadow.GetShadowSubscriptionRequest(
-                        thing_name=thing_name
-                    ),
-                    qos=mqtt.QoS.AT_LEAST_ONCE,
-                    callback=self._on_get_shadow_rejected,
-                )
+            # Issue request for shadow's current state.
+            # The response will be received by the on_get_accepted() callback
+            logging.debug("requesting shadow state thing=%s", self._thing_name)
+
+            # use a unique token so the router can correlate this "request" message
+            # to any "response" messages received on the /accepted and /rejected topics
+            token = self._router.new_token("get", self._thing_name)
+            publish_get_future = self._shadow_client.publish_get_shadow(
+                request=iotshadow.GetShadowRequest(
+                    thing_name=self._thing_name, client_token=token
+                ),
+                qos=mqtt.QoS.AT_LEAST_ONCE,
             )
+            publish_get_future.add_done_callback(self._on_publish_get_shadow)
 
-            # Wait for subscriptions to succeed
-            get_accepted_subscribed_future.result()
-            get_rejected_subscribed_future.result()
-
-            if callback:
-                print("Subscribing to Delta events...")
-                delta_subscribed_future, _ = (
-                    shadow_client.subscribe_to_shadow_delta_updated_events(
-                        request=iotshadow.ShadowDeltaUpdatedSubscriptionRequest(
-                            thing_name=thing_name
-                        ),
-                        qos=mqtt.QoS.AT_LEAST_ONCE,
-                        callback=self._on_shadow_delta_updated,
-                    )
-                )
-
-                # Wait for subscription to succeed
-                delta_subscribed_future.result()
-
-                # Issue request for shadow's current state.
-                # The response will be received by the on_get_accepted() callback
-                print("Requesting current shadow state...")
-
-                with self._locked_data.lock:
-                    # use a unique token so we can correlate this "request" message to
-                    # any "response" messages received on the /accepted and /rejected topics
-                    token = str(uuid4())
-
-                    publish_get_future = shadow_client.publish_get_shadow(
-                        request=iotshadow.GetShadowRequest(
-                            thing_name=thing_name, client_token=token
-                        ),
-                        qos=mqtt.QoS.AT_LEAST_ONCE,
-                    )
-
-                    self._locked_data.request_tokens.add(token)
-
-                # Ensure that publish succeeds
-                publish_get_future.result()
+        except Exception as e:
+            logging.error("_on_subscribed failed error=%s", e)
+            _set_ready(self.ready, e)
 
+    def _on_publish_get_shadow(self, future):
+        # type: (Future) -> None
+        try:
+            future.result()
         except Exception as e:
-            logging.error("IoTThing()", e)
+            logging.error("_on_publish_get_shadow failed error=%s", e)
+            _set_ready(self.ready, e)
 
     def _on_get_shadow_accepted(self, response):
         # type: (iotshadow.GetShadowResponse) -> None
         try:
             with self._locked_data.lock:
-                # check that this is a response to a request from this session
-                try:
-                    self._locked_data.request_tokens.remove(response.client_token)
-                except KeyError:
-                    print(
-                        "Ignoring get_shadow_accepted message due to unexpected token."
-                    )
-                    return
-
-                print("Finished getting initial shadow state.")
+                logging.debug("received shadow state thing=%s", self._thing_name)
+                _set_ready(self.ready)
                 if self._locked_data.shadow_value is not None:
-                    print(
-                        "  Ignoring initial query because a delta event has already been received."
+                    # a delta event has already been received
+                    logging.debug(
+                        "ignoring initial shadow state thing=%s", self._thing_name
                     )
                     return
 
@@ -210,7 +232,9 @@ class IoTThing:
                 if response.state.delta:
                     value = response.state.delta.get(self._property)
                     if value:
-                        print("  Shadow contains delta value '{}'.".format(value))
+                        logging.info(
+                            "shadow delta thing=%s value=%s", self._thing_name, value
+                        )
                         self.change_shadow_value(value)
                         if self._callback:
                             self._callback(value)
@@ -219,143 +243,125 @@ class IoTThing:
                 if response.state.reported:
                     value = response.state.reported.get(self._property)
                     if value:
-                        print("  Shadow contains reported value '{}'.".format(value))
+                        logging.info(
+                            "shadow reported thing=%s value=%s", self._thing_name, value
+                        )
                         self.set_local_value_due_to_initial_query(
                             response.state.reported[self._property]
                         )
                         return
 
-            print(
-                "  Shadow document lacks '{}' property. Setting defaults...".format(
-                    self._property
-                )
+            logging.info(
+                "shadow lacks property, setting default thing=%s property=%s",
+                self._thing_name,
+                self._property,
             )
             self.change_shadow_value(self._default_value)
             return
 
         except Exception as e:
-            logging.error("_on_get_shadow_accepted", e)
+            logging.error("_on_get_shadow_accepted failed error=%s", e)
 
     def _on_get_shadow_rejected(self, error):
         # type: (iotshadow.ErrorResponse) -> None
         try:
-            # check that this is a response to a request from this session
-            with self._locked_data.lock:
-                try:
-                    self._locked_data.request_tokens.remove(error.client_token)
-                except KeyError:
-                    print(
-                        "Ignoring get_shadow_rejected message due to unexpected token."
-                    )
-                    return
-
             if error.code == 404:
-                print("Thing has no shadow document. Creating with defaults...")
+                logging.info(
+                    "no shadow document, creating default thing=%s", self._thing_name
+                )
                 self.change_shadow_value(self._default_value)
+                _set_ready(self.ready)
             else:
-                logging.error(
-                    "Get request was rejected. code:{} message:'{}'".format(
-                        error.code, error.message
-                    )
+                message = "get request rejected thing={} code={} message={}".format(
+                    self._thing_name, error.code, error.message
                 )
+                logging.error(message)
+                _set_ready(self.ready, Exception(message))
 
         except Exception as e:
-            logging.error("_on_get_shadow_rejected", e)
+            logging.error("_on_get_shadow_rejected failed error=%s", e)
 
     def _on_shadow_delta_updated(self, delta):
         # type: (iotshadow.ShadowDeltaUpdatedEvent) -> None
         try:
-            print("Received shadow delta event.")
             if delta.state and (self._property in delta.state):
                 value = delta.state[self._property]
                 if value is None:
-                    print(
-                        "  Delta reports that '{}' was deleted. Resetting defaults...".format(
-                            self._property
-                        )
+                    logging.info(
+                        "shadow property deleted, resetting default thing=%s property=%s",
+                        self._thing_name,
+                        self._property,
                     )
                     self.change_shadow_value(self._default_value)
                     return
                 else:
-                    print(
-                        "  Delta reports that desired value is '{}'. Changing local value...".format(
-                            value
-                        )
+                    logging.info(
+                        "shadow delta thing=%s value=%s client_token=%s",
+                        self._thing_name,
+                        value,
+                        delta.client_token,
                     )
-                    if delta.client_token is not None:
-                        print("  ClientToken is: " + delta.client_token)
                     self.change_shadow_value(value)
                 if self._callback:
                     self._callback(value)
             else:
-                print("  Delta did not report a change in '{}'".format(self._property))
+                logging.debug(
+                    "shadow delta without property thing=%s property=%s",
+                    self._thing_name,
+                    self._property,
+                )
 
         except Exception as e:
-            logging.error("_on_shadow_delta_updated", e)
+            logging.error("_on_shadow_delta_updated failed error=%s", e)
 
     def _on_publish_update_shadow(self, future):
         # type: (Future) -> None
         try:
             future.result()
-            print("Update request published.")
         except Exception as e:
-            print("Failed to publish update request.")
-            logging.error("_on_publish_update_shadow", e)
+            logging.error(
+                "failed to publish shadow update thing=%s error=%s",
+                self._thing_name,
+                e,
+            )
 
     def _on_update_shadow_accepted(self, response):
         # type: (iotshadow.UpdateShadowResponse) -> None
         try:
-            # check that this is a response to a request from this session
-            with self._locked_data.lock:
-                try:
-                    self._locked_data.request_tokens.remove(response.client_token)
-                except KeyError:
-                    print(
-                        "Ignoring update_shadow_accepted message due to unexpected token."
-                    )
-                    return
-
             try:
                 if response.state.reported is not None:
                     if self._property in response.state.reported:
-                        print(
-                            "Finished updating reported shadow value to '{}'.".format(
-                                response.state.reported[self._property]
-                            )
-                        )  # type: ignore
+                        logging.debug(
+                            "shadow updated thing=%s value=%s",
+                            self._thing_name,
+                            response.state.reported[self._property],
+                        )
                     else:
-                        print("Could not find shadow property with name: '{}'.".format(self._property))  # type: ignore
+                        logging.warning(
+                            "shadow update lacks property thing=%s property=%s",
+                            self._thing_name,
+                            self._property,
+                        )
                 else:
-                    print(
-                        "Shadow states cleared."
-                    )  # when the shadow states are cleared, reported and desired are set to None
+                    # when the shadow states are cleared, reported and desired are set to None
+                    logging.info("shadow cleared thing=%s", self._thing_name)
             except BaseException:
                 exit("Updated shadow is missing the target property")
 
         except Exception as e:
-            logging.error("_on_update_shadow_accepted", e)
+            logging.error("_on_update_shadow_accepted failed error=%s", e)
 
     def _on_update_shadow_rejected(self, error):
         # type: (iotshadow.ErrorResponse) -> None
         try:
-            # check that this is a response to a request from this session
-            with self._locked_data.lock:
-                try:
-                    self._locked_data.request_tokens.remove(error.client_token)
-                except KeyError:
-                    print(
-                        "Ignoring update_shadow_rejected message due to unexpected token."
-                    )
-                    return
-
             exit(
-                "Update request was rejected. code:{} message:'{}'".format(
-                    error.code, error.message
+                "update request rejected thing={} code={} message={}".format(
+                    self._thing_name, error.code, error.message
                 )
             )
 
         except Exception as e:
-            logging.error("_on_update_shadow_rejected", e)
+            logging.error("_on_update_shadow_rejected failed error=%s", e)
 
     def set_local_value_due_to_initial_query(self, reported_value):
         with self._locked_data.lock:
@@ -366,17 +372,18 @@ class IoTThing:
     def change_shadow_value(self, value):
         with self._locked_data.lock:
             if self._locked_data.shadow_value == value:
-                print("Local value is already '{}'.".format(value))
+                logging.debug(
+                    "shadow unchanged thing=%s value=%s", self._thing_name, value
+                )
                 return
 
-            print("Changed local shadow value to '{}'.".format(value))
             self._locked_data.shadow_value = value
 
-            print("Updating reported shadow value to '{}'...".format(value))
+            logging.info("updating shadow thing=%s value=%s", self._thing_name, value)
 
-            # use a unique token so we can correlate this "request" message to
-            # any "response" messages received on the /accepted and /rejected topics
-            token = str(uuid4())
+            # use a unique token so the router can correlate this "request" message
+            # to any "response" messages received on the /accepted and /rejected topics
+            token = self._router.new_token("update", self._thing_name)
 
             # if the value is "clear shadow" then send a UpdateShadowRequest with None
             # for both reported and desired to clear the shadow document completely.
@@ -411,7 +418,194 @@ class IoTThing:
             future = self._shadow_client.publish_update_shadow(
                 request, mqtt.QoS.AT_LEAST_ONCE
             )
+            future.add_done_callback(self._on_publish_update_shadow)
 
-            self._locked_data.request_tokens.add(token)
-
+    def change_shadow_fields(self, fields: dict):
+        """
+        Update some of the keys of a dict-valued property. The shadow service
+        merges them into the document, so the other keys are left as they are.
+        """
+        with self._locked_data.lock:
+            current = self._locked_data.shadow_value
+            if not isinstance(current, dict):
+                current = {}
+            self._locked_data.shadow_value = {**current, **fields}
+
+            logging.info("updating shadow thing=%s fields=%s", self._thing_name, fields)
+
+            token = self._router.new_token("update", self._thing_name)
+            request = iotshadow.UpdateShadowRequest(
+                thing_name=self._thing_name,
+                state=iotshadow.ShadowState(
+                    reported={self._property: fields},
+                    desired={self._property: fields},
+                ),
+                client_token=token,
+            )
+            future = self._shadow_client.publish_update_shadow(
+                request, mqtt.QoS.AT_LEAST_ONCE
+            )
             future.add_done_callback(self._on_publish_update_shadow)
+
+
+class IoTShadowDocument:
+    """
+    An in-memory copy of the desired state of a named shadow. It is kept up
+    to date by the shadow's update events, so reading it costs nothing. The
+    full document is only fetched at startup, after a reconnect, or when a
+    missed update is detected from the version numbers.
+    """
+
+    def __init__(
+        self,
+        shadow_client: iotshadow.IotShadowClient,
+        router: ShadowRouter,
+        thing_name: str,
+        shadow_name: str,
+        callback: Callable[[dict], None] | None = None,
+    ):
+        self._shadow_client = shadow_client
+        self._router = router
+        self.thing_name = thing_name
+        self.shadow_name = shadow_name
+        self._callback = callback
+        self._lock = threading.Lock()
+        self._desired: dict | None = None
+        self._version: int | None = None
+        self.ready = Future()
+
+        router.register(
+            thing_name,
+            shadow_name,
+            {
+                "get/accepted": self._on_get_shadow_accepted,
+                "get/rejected": self._on_get_shadow_rejected,
+                "update/documents": self._on_shadow_updated,
+                "update/delta": self._on_shadow_delta_updated,
+            },
+        )
+
+        # Ask for the document once the subscriptions have succeeded
+        router.subscribed.add_done_callback(self._on_subscribed)
+
+    def _on_subscribed(self, future):
+        # type: (Future) -> None
+        try:
+            future.result()
+            self.refresh()
+        except Exception as e:
+            logging.error("_on_subscribed failed error=%s", e)
+            _set_ready(self.ready, e)
+
+    @property
+    def desired(self) -> dict | None:
+        """
+        The desired state of the shadow, or None if it hasn't been received yet
+        """
+        with self._lock:
+            return None if self._desired is None else dict(self._desired)
+
+    def refresh(self):
+        token = self._router.new_token("get", self.thing_name, self.shadow_name)
+        future = self._shadow_client.publish_get_named_shadow(
+            request=iotshadow.GetNamedShadowRequest(
+                thing_name=self.thing_name,
+                shadow_name=self.shadow_name,
+                client_token=token,
+            ),
+            qos=mqtt.QoS.AT_LEAST_ONCE,
+        )
+        future.add_done_callback(self._on_publish_get_shadow)
+
+    def _on_publish_get_shadow(self, future):
+        # type: (Future) -> None
+        try:
+            future.result()
+        except Exception as e:
+            logging.error("_on_publish_get_shadow failed error=%s", e)
+            _set_ready(self.ready, e)
+
+    def _set_desired(self, desired: dict | None, version: int | None) -> bool:
+        with self._lock:
+            if None not in (version, self._version) and version <= self._version:
+                return False
+            changed = self._desired is not None and self._desired != (desired or {})
+            self._desired = desired or {}
+            self._version = version
+        _set_ready(self.ready)
+        logging.info(
+            "shadow document thing=%s shadow=%s version=%s",
+            self.thing_name,
+            self.shadow_name,
+            version,
+        )
+        if changed and self._callback:
+            self._callback(dict(self._desired))
+        return True
+
+    def _on_get_shadow_accepted(self, response):
+        # type: (iotshadow.GetShadowResponse) -> None
+        try:
+            desired = response.state.desired if response.state else None
+            self._set_desired(desired, response.version)
+
+        except Exception as e:
+            logging.error("_on_get_shadow_accepted failed error=%s", e)
+
+    def _on_get_shadow_rejected(self, error):
+        # type: (iotshadow.ErrorResponse) -> None
+        try:
+            if error.code == 404:
+                logging.info(
+                    "no shadow document thing=%s shadow=%s",
+                    self.thing_name,
+                    self.shadow_name,
+                )
+                self._set_desired({}, None)
+            else:
+                message = (
+                    "get request rejected thing={} shadow={} code={} message={}".format(
+                        self.thing_name, self.shadow_name, error.code, error.message
+                    )
+                )
+                logging.error(message)
+                _set_ready(self.ready, Exception(message))
+
+        except Exception as e:
+            logging.error("_on_get_shadow_rejected failed error=%s", e)
+
+    def _on_shadow_updated(self, event):
+        # type: (iotshadow.ShadowUpdatedEvent) -> None
+        # documents events carry the whole of the new document, so they can
+        # be applied even if some earlier ones were missed
+        try:
+            if event.current is None:
+                return
+            state = event.current.state
+            self._set_desired(state.desired if state else None, event.current.version)
+
+        except Exception as e:
+            logging.error("_on_shadow_updated failed error=%s", e)
+
+    def _on_shadow_delta_updated(self, delta):
+        # type: (iotshadow.ShadowDeltaUpdatedEvent) -> None
+        # the matching documents event brings the new state; a delta more than
+        # one version ahead means documents events have been missed
+        try:
+            with self._lock:
+                gap = (
+                    self._version is not None
+                    and delta.version is not None
+                    and delta.version > self._version + 1
+                )
+            if gap:
+                logging.info(
+                    "shadow version skipped, refreshing thing=%s shadow=%s version=%s",
+                    self.thing_name,
+                    self.shadow_name,
+                    delta.version,
+                )
+                self.refresh()
+
+        except Exception as e:
+            logging.error("_on_shadow_delta_updated failed error=%s", e)
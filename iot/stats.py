@@ -0,0 +1,110 @@
+import bisect
+import threading
+from dataclasses import dataclass, field
+
+# upper bounds of the latency buckets, in milliseconds
+BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf")]
+
+
+@dataclass
+class LatencyHistogram:
+    """
+    Counts of request round trips by latency bucket
+    """
+
+    counts: list[int] = field(default_factory=lambda: [0] * len(BUCKETS_MS))
+    accepted: int = 0
+    rejected: int = 0
+    timeouts: int = 0
+    max_ms: float = 0
+
+    def record(self, latency_ms: float, accepted: bool):
+        self.counts[bisect.bisect_left(BUCKETS_MS, latency_ms)] += 1
+        self.max_ms = max(self.max_ms, latency_ms)
+        if accepted:
+            self.accepted += 1
+        else:
+            self.rejected += 1
+
+    def quantile(self, q: float) -> float | None:
+        """
+        The upper bound of the bucket holding the q'th quantile, or the
+        largest latency seen if that lies in the last bucket
+        """
+        total = sum(self.counts)
+        if total == 0:
+            return None
+        rank = q * total
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def summary(self) -> dict:
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "max_ms": self.max_ms,
+        }
+
+
+class ShadowStats:
+    """
+    Publish-to-response latency of shadow requests, per thing, shadow and
+    operation. Safe to update from the MQTT thread while being read.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: dict[str, LatencyHistogram] = {}
+
+    @staticmethod
+    def name(thing_name: str, shadow_name: str | None, operation: str) -> str:
+        shadow = f"{thing_name}/{shadow_name}" if shadow_name else thing_name
+        return f"{shadow}/{operation}"
+
+    def _histogram(self, name: str) -> LatencyHistogram:
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = LatencyHistogram()
+        return histogram
+
+    def record(self, name: str, latency_ms: float, accepted: bool):
+        with self._lock:
+            self._histogram(name).record(latency_ms, accepted)
+
+    def timeout(self, name: str):
+        with self._lock:
+            self._histogram(name).timeouts += 1
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            return {
+                name: histogram.summary()
+                for name, histogram in sorted(self._histograms.items())
+            }
+
+
+def prometheus(snapshot: dict[str, dict]) -> str:
+    """
+    A snapshot from ShadowStats in the Prometheus text format
+    """
+    lines = ["# TYPE ev_shadow_requests_total counter"]
+    for name, stats in snapshot.items():
+        for outcome in ["accepted", "rejected", "timeouts"]:
+            lines.append(
+                f'ev_shadow_requests_total{{request="{name}",outcome="{outcome}"}} {stats[outcome]}'
+            )
+    lines.append("# TYPE ev_shadow_request_latency_ms gauge")
+    for name, stats in snapshot.items():
+        for quantile, key in [("0.5", "p50_ms"), ("0.95", "p95_ms"), ("1", "max_ms")]:
+            if stats[key] is not None:
+                lines.append(
+                    f'ev_shadow_request_latency_ms{{request="{name}",quantile="{quantile}"}} {stats[key]:g}'
+                )
+    return "\n".join(lines) + "\n"
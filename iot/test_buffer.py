@@ -0,0 +1,96 @@
+import asyncio
+import pytest
+from .buffer import ShadowWriteBuffer
+
+
+class FakeThing:
+    def __init__(self):
+        self.messages = []
+
+    def change_shadow_value(self, value):
+        self.messages.append(("value", value))
+
+    def change_shadow_fields(self, fields):
+        self.messages.append(("fields", fields))
+
+
+@pytest.mark.asyncio
+async def test_reports_within_window_are_sent_as_one_message():
+    buffer = ShadowWriteBuffer(window=0.01)
+    thing = FakeThing()
+    buffer.report(thing, {"battery_level": 50})
+    buffer.report(thing, {"estimated_range": 200})
+    assert thing.messages == []
+    await asyncio.sleep(0.05)
+    assert thing.messages == [("value", {"battery_level": 50, "estimated_range": 200})]
+
+
+@pytest.mark.asyncio
+async def test_only_changed_keys_are_sent():
+    buffer = ShadowWriteBuffer()
+    thing = FakeThing()
+    buffer.report(thing, {"battery_level": 50, "estimated_range": 200, "plugged": True})
+    buffer.flush()
+    buffer.report(
+        thing, {"battery_level": 52, "estimated_range": 200, "plugged": False}
+    )
+    buffer.flush()
+    assert thing.messages[1] == ("fields", {"battery_level": 52, "plugged": False})
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "readings,expected",
+    [
+        ([202, 204, 198], []),
+        ([202, 205], [{"estimated_range": 205}]),
+        ([203, 206, 210], [{"estimated_range": 206}]),
+        ([195], [{"estimated_range": 195}]),
+    ],
+)
+async def test_numeric_readings_are_sent_past_a_threshold(readings, expected):
+    buffer = ShadowWriteBuffer(thresholds={"estimated_range": 5})
+    thing = FakeThing()
+    buffer.report(thing, {"estimated_range": 200})
+    buffer.flush()
+    for reading in readings:
+        buffer.report(thing, {"estimated_range": reading})
+        buffer.flush()
+    assert [fields for _, fields in thing.messages[1:]] == expected
+
+
+@pytest.mark.asyncio
+async def test_unchanged_report_sends_nothing():
+    buffer = ShadowWriteBuffer()
+    thing = FakeThing()
+    for _ in range(3):
+        buffer.report(thing, {"battery_level": 50})
+        buffer.flush()
+    assert len(thing.messages) == 1
+
+
+@pytest.mark.asyncio
+async def test_single_values_are_left_to_the_thing_to_compare():
+    buffer = ShadowWriteBuffer()
+    thing = FakeThing()
+    buffer.report(thing, "off")
+    buffer.report(thing, "on")
+    buffer.flush()
+    buffer.report(thing, "on")
+    buffer.flush()
+    assert thing.messages == [("value", "on"), ("value", "on")]
+
+
+@pytest.mark.asyncio
+async def test_forgotten_thing_is_sent_in_full():
+    buffer = ShadowWriteBuffer()
+    thing = FakeThing()
+    buffer.report(thing, {"battery_level": 50, "estimated_range": 200})
+    buffer.flush()
+    buffer.forget(thing)
+    buffer.report(thing, {"battery_level": 50, "estimated_range": 200})
+    buffer.flush()
+    assert thing.messages[1] == (
+        "value",
+        {"battery_level": 50, "estimated_range": 200},
+    )
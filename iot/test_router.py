@@ -0,0 +1,124 @@
+import json
+import pytest
+from concurrent.futures import Future
+from .router import ShadowRouter, parse_topic
+
+
+class FakeConnection:
+    def __init__(self):
+        self.subscriptions = {}
+
+    def subscribe(self, topic, qos, callback):
+        self.subscriptions[topic] = callback
+        future = Future()
+        future.set_result(None)
+        return future, 1
+
+    def deliver(self, topic, payload):
+        # both wildcards share the router's callback, and a topic only ever
+        # matches one of them
+        callback = next(iter(self.subscriptions.values()))
+        callback(topic=topic, payload=json.dumps(payload).encode())
+
+
+@pytest.mark.parametrize(
+    "topic,expected",
+    [
+        (
+            "$aws/things/car_heater/shadow/get/accepted",
+            (("car_heater", None), "get/accepted"),
+        ),
+        (
+            "$aws/things/car_status/shadow/name/charge_intent/update/delta",
+            (("car_status", "charge_intent"), "update/delta"),
+        ),
+        ("$aws/things/car_heater/shadow/get", None),
+        ("$aws/things/car_status/shadow/name/charge_intent/update", None),
+        ("some/other/topic", None),
+    ],
+)
+def test_parse_topic(topic, expected):
+    assert parse_topic(topic) == expected
+
+
+def test_subscription_count_does_not_grow_with_shadows():
+    connection = FakeConnection()
+    router = ShadowRouter(connection)
+    for n in range(10):
+        router.register(f"car_{n}", None, {})
+        router.register(f"car_{n}", "charge_intent", {})
+    assert len(connection.subscriptions) == 2
+    assert router.subscribed.done()
+
+
+def test_events_are_routed_by_thing_and_shadow_name():
+    connection = FakeConnection()
+    router = ShadowRouter(connection)
+    received = []
+    router.register("zoe", "charge_intent", {"update/delta": received.append})
+    router.register("zoe", None, {"update/delta": lambda _: received.append(None)})
+
+    connection.deliver(
+        "$aws/things/zoe/shadow/name/charge_intent/update/delta",
+        {"version": 3, "state": {"monday": 80}},
+    )
+    connection.deliver(
+        "$aws/things/megane/shadow/name/charge_intent/update/delta",
+        {"version": 4, "state": {"monday": 60}},
+    )
+    assert len(received) == 1
+    assert received[0].version == 3
+    assert received[0].state == {"monday": 80}
+
+
+def test_responses_are_routed_by_client_token():
+    connection = FakeConnection()
+    router = ShadowRouter(connection)
+    received = []
+    router.register("zoe", None, {"get/accepted": received.append})
+    token = router.new_token("get", "zoe")
+
+    topic = "$aws/things/zoe/shadow/get/accepted"
+    connection.deliver(topic, {"clientToken": "someone-else", "version": 1})
+    connection.deliver(topic, {"clientToken": token, "version": 2})
+    connection.deliver(topic, {"clientToken": token, "version": 3})
+    assert [r.version for r in received] == [2]
+
+
+def test_response_latency_is_recorded(clock):
+    connection = FakeConnection()
+    router = ShadowRouter(connection, clock=clock)
+    router.register("zoe", "charge_intent", {})
+    token = router.new_token("get", "zoe", "charge_intent")
+    clock.now += 0.2
+    connection.deliver(
+        "$aws/things/zoe/shadow/name/charge_intent/get/accepted",
+        {"clientToken": token, "version": 1},
+    )
+    stats = router.stats.snapshot()["zoe/charge_intent/get"]
+    assert stats["accepted"] == 1
+    assert stats["max_ms"] == pytest.approx(200)
+
+
+def test_unanswered_requests_time_out(clock):
+    connection = FakeConnection()
+    router = ShadowRouter(connection, timeout=30, clock=clock)
+    received = []
+    router.register("car_heater", None, {"update/accepted": received.append})
+    token = router.new_token("update", "car_heater")
+    clock.now += 31
+    router.expire_requests()
+    connection.deliver(
+        "$aws/things/car_heater/shadow/update/accepted",
+        {"clientToken": token, "version": 1},
+    )
+    assert received == []
+    assert router.stats.snapshot()["car_heater/update"]["timeouts"] == 1
+
+
+def test_a_shadow_is_registered_once_only():
+    router = ShadowRouter(FakeConnection())
+    router.register("zoe", "charge_intent", {})
+    router.register("zoe", None, {})
+    with pytest.raises(ValueError):
+        router.register("zoe", None, {})
@@ -0,0 +1,37 @@
+import pytest
+from .stats import LatencyHistogram, ShadowStats
+
+
+@pytest.mark.parametrize(
+    "latencies,q,expected",
+    [
+        ([], 0.5, None),
+        ([5], 0.5, 5),
+        ([5, 30, 40, 80], 0.5, 50),
+        ([5, 30, 40, 80], 0.95, 80),
+        ([5] * 19 + [700], 0.95, 10),
+        ([20000], 0.5, 20000),
+    ],
+)
+def test_quantile(latencies, q, expected):
+    histogram = LatencyHistogram()
+    for latency in latencies:
+        histogram.record(latency, accepted=True)
+    assert histogram.quantile(q) == expected
+
+
+def test_snapshot_counts_by_request():
+    stats = ShadowStats()
+    heater = ShadowStats.name("car_heater", None, "update")
+    intent = ShadowStats.name("car_status", "charge_intent", "get")
+    stats.record(heater, 120, accepted=True)
+    stats.record(heater, 90, accepted=False)
+    stats.timeout(heater)
+    stats.record(intent, 40, accepted=True)
+
+    snapshot = stats.snapshot()
+    assert list(snapshot) == ["car_heater/update", "car_status/charge_intent/get"]
+    assert snapshot["car_heater/update"]["accepted"] == 1
+    assert snapshot["car_heater/update"]["rejected"] == 1
+    assert snapshot["car_heater/update"]["timeouts"] == 1
+    assert snapshot["car_heater/update"]["max_ms"] == 120
@@ -0,0 +1,131 @@
+"""
+Measures what a Lambda cold start costs locally: importing the handler
+module, then the first invocation of each kind of request. Each sample runs
+in a fresh interpreter so that nothing is already imported.
+
+    python bench_startup.py [--repeat N]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import lambda_function
+imported = time.perf_counter()
+event = json.loads(sys.argv[1])
+first = None
+if event is not None:
+    lambda_function.lambda_handler(event, None)
+    first = time.perf_counter() - imported
+client = None
+if sys.argv[2] == "client":
+    from iot_data import iot_data
+    before = time.perf_counter()
+    iot_data()
+    client = time.perf_counter() - before
+print(json.dumps({
+    "import": imported - start,
+    "first_invoke": first,
+    "client": client,
+    "modules": sorted(m for m in ["ask_sdk_core", "boto3"] if m in sys.modules),
+}))
+"""
+
+
+def event(request: dict) -> dict:
+    return {
+        "version": "1.0",
+        "session": {
+            "new": True,
+            "sessionId": "session",
+            "application": {"applicationId": "skill"},
+            "user": {"userId": "user"},
+            "attributes": {},
+        },
+        "context": {
+            "System": {
+                "application": {"applicationId": "skill"},
+                "user": {"userId": "user"},
+                "apiEndpoint": "https://api.amazonalexa.com",
+            }
+        },
+        "request": {
+            "requestId": "request",
+            "timestamp": "2024-08-28T17:43:00Z",
+            "locale": "en-GB",
+            **request,
+        },
+    }
+
+
+CASES = {
+    "import only": (None, ""),
+    "LaunchRequest": (event({"type": "LaunchRequest"}), ""),
+    "HelpIntent": (
+        event(
+            {
+                "type": "IntentRequest",
+                "intent": {"name": "AMAZON.HelpIntent", "confirmationStatus": "NONE"},
+            }
+        ),
+        "",
+    ),
+    # an intent the skill doesn't know, so the SDK is loaded but AWS isn't called
+    "skill dispatch": (
+        event(
+            {
+                "type": "IntentRequest",
+                "intent": {"name": "unknown", "confirmationStatus": "NONE"},
+            }
+        ),
+        "",
+    ),
+    "iot-data client": (None, "client"),
+}
+
+
+def sample(case: str) -> dict:
+    request, client = CASES[case]
+    env = {"AWS_DEFAULT_REGION": "eu-west-1", **os.environ}
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, json.dumps(request), client],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout)
+
+
+def ms(values: list[float | None]) -> str:
+    values = [v for v in values if v is not None]
+    return f"{statistics.median(values) * 1000:.1f}" if values else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(
+        f"{'case':<16} {'import ms':>10} {'1st call ms':>12} {'client ms':>10}  loaded"
+    )
+    for case in CASES:
+        samples = [sample(case) for _ in range(args.repeat)]
+        print(
+            f"{case:<16} {ms([s['import'] for s in samples]):>10}"
+            f" {ms([s['first_invoke'] for s in samples]):>12}"
+            f" {ms([s['client'] for s in samples]):>10}"
+            f"  {','.join(samples[-1]['modules']) or '-'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
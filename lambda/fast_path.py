@@ -0,0 +1,64 @@
+from typing import Any
+
+# Requests answered with fixed speech, as (speech, reprompt). A reprompt
+# keeps the session open for the user to reply.
+LAUNCH = (
+    "Welcome. Which would you like to try?",
+    "Welcome. Which would you like to try?",
+)
+HELP = (
+    "You can say hello to me! How can I help?",
+    "You can say hello to me! How can I help?",
+)
+GOODBYE = ("Goodbye!", None)
+FALLBACK = (
+    "Hmm, I'm not sure. You can say Hello or Help. What would you like to do?",
+    "I didn't catch that. What can I help you with?",
+)
+
+STATIC_REQUESTS = {
+    "LaunchRequest": LAUNCH,
+    "SessionEndedRequest": None,
+}
+
+STATIC_INTENTS = {
+    "AMAZON.HelpIntent": HELP,
+    "AMAZON.CancelIntent": GOODBYE,
+    "AMAZON.StopIntent": GOODBYE,
+    "AMAZON.FallbackIntent": FALLBACK,
+}
+
+
+def _speech(text: str) -> dict:
+    return {"type": "SSML", "ssml": f"<speak>{text}</speak>"}
+
+
+def static_response(event: dict[str, Any]) -> dict | None:
+    """
+    The response envelope for a request which needs neither AWS nor the
+    skill SDK, or None if the request has to go through the skill
+    """
+    request = event.get("request", {})
+    request_type = request.get("type")
+    if request_type in STATIC_REQUESTS:
+        reply = STATIC_REQUESTS[request_type]
+    elif request_type == "IntentRequest":
+        name = request.get("intent", {}).get("name")
+        if name not in STATIC_INTENTS:
+            return None
+        reply = STATIC_INTENTS[name]
+    else:
+        return None
+
+    response = {}
+    if reply is not None:
+        speech, reprompt = reply
+        response["outputSpeech"] = _speech(speech)
+        if reprompt is not None:
+            response["reprompt"] = {"outputSpeech": _speech(reprompt)}
+            response["shouldEndSession"] = False
+
+    envelope = {"version": "1.0", "response": response}
+    if "session" in event:
+        envelope["sessionAttributes"] = event["session"].get("attributes") or {}
+    return envelope
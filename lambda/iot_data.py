@@ -1,48 +1,104 @@
 from dataclasses import dataclass
-import boto3
 import datetime as dt
+import functools
 import json
-
-from model import ChargeIntent, charge_intent, prune_charge_intent_dict
-
-
-iot_data = boto3.client("iot-data")
+import os
+
+from model import ChargeIntent, charge_intent, charge_intent_delta
+from shadow_cache import ShadowCache
+
+# shadows live as long as the container, so a warm container can answer
+# repeated questions without calling AWS
+shadow_cache = ShadowCache(ttl=float(os.getenv("SHADOW_CACHE_TTL", "60")))
+
+# how many times a versioned write is retried after losing a race
+CONFLICT_RETRIES = 2
+
+
+@functools.cache
+def iot_data():
+    """
+    The IoT data plane client, created on first use so that requests which
+    don't touch AWS don't pay for importing boto3
+    """
+    import boto3
+
+    return boto3.client("iot-data")
+
+
+def _shadow_args(thing_name: str, shadow_name: str | None) -> dict:
+    args = {"thingName": thing_name}
+    if shadow_name is not None:
+        args["shadowName"] = shadow_name
+    return args
+
+
+def fetch_shadow(thing_name: str, shadow_name: str | None = None) -> dict:
+    try:
+        response = iot_data().get_thing_shadow(**_shadow_args(thing_name, shadow_name))
+        document = json.load(response["payload"])
+    except iot_data().exceptions.ResourceNotFoundException:
+        document = {}
+    shadow_cache.put(thing_name, shadow_name, document)
+    return document
+
+
+def get_shadow(thing_name: str, shadow_name: str | None = None) -> dict:
+    document = shadow_cache.get(thing_name, shadow_name)
+    if document is None:
+        document = fetch_shadow(thing_name, shadow_name)
+    return document
+
+
+def update_desired(
+    thing_name: str,
+    shadow_name: str | None,
+    desired: dict,
+    version: int | None = None,
+):
+    """
+    Merge keys into the desired state. If a version is given, the update is
+    rejected with a ConflictException unless the shadow is still at it.
+    """
+    update = {"state": {"desired": desired}}
+    if version is not None:
+        update["version"] = version
+    response = iot_data().update_thing_shadow(
+        **_shadow_args(thing_name, shadow_name), payload=json.dumps(update)
+    )
+    accepted = json.load(response["payload"])
+    shadow_cache.update(thing_name, shadow_name, desired, accepted.get("version"))
 
 
 def set_hvac(enable: bool):
     desired_state = "on" if enable else "off"
-
-    desired_shadow = {"state": {"desired": {"state": desired_state}}}
-    iot_data.update_thing_shadow(
-        thingName="car_heater", payload=json.dumps(desired_shadow)
-    )
-
+    update_desired("car_heater", None, {"state": desired_state})
     return enable
 
 
 def set_charge_level(
     target_charge_level: int, target_charge_date: dt.date
 ) -> ChargeIntent:
-    shadow = iot_data.get_thing_shadow(
-        thingName="car_status", shadowName="charge_intent"
-    )
-    charge_intent_by_date = json.load(shadow["payload"])
-
-    charge_intent_by_date = prune_charge_intent_dict(
-        charge_intent_by_date, dt.datetime.now()
-    )
-    intent = charge_intent(target_charge_level, target_charge_date, dt.datetime.now())
-    charge_intent_by_date = intent.update_dict(charge_intent_by_date)
-
-    desired_shadow = {"state": {"desired": charge_intent_by_date}}
-
-    iot_data.update_thing_shadow(
-        thingName="car_status",
-        shadowName="charge_intent",
-        payload=json.dumps(desired_shadow),
-    )
-
-    return intent
+    now = dt.datetime.now()
+    intent = charge_intent(target_charge_level, target_charge_date, now)
+
+    # Only the new date and deletions of expired ones are sent, checked
+    # against the version of the document they were worked out from. A warm
+    # container can use the version it last saw and skip the read; if the
+    # shadow has moved on since, the write is rejected and retried.
+    shadow = shadow_cache.last_known("car_status", "charge_intent")
+    for attempt in range(CONFLICT_RETRIES + 1):
+        if shadow is None:
+            shadow = fetch_shadow("car_status", "charge_intent")
+        current = shadow.get("state", {}).get("desired", {})
+        delta = charge_intent_delta(intent, current, now)
+        try:
+            update_desired("car_status", "charge_intent", delta, shadow.get("version"))
+            return intent
+        except iot_data().exceptions.ConflictException:
+            if attempt == CONFLICT_RETRIES:
+                raise
+            shadow = None
 
 
 @dataclass
@@ -52,8 +108,7 @@ class BatteryLevel:
 
 
 def get_battery_level() -> BatteryLevel:
-    shadow = iot_data.get_thing_shadow(thingName="car_status")
-    status = json.load(shadow["payload"])
+    status = get_shadow("car_status")
 
     data = status.get("state", {}).get("reported", {}).get("state", {})
     battery_level = data.get("battery_level")
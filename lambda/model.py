@@ -38,3 +38,15 @@ def prune_charge_intent_dict(
             return True
 
     return {(date): charge for date, charge in intent.items() if not expired(date)}
+
+
+def charge_intent_delta(
+    intent: ChargeIntent, current: dict[str, int], now: dt.datetime
+) -> dict[str, int | None]:
+    """
+    The desired state update which records an intent: its own date, plus a
+    null for every expired date so that the shadow service deletes it
+    """
+    expired = set(current) - set(prune_charge_intent_dict(current, now))
+    delta: dict[str, int | None] = {date: None for date in sorted(expired)}
+    return intent.update_dict(delta)
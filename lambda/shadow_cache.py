@@ -0,0 +1,91 @@
+from dataclasses import dataclass
+from typing import Callable
+import time
+
+
+@dataclass
+class CachedShadow:
+    document: dict
+    version: int | None
+    fetched_at: float
+
+
+def merge_state(state: dict, update: dict) -> dict:
+    """
+    Apply an update to a shadow state section the way the shadow service
+    does: dicts are merged key by key, and a None value deletes the key
+    """
+    merged = dict(state)
+    for key, value in update.items():
+        if value is None:
+            merged.pop(key, None)
+        elif isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_state(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+class ShadowCache:
+    """
+    Shadow documents fetched by this container, kept for ttl seconds so that
+    a warm container can answer repeated requests without calling AWS
+    """
+
+    def __init__(self, ttl: float = 60, clock: Callable[[], float] = time.monotonic):
+        self._ttl = ttl
+        self._clock = clock
+        self._shadows: dict[tuple[str, str | None], CachedShadow] = {}
+
+    def get(self, thing_name: str, shadow_name: str | None = None) -> dict | None:
+        cached = self._shadows.get((thing_name, shadow_name))
+        if cached is None or self._clock() - cached.fetched_at > self._ttl:
+            return None
+        return cached.document
+
+    def version(self, thing_name: str, shadow_name: str | None = None) -> int | None:
+        cached = self._shadows.get((thing_name, shadow_name))
+        return None if cached is None else cached.version
+
+    def last_known(
+        self, thing_name: str, shadow_name: str | None = None
+    ) -> dict | None:
+        """
+        The cached document however old it is, for writes which are checked
+        against its version anyway
+        """
+        cached = self._shadows.get((thing_name, shadow_name))
+        return None if cached is None else cached.document
+
+    def put(self, thing_name: str, shadow_name: str | None, document: dict):
+        self._shadows[(thing_name, shadow_name)] = CachedShadow(
+            document, document.get("version"), self._clock()
+        )
+
+    def update(
+        self,
+        thing_name: str,
+        shadow_name: str | None,
+        desired: dict,
+        version: int | None,
+    ):
+        """
+        Apply a write this container has made, so the cached copy stays valid
+        without fetching it again. Nothing is cached if the document wasn't.
+        """
+        cached = self._shadows.get((thing_name, shadow_name))
+        if cached is None:
+            return
+        state = cached.document.get("state", {})
+        cached.document = {
+            **cached.document,
+            "state": {
+                **state,
+                "desired": merge_state(state.get("desired", {}), desired),
+            },
+            "version": version,
+        }
+        cached.version = version
+
+    def invalidate(self, thing_name: str, shadow_name: str | None = None):
+        self._shadows.pop((thing_name, shadow_name), None)
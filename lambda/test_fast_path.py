@@ -0,0 +1,110 @@
+import pytest
+from fast_path import static_response
+
+
+def event(request: dict, session: bool = True) -> dict:
+    event = {
+        "version": "1.0",
+        "context": {
+            "System": {
+                "application": {"applicationId": "skill"},
+                "user": {"userId": "user"},
+                "apiEndpoint": "https://api.amazonalexa.com",
+            }
+        },
+        "request": {
+            "requestId": "request",
+            "timestamp": "2024-08-28T17:43:00Z",
+            "locale": "en-GB",
+            **request,
+        },
+    }
+    if session:
+        event["session"] = {
+            "new": True,
+            "sessionId": "session",
+            "application": {"applicationId": "skill"},
+            "user": {"userId": "user"},
+            "attributes": {},
+        }
+    return event
+
+
+def intent(name: str) -> dict:
+    return {
+        "type": "IntentRequest",
+        "intent": {"name": name, "confirmationStatus": "NONE"},
+    }
+
+
+STATIC = [
+    {"type": "LaunchRequest"},
+    {"type": "SessionEndedRequest", "reason": "USER_INITIATED"},
+    intent("AMAZON.HelpIntent"),
+    intent("AMAZON.CancelIntent"),
+    intent("AMAZON.StopIntent"),
+    intent("AMAZON.FallbackIntent"),
+]
+
+
+@pytest.mark.parametrize(
+    "request_,expected",
+    [
+        (
+            {"type": "LaunchRequest"},
+            {
+                "outputSpeech": {
+                    "type": "SSML",
+                    "ssml": "<speak>Welcome. Which would you like to try?</speak>",
+                },
+                "reprompt": {
+                    "outputSpeech": {
+                        "type": "SSML",
+                        "ssml": "<speak>Welcome. Which would you like to try?</speak>",
+                    }
+                },
+                "shouldEndSession": False,
+            },
+        ),
+        (
+            intent("AMAZON.StopIntent"),
+            {"outputSpeech": {"type": "SSML", "ssml": "<speak>Goodbye!</speak>"}},
+        ),
+        ({"type": "SessionEndedRequest", "reason": "USER_INITIATED"}, {}),
+    ],
+)
+def test_static_response(request_, expected):
+    assert static_response(event(request_)) == {
+        "version": "1.0",
+        "response": expected,
+        "sessionAttributes": {},
+    }
+
+
+def test_static_response_without_session_has_no_attributes():
+    assert "sessionAttributes" not in static_response(
+        event({"type": "LaunchRequest"}, session=False)
+    )
+
+
+@pytest.mark.parametrize(
+    "request_",
+    [
+        intent("enable_hvac"),
+        intent("set_charge_target"),
+        intent("get_battery_level"),
+        {"type": "CanFulfillIntentRequest"},
+    ],
+)
+def test_requests_needing_the_skill_are_not_answered(request_):
+    assert static_response(event(request_)) is None
+
+
+@pytest.mark.parametrize("request_", STATIC)
+def test_static_response_matches_skill(request_):
+    pytest.importorskip("ask_sdk_core")
+    from skill import lambda_handler
+
+    response = lambda_handler(event(request_), None)
+    response.pop("userAgent", None)
+    assert static_response(event(request_)) == response
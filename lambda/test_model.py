@@ -1,6 +1,11 @@
 import datetime as dt
 import pytest
-from model import ChargeIntent, charge_intent, prune_charge_intent_dict
+from model import (
+    ChargeIntent,
+    charge_intent,
+    charge_intent_delta,
+    prune_charge_intent_dict,
+)
 
 
 def test_charge_intent_for_today_actually_means_tomorrow_before_5am():
@@ -64,3 +69,21 @@ def test_prune_removed_entries_before_today():
         "2024-08-29": 90,
         "2024-09-01": 80,
     }
+
+
+@pytest.mark.parametrize(
+    "current,expected",
+    [
+        ({}, {"2024-08-29": 80}),
+        ({"2024-08-29": 60, "2024-08-30": 70}, {"2024-08-29": 80}),
+        (
+            {"2024-08-26": 60, "2024-08-27": 70, "2024-08-30": 70},
+            {"2024-08-26": None, "2024-08-27": None, "2024-08-29": 80},
+        ),
+        ({"garbage": 1}, {"garbage": None, "2024-08-29": 80}),
+    ],
+)
+def test_charge_intent_delta(current, expected):
+    intent = ChargeIntent(80, dt.date(2024, 8, 29))
+    now = dt.datetime(2024, 8, 28, 17, 43, 0)
+    assert charge_intent_delta(intent, current, now) == expected
@@ -0,0 +1,60 @@
+import pytest
+from shadow_cache import ShadowCache, merge_state
+
+
+STATUS = {
+    "state": {"reported": {"state": {"battery_level": 80, "estimated_range": 250}}},
+    "version": 12,
+}
+
+
+def test_shadow_is_cached_for_ttl(clock):
+    cache = ShadowCache(ttl=60, clock=clock)
+    assert cache.get("car_status") is None
+    cache.put("car_status", None, STATUS)
+    clock.now += 60
+    assert cache.get("car_status") == STATUS
+    assert cache.version("car_status") == 12
+    clock.now += 1
+    assert cache.get("car_status") is None
+
+
+def test_shadows_are_keyed_by_thing_and_shadow_name():
+    cache = ShadowCache()
+    cache.put("car_status", None, STATUS)
+    assert cache.get("car_status", "charge_intent") is None
+    assert cache.get("car_heater") is None
+
+
+def test_write_updates_cached_desired_state_and_version():
+    cache = ShadowCache()
+    cache.put(
+        "car_status",
+        "charge_intent",
+        {"state": {"desired": {"2024-08-28": 80, "2024-08-29": 60}}, "version": 3},
+    )
+    cache.update("car_status", "charge_intent", {"2024-08-29": 90}, 4)
+    assert cache.get("car_status", "charge_intent") == {
+        "state": {"desired": {"2024-08-28": 80, "2024-08-29": 90}},
+        "version": 4,
+    }
+    assert cache.version("car_status", "charge_intent") == 4
+
+
+def test_write_to_uncached_shadow_caches_nothing():
+    cache = ShadowCache()
+    cache.update("car_heater", None, {"state": "on"}, 7)
+    assert cache.get("car_heater") is None
+
+
+@pytest.mark.parametrize(
+    "state,update,expected",
+    [
+        ({"a": 1}, {"b": 2}, {"a": 1, "b": 2}),
+        ({"a": 1, "b": 2}, {"a": None}, {"b": 2}),
+        ({"state": {"a": 1, "b": 2}}, {"state": {"b": 3}}, {"state": {"a": 1, "b": 3}}),
+        ({"state": "off"}, {"state": "on"}, {"state": "on"}),
+    ],
+)
+def test_merge_state(state, update, expected):
+    assert merge_state(state, update) == expected
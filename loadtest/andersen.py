@@ -0,0 +1,84 @@
+import datetime as dt
+from dataclasses import dataclass
+
+from .service import Service, ServiceProfile, ServiceError
+
+
+@dataclass
+class FakeCharger:
+    id: str
+    name: str
+    max_grid_charge_percent: int = 0
+    solar_override_start: dt.datetime | None = None
+
+
+class FakeAndersen:
+    """
+    Stand-in for the Andersen GraphQL API. client makes clients with the
+    calls of andersen_ev.AndersenA2 that devices.andersen uses, blocking for
+    their latency as the real ones do; pass it as the client_factory of an
+    AndersenConnection.
+    """
+
+    def __init__(self, profile: ServiceProfile = ServiceProfile(), seed=None):
+        self.service = Service("andersen", profile, seed)
+        self.chargers: dict[str, FakeCharger] = {}
+
+    def add_charger(self, name: str) -> FakeCharger:
+        charger = FakeCharger(f"device-{len(self.chargers)}", name)
+        self.chargers[charger.id] = charger
+        return charger
+
+    def client(self) -> "FakeAndersenClient":
+        return FakeAndersenClient(self)
+
+
+class FakeAndersenClient:
+    def __init__(self, andersen: FakeAndersen):
+        self._service = andersen.service
+        self._chargers = andersen.chargers
+        self._authenticated = False
+
+    def _charger(self, device_id: str) -> FakeCharger:
+        if not self._authenticated:
+            raise ServiceError("andersen: not authenticated")
+        return self._chargers[device_id]
+
+    def authenticate(self, username: str, password: str):
+        self._service.call_blocking("authenticate")
+        self._authenticated = True
+
+    def device_by_name(self, name: str) -> dict:
+        self._service.call_blocking("device_by_name")
+        charger = next(c for c in self._chargers.values() if c.name == name)
+        return {"id": charger.id, "friendlyName": charger.name}
+
+    def get_device_solar(self, deviceId: str) -> dict:
+        self._service.call_blocking("get_device_solar")
+        start = self._charger(deviceId).solar_override_start
+        return {
+            "getDevice": {
+                "deviceInfo": {
+                    "solarOverrideStart": start.isoformat() if start else None
+                }
+            }
+        }
+
+    def get_device_status(self, deviceId: str) -> dict:
+        self._service.call_blocking("get_device_status")
+        charger = self._charger(deviceId)
+        return {
+            "deviceStatus": {
+                "solarMaxGridChargePercent": charger.max_grid_charge_percent
+            }
+        }
+
+    def set_solar(
+        self,
+        deviceId: str,
+        override: bool,
+        chargeAlways: bool,
+        maxGridChargePercent: int,
+    ):
+        self._service.call_blocking("set_solar")
+        self._charger(deviceId).max_grid_charge_percent = maxGridChargePercent
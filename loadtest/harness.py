@@ -0,0 +1,226 @@
+"""
+Drives the daemon's real update path for a fleet of simulated cars against
+the stand-in services, and reports throughput and tick latency
+
+    python -m loadtest.harness --cars 500 --rounds 5 --renault-latency 0.3
+"""
+
+import argparse
+import asyncio
+import datetime as dt
+import json
+import logging
+import random
+import time
+import numpy as np
+
+from devices.andersen import AndersenConnection
+from devices.ratelimit import RateLimiter, Unlimited
+from devices.status_cache import StatusCache
+from devices.vehicle import Credentials, VehicleConnection
+from fleet import AndersenCredentials, CarConfig
+from iot import IoTClient, ShadowWriteBuffer
+from main import Car
+
+from .andersen import FakeAndersen
+from .iot import FakeShadowService
+from .renault import FakeRenault
+from .service import ServiceProfile
+
+SERVICES = ["renault", "andersen", "iot"]
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cars", type=int, default=200)
+    parser.add_argument("--cars-per-account", type=int, default=1)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--client-rpm",
+        type=float,
+        default=None,
+        help="the daemon's own rate limit for each API; unlimited if unset",
+    )
+    for service in SERVICES:
+        profile = ServiceProfile()
+        parser.add_argument(f"--{service}-latency", type=float, default=profile.latency)
+        parser.add_argument(f"--{service}-jitter", type=float, default=profile.jitter)
+        parser.add_argument(f"--{service}-errors", type=float, default=0.0)
+        parser.add_argument(
+            f"--{service}-rpm",
+            type=float,
+            default=None,
+            help="requests per minute the service accepts before refusing",
+        )
+        parser.add_argument(f"--{service}-burst", type=int, default=profile.burst)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--verbose", action="store_true")
+    return parser.parse_args(argv)
+
+
+def profile(args: argparse.Namespace, service: str) -> ServiceProfile:
+    return ServiceProfile(
+        latency=getattr(args, f"{service}_latency"),
+        jitter=getattr(args, f"{service}_jitter"),
+        error_rate=getattr(args, f"{service}_errors"),
+        requests_per_minute=getattr(args, f"{service}_rpm"),
+        burst=getattr(args, f"{service}_burst"),
+    )
+
+
+def percentiles(seconds: list[float]) -> dict[str, float]:
+    if not seconds:
+        return {}
+    p50, p90, p99 = np.percentile(seconds, [50, 90, 99])
+    return {"p50": p50, "p90": p90, "p99": p99, "max": max(seconds)}
+
+
+async def run(args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+    renault = FakeRenault(profile(args, "renault"), args.seed)
+    andersen = FakeAndersen(profile(args, "andersen"), args.seed)
+    shadows = FakeShadowService(profile(args, "iot"), args.seed)
+    iot_data = shadows.iot_data()
+
+    tomorrow = (dt.date.today() + dt.timedelta(days=1)).isoformat()
+    configs = []
+    fake_cars = []
+    for n in range(args.cars):
+        name = f"car{n:04d}"
+        account = f"driver{n // args.cars_per_account}@example.com"
+        fake_cars.append(
+            renault.add_car(account, name.upper(), battery_level=rng.uniform(20, 90))
+        )
+        andersen.add_charger(name)
+        configs.append(
+            CarConfig(
+                name=name,
+                renault=Credentials(account, "password", name.upper()),
+                andersen=AndersenCredentials(account, "password", name),
+                heater_thing=f"{name}_heater",
+                status_thing=f"{name}_status",
+            )
+        )
+        shadows.update(
+            (configs[-1].status_thing, configs[-1].charge_intent_shadow),
+            {"desired": {tomorrow: rng.choice([60, 80, 100])}},
+        )
+
+    def limiter():
+        if args.client_rpm is None:
+            return Unlimited()
+        return RateLimiter(args.client_rpm, 10)
+
+    vehicles = VehicleConnection(limiter(), StatusCache(), login_factory=renault.login)
+    chargers = AndersenConnection(limiter(), client_factory=andersen.client)
+    iot_client = IoTClient(shadows.connect())
+    reports = ShadowWriteBuffer()
+    concurrency = asyncio.Semaphore(args.concurrency)
+    cars = [
+        Car(
+            config,
+            iot_client,
+            vehicles,
+            chargers,
+            concurrency,
+            reports,
+            iot_data=iot_data,
+        )
+        for config in configs
+    ]
+
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(asyncio.wrap_future(iot_client.ready()), timeout=60)
+    except Exception as e:
+        # as in the daemon, the first update reads the shadows directly
+        logging.warning(f"IoT shadows not ready: {e!r}")
+    ready_seconds = time.perf_counter() - started
+
+    async def timed_update(car: Car) -> float | None:
+        started = time.perf_counter()
+        try:
+            await car.update()
+        except Exception as e:
+            logging.error(f"{car.config.name}: update failed: {e}")
+            return None
+        return time.perf_counter() - started
+
+    ticks: list[float] = []
+    rounds: list[float] = []
+    failed = 0
+    try:
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            results = await asyncio.gather(*(timed_update(car) for car in cars))
+            rounds.append(time.perf_counter() - started)
+            ticks.extend(r for r in results if r is not None)
+            failed += sum(r is None for r in results)
+
+            # the cars drive and charge between rounds, and some of their
+            # drivers change their minds, arriving as shadow deltas
+            for car in fake_cars:
+                car.battery_level = min(
+                    100, max(5, car.battery_level + rng.gauss(0, 5))
+                )
+            for config in rng.sample(configs, len(configs) // 10):
+                shadows.update(
+                    (config.status_thing, config.charge_intent_shadow),
+                    {"desired": {tomorrow: rng.choice([60, 80, 100])}},
+                )
+    finally:
+        reports.flush()
+        await vehicles.close()
+        chargers.close()
+        shadows.close()
+
+    total = sum(rounds)
+    return {
+        "cars": args.cars,
+        "rounds": args.rounds,
+        "shadows_ready_s": ready_seconds,
+        "ticks": len(ticks),
+        "failed": failed,
+        "ticks_per_s": len(ticks) / total if total else 0.0,
+        "tick_s": percentiles(ticks),
+        "round_s": percentiles(rounds),
+        "services": {
+            service.name: service.summary()
+            for service in (renault.service, andersen.service, shadows.service)
+        },
+        "shadow_stats": iot_client.shadow_stats(),
+    }
+
+
+def print_report(report: dict):
+    def times(p: dict[str, float]) -> str:
+        return " ".join(f"{k}={v * 1000:.0f}ms" for k, v in p.items())
+
+    print(
+        f"{report['cars']} cars, {report['rounds']} rounds: "
+        f"{report['ticks_per_s']:.1f} ticks/s, {report['failed']} failed"
+    )
+    print(f"shadows ready in {report['shadows_ready_s']:.2f}s")
+    print(f"tick  {times(report['tick_s'])}")
+    print(f"round {times(report['round_s'])}")
+    for name, summary in report["services"].items():
+        print(
+            f"{name}: calls={summary['calls']} errors={summary['errors']}"
+            f" rate_limited={summary['rate_limited']}"
+        )
+
+
+def main(argv: list[str] | None = None):
+    args = parse_args(argv)
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
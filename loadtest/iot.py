@@ -0,0 +1,338 @@
+import functools
+import heapq
+import io
+import itertools
+import json
+import logging
+import threading
+import time
+from awscrt import mqtt
+from concurrent.futures import Future
+from types import SimpleNamespace
+from typing import Callable
+
+from .service import RateLimited, Service, ServiceError, ServiceProfile
+
+ShadowKey = tuple[str, str | None]
+
+
+class ResourceNotFoundException(ServiceError):
+    pass
+
+
+class ConflictException(ServiceError):
+    pass
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    filter_parts, parts = topic_filter.split("/"), topic.split("/")
+    for i, part in enumerate(filter_parts):
+        if part == "#":
+            return True
+        if i >= len(parts) or (part != "+" and part != parts[i]):
+            return False
+    return len(filter_parts) == len(parts)
+
+
+def parse_request(topic: str) -> tuple[ShadowKey, str] | None:
+    """
+    The shadow and operation ("get" or "update") of a request topic
+    """
+    parts = topic.split("/")
+    if len(parts) < 5 or parts[:2] != ["$aws", "things"] or parts[3] != "shadow":
+        return None
+    if len(parts) == 7 and parts[4] == "name":
+        return (parts[2], parts[5]), parts[6]
+    if len(parts) == 5:
+        return (parts[2], None), parts[4]
+    return None
+
+
+def shadow_topic(key: ShadowKey, operation: str) -> str:
+    thing_name, shadow_name = key
+    if shadow_name is None:
+        return f"$aws/things/{thing_name}/shadow/{operation}"
+    return f"$aws/things/{thing_name}/shadow/name/{shadow_name}/{operation}"
+
+
+def _merge(state: dict, update: dict) -> dict:
+    # as the shadow service merges: key by key, with None deleting
+    merged = dict(state)
+    for key, value in update.items():
+        if value is None:
+            merged.pop(key, None)
+        elif isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _delta(desired: dict, reported: dict) -> dict:
+    return {k: v for k, v in desired.items() if reported.get(k) != v}
+
+
+def _snapshot(document: dict) -> dict:
+    return {
+        "state": {"desired": document["desired"], "reported": document["reported"]},
+        "metadata": {},
+        "version": document["version"],
+    }
+
+
+class _Dispatcher:
+    """
+    Runs callbacks at their due times on a thread of its own, as messages
+    arrive on the MQTT client's thread
+    """
+
+    def __init__(self):
+        self._queue: list = []
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="fake-iot", daemon=True)
+        self._thread.start()
+
+    def at(self, delay: float, fn: Callable, *args):
+        with self._condition:
+            heapq.heappush(
+                self._queue, (time.monotonic() + delay, next(self._order), fn, args)
+            )
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed:
+                    if self._queue:
+                        wait = self._queue[0][0] - time.monotonic()
+                        if wait <= 0:
+                            break
+                        self._condition.wait(wait)
+                    else:
+                        self._condition.wait()
+                if self._closed:
+                    return
+                _, _, fn, args = heapq.heappop(self._queue)
+            try:
+                fn(*args)
+            except Exception as e:
+                logging.error("fake iot callback failed error=%s", e)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+
+class FakeShadowService:
+    """
+    Stand-in for the AWS IoT shadow service, reached over MQTT through the
+    connections made by connect, as the daemon does, or through the
+    iot-data client made by iot_data. Updates made either way are
+    published to every connection's subscribers.
+    """
+
+    def __init__(self, profile: ServiceProfile = ServiceProfile(), seed=None):
+        self.service = Service("iot", profile, seed)
+        self._lock = threading.Lock()
+        self._documents: dict[ShadowKey, dict] = {}
+        self._connections: list["FakeMqttConnection"] = []
+        self._dispatcher = _Dispatcher()
+
+    def connect(self) -> "FakeMqttConnection":
+        connection = FakeMqttConnection(self)
+        self._connections.append(connection)
+        return connection
+
+    def iot_data(self) -> "FakeIotData":
+        return FakeIotData(self)
+
+    def close(self):
+        self._dispatcher.close()
+
+    def document(self, thing_name: str, shadow_name: str | None = None) -> dict | None:
+        with self._lock:
+            document = self._documents.get((thing_name, shadow_name))
+            return None if document is None else dict(document)
+
+    def get(self, key: ShadowKey) -> dict:
+        with self._lock:
+            document = self._documents.get(key)
+            if document is None:
+                raise ResourceNotFoundException(f"No shadow exists with name: {key}")
+            state = {
+                "desired": document["desired"],
+                "reported": document["reported"],
+                "delta": _delta(document["desired"], document["reported"]),
+            }
+            return {
+                "state": {k: v for k, v in state.items() if v},
+                "metadata": {},
+                "version": document["version"],
+                "timestamp": int(time.time()),
+            }
+
+    def update(
+        self,
+        key: ShadowKey,
+        state: dict,
+        client_token: str | None = None,
+        version: int | None = None,
+    ) -> dict:
+        """
+        Apply an update, publish its events and return the accepted response
+        """
+        with self._lock:
+            previous = self._documents.get(key)
+            current = previous or {"desired": {}, "reported": {}, "version": 0}
+            if version is not None and version != current["version"]:
+                raise ConflictException("Version conflict")
+            current = {
+                "desired": _merge(current["desired"], state.get("desired") or {}),
+                "reported": _merge(current["reported"], state.get("reported") or {}),
+                "version": current["version"] + 1,
+            }
+            self._documents[key] = current
+
+        timestamp = int(time.time())
+        token = {"clientToken": client_token} if client_token else {}
+        documents = {"current": _snapshot(current), "timestamp": timestamp, **token}
+        if previous is not None:
+            documents["previous"] = _snapshot(previous)
+        self._publish(shadow_topic(key, "update/documents"), documents)
+        delta = _delta(state.get("desired") or {}, current["reported"])
+        if delta:
+            self._publish(
+                shadow_topic(key, "update/delta"),
+                {
+                    "state": delta,
+                    "metadata": {},
+                    "version": current["version"],
+                    "timestamp": timestamp,
+                    **token,
+                },
+            )
+        return {
+            "state": state,
+            "metadata": {},
+            "version": current["version"],
+            "timestamp": timestamp,
+            **token,
+        }
+
+    def _publish(self, topic: str, payload: dict):
+        message = json.dumps(payload).encode()
+        for connection in self._connections:
+            for callback in connection.callbacks(topic):
+                self._dispatcher.at(
+                    0, functools.partial(callback, topic=topic, payload=message)
+                )
+
+    def request(self, topic: str, payload: bytes):
+        """
+        Answer a request published over MQTT, after the service's latency
+        """
+        parsed = parse_request(topic)
+        if parsed is None:
+            return
+        delay, error = self.service.outcome(parsed[1])
+        self._dispatcher.at(delay, self._answer, topic, parsed, payload, error)
+
+    def _answer(self, topic, parsed, payload: bytes, error: ServiceError | None):
+        key, operation = parsed
+        request = json.loads(payload or b"{}")
+        token = request.get("clientToken")
+        try:
+            if error is not None:
+                raise error
+            if operation == "get":
+                response = {**self.get(key), "clientToken": token}
+            elif operation == "update":
+                response = self.update(
+                    key, request.get("state", {}), token, request.get("version")
+                )
+            else:
+                return
+        except ServiceError as e:
+            code = {
+                ResourceNotFoundException: 404,
+                ConflictException: 409,
+                RateLimited: 429,
+            }.get(type(e), 500)
+            self._publish(
+                f"{topic}/rejected",
+                {"code": code, "message": str(e), "clientToken": token},
+            )
+            return
+        self._publish(f"{topic}/accepted", response)
+
+
+class FakeMqttConnection(mqtt.Connection):
+    """
+    An MQTT connection to a FakeShadowService, with the subscribe and
+    publish calls the shadow client and router make
+    """
+
+    def __init__(self, shadows: FakeShadowService):
+        # the real connection's setup is skipped; nothing leaves the process
+        self._shadows = shadows
+        self._subscriptions: list[tuple[str, Callable]] = []
+        self._packet_ids = itertools.count(1)
+
+    def _done(self) -> tuple[Future, int]:
+        future = Future()
+        future.set_result(None)
+        return future, next(self._packet_ids)
+
+    def subscribe(self, topic, qos, callback=None, **kwargs):
+        self._subscriptions.append((topic, callback))
+        return self._done()
+
+    def publish(self, topic, payload, qos, retain=False, **kwargs):
+        if isinstance(payload, str):
+            payload = payload.encode()
+        self._shadows.request(topic, payload)
+        return self._done()
+
+    def callbacks(self, topic: str) -> list[Callable]:
+        return [
+            callback
+            for topic_filter, callback in self._subscriptions
+            if callback is not None and topic_matches(topic_filter, topic)
+        ]
+
+
+class FakeIotData:
+    """
+    The shadow calls of a boto3 iot-data client, answered by a
+    FakeShadowService
+    """
+
+    exceptions = SimpleNamespace(
+        ResourceNotFoundException=ResourceNotFoundException,
+        ConflictException=ConflictException,
+    )
+
+    def __init__(self, shadows: FakeShadowService):
+        self._shadows = shadows
+
+    def get_thing_shadow(self, thingName: str, shadowName: str | None = None) -> dict:
+        self._shadows.service.call_blocking("get_thing_shadow")
+        document = self._shadows.get((thingName, shadowName))
+        return {"payload": io.BytesIO(json.dumps(document).encode())}
+
+    def update_thing_shadow(
+        self, thingName: str, payload: bytes | str, shadowName: str | None = None
+    ) -> dict:
+        self._shadows.service.call_blocking("update_thing_shadow")
+        request = json.loads(payload)
+        response = self._shadows.update(
+            (thingName, shadowName),
+            request.get("state", {}),
+            request.get("clientToken"),
+            request.get("version"),
+        )
+        return {"payload": io.BytesIO(json.dumps(response).encode())}
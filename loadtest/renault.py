@@ -0,0 +1,124 @@
+import datetime as dt
+from dataclasses import dataclass
+from types import SimpleNamespace
+
+from devices.vehicle import RenaultLogin
+from metrics import span
+
+from .service import Service, ServiceProfile
+
+
+@dataclass
+class FakeCar:
+    username: str
+    registration: str
+    vin: str
+    battery_level: float = 50
+    hvac: bool = False
+    charge_mode: str = "always_charging"
+    # start time and duration of the daily charge schedule
+    schedule: tuple[str, int] | None = None
+
+
+class FakeRenault:
+    """
+    Stand-in for the Renault account and Kamereon vehicle APIs, answering
+    the calls devices.vehicle makes from the cars added to it. Pass login
+    as the login_factory of a VehicleConnection.
+    """
+
+    def __init__(self, profile: ServiceProfile = ServiceProfile(), seed=None):
+        self.service = Service("renault", profile, seed)
+        self.cars: dict[str, FakeCar] = {}
+
+    def add_car(self, username: str, registration: str, **state) -> FakeCar:
+        car = FakeCar(username, registration, f"VF1{len(self.cars):014d}", **state)
+        self.cars[car.vin] = car
+        return car
+
+    def login(self, session, username: str, password: str, rate_limiter=None):
+        return _FakeLogin(self, session, username, password, rate_limiter)
+
+
+class _FakeLogin(RenaultLogin):
+    def __init__(self, renault: FakeRenault, *args):
+        super().__init__(*args)
+        self._renault = renault
+
+    async def _login(self):
+        async with self.rate_limiter:
+            with span("renault.login"):
+                await self._renault.service.call("login")
+        return _FakeAccount(self._renault, self._username)
+
+
+class _FakeAccount:
+    def __init__(self, renault: FakeRenault, username: str):
+        self._renault = renault
+        self._username = username
+
+    async def get_vehicles(self):
+        await self._renault.service.call("get_vehicles")
+        return SimpleNamespace(
+            vehicleLinks=[
+                SimpleNamespace(
+                    vin=car.vin,
+                    vehicleDetails=SimpleNamespace(registrationNumber=car.registration),
+                )
+                for car in self._renault.cars.values()
+                if car.username == self._username
+            ]
+        )
+
+    async def get_api_vehicle(self, vin: str):
+        # renault_api makes this locally, without a request
+        return _FakeVehicle(self._renault.service, self._renault.cars[vin])
+
+
+class _FakeVehicle:
+    def __init__(self, service: Service, car: FakeCar):
+        self._service = service
+        self._car = car
+        self.vin = car.vin
+
+    async def get_battery_status(self):
+        await self._service.call("get_battery_status")
+        level = int(self._car.battery_level)
+        return SimpleNamespace(
+            timestamp=dt.datetime.now().astimezone().isoformat(),
+            batteryLevel=level,
+            batteryAutonomy=level * 3,
+        )
+
+    async def get_hvac_status(self):
+        await self._service.call("get_hvac_status")
+        return "on" if self._car.hvac else "off"
+
+    async def set_ac_start(self, temperature: int):
+        await self._service.call("set_ac_start")
+        self._car.hvac = True
+
+    async def set_ac_stop(self):
+        await self._service.call("set_ac_stop")
+        self._car.hvac = False
+
+    async def get_charge_mode(self):
+        await self._service.call("get_charge_mode")
+        return SimpleNamespace(chargeMode=self._car.charge_mode)
+
+    async def set_charge_mode(self, mode: str):
+        await self._service.call("set_charge_mode")
+        self._car.charge_mode = mode
+
+    async def get_charging_settings(self):
+        await self._service.call("get_charging_settings")
+        if self._car.schedule is None:
+            return SimpleNamespace(schedules=[])
+        start, duration = self._car.schedule
+        day = SimpleNamespace(startTime=f"T{start}Z", duration=duration)
+        return SimpleNamespace(schedules=[SimpleNamespace(activated=True, monday=day)])
+
+    async def set_charge_schedules(self, schedules):
+        await self._service.call("set_charge_schedules")
+        day = schedules[0].monday
+        self._car.schedule = (day.startTime, day.duration)
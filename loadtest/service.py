@@ -0,0 +1,108 @@
+import asyncio
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable
+
+
+class ServiceError(Exception):
+    """
+    A failure injected by a stand-in service
+    """
+
+
+class RateLimited(ServiceError):
+    pass
+
+
+@dataclass
+class ServiceProfile:
+    # median response time in seconds, and the sigma of the lognormal
+    # spread around it
+    latency: float = 0.05
+    jitter: float = 0.5
+    # fraction of calls which fail
+    error_rate: float = 0.0
+    # calls beyond this rate are refused, as the real APIs do; None for no
+    # limit
+    requests_per_minute: float | None = None
+    burst: int = 10
+
+
+class Service:
+    """
+    The latency, injected failures and rate limit of one stand-in API,
+    shared by all of its calls, with counts of how each call fared. Used
+    from the event loop and from worker threads alike.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        profile: ServiceProfile,
+        seed: int | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.profile = profile
+        self._random = random.Random(seed)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = float(profile.burst)
+        self._updated = clock()
+        self.calls: Counter[str] = Counter()
+        self.errors: Counter[str] = Counter()
+        self.rate_limited: Counter[str] = Counter()
+
+    def _admit(self) -> bool:
+        rate = self.profile.requests_per_minute
+        if rate is None:
+            return True
+        now = self._clock()
+        self._tokens = min(
+            self.profile.burst, self._tokens + (now - self._updated) * rate / 60
+        )
+        self._updated = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def outcome(self, call: str) -> tuple[float, ServiceError | None]:
+        """
+        How long a call takes to answer and the error it fails with, if any
+        """
+        profile = self.profile
+        with self._lock:
+            self.calls[call] += 1
+            delay = profile.latency * self._random.lognormvariate(0, profile.jitter)
+            if not self._admit():
+                self.rate_limited[call] += 1
+                return delay, RateLimited(f"{self.name} {call}: too many requests")
+            if self._random.random() < profile.error_rate:
+                self.errors[call] += 1
+                return delay, ServiceError(f"{self.name} {call}: injected failure")
+        return delay, None
+
+    async def call(self, call: str):
+        delay, error = self.outcome(call)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+
+    def call_blocking(self, call: str):
+        delay, error = self.outcome(call)
+        time.sleep(delay)
+        if error is not None:
+            raise error
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "calls": sum(self.calls.values()),
+                "errors": sum(self.errors.values()),
+                "rate_limited": sum(self.rate_limited.values()),
+                "by_call": dict(self.calls),
+            }
@@ -0,0 +1,36 @@
+import pytest
+
+from devices.andersen import AndersenConnection
+from .andersen import FakeAndersen
+from .service import ServiceProfile
+
+FAST = ServiceProfile(latency=0.001)
+
+
+@pytest.mark.asyncio
+async def test_charger_reads_and_writes_through_the_real_client():
+    andersen = FakeAndersen(FAST, seed=1)
+    fake = andersen.add_charger("garage")
+    chargers = AndersenConnection(client_factory=andersen.client)
+    try:
+        charger = chargers.get_charger("driver", "pw", "garage")
+        assert await charger.get_charge_from_grid() is False
+        await charger.set_charge_from_grid(True)
+        assert fake.max_grid_charge_percent == 100
+        assert await charger.get_charge_from_grid() is True
+    finally:
+        chargers.close()
+
+
+@pytest.mark.asyncio
+async def test_unreadable_charger_is_unknown():
+    andersen = FakeAndersen(FAST, seed=1)
+    andersen.add_charger("garage")
+    chargers = AndersenConnection(client_factory=andersen.client)
+    try:
+        charger = chargers.get_charger("driver", "pw", "garage")
+        await charger.get_charge_from_grid()
+        andersen.service.profile.error_rate = 1.0
+        assert await charger.get_charge_from_grid() is None
+    finally:
+        chargers.close()
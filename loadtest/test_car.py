@@ -0,0 +1,117 @@
+import asyncio
+import datetime as dt
+import pytest
+import time
+
+from devices.andersen import AndersenConnection
+from devices.status_cache import StatusCache
+from devices.vehicle import Credentials, VehicleConnection
+from fleet import AndersenCredentials, CarConfig
+from iot import IoTClient, ShadowWriteBuffer
+from main import Car, get_status
+from model.config import Config
+from model.status import Status
+from telemetry import TelemetryStore
+
+from .andersen import FakeAndersen
+from .iot import FakeShadowService
+from .renault import FakeCar, FakeRenault
+from .service import ServiceProfile
+
+FAST = ServiceProfile(latency=0.001, jitter=0)
+CONFIG = CarConfig(
+    name="zoe",
+    renault=Credentials("driver", "pw", "AB12CDE"),
+    andersen=AndersenCredentials("driver", "pw", "zoe"),
+    heater_thing="zoe_heater",
+    status_thing="zoe_status",
+)
+
+
+def eventually(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.005)
+
+
+class Daemon:
+    """
+    One Car wired to the stand-in services as the daemon wires it
+    """
+
+    def __init__(self, clock, **car):
+        self.renault = FakeRenault(FAST, seed=1)
+        self.fake_car: FakeCar = self.renault.add_car(
+            "driver", "AB12CDE", battery_level=40
+        )
+        self.andersen = FakeAndersen(FAST, seed=1)
+        self.andersen.add_charger("zoe")
+        self.shadows = FakeShadowService(FAST, seed=1)
+        self.vehicles = VehicleConnection(
+            cache=StatusCache(clock=clock), login_factory=self.renault.login
+        )
+        self.chargers = AndersenConnection(client_factory=self.andersen.client)
+        self.reports = ShadowWriteBuffer()
+        self.car = Car(
+            CONFIG,
+            IoTClient(self.shadows.connect()),
+            self.vehicles,
+            self.chargers,
+            asyncio.Semaphore(1),
+            self.reports,
+            iot_data=self.shadows.iot_data(),
+            **car,
+        )
+
+    def reported_status(self) -> dict:
+        document = self.shadows.document(CONFIG.status_thing) or {}
+        return document.get("reported", {}).get("state", {})
+
+    async def close(self):
+        await self.vehicles.close()
+        self.chargers.close()
+        self.shadows.close()
+
+
+@pytest.mark.asyncio
+async def test_held_readings_are_reported_without_waiting_for_fresh_ones(clock):
+    daemon = Daemon(clock)
+    try:
+        vehicle = await daemon.vehicles.get_vehicle(CONFIG.renault)
+        await vehicle.get_battery_status()
+        await vehicle.get_hvac_state()
+        daemon.fake_car.battery_level = 70
+        clock.now += 3600
+        daemon.renault.service.profile.latency = 0.5
+
+        now = dt.datetime.now()
+        await asyncio.wait_for(daemon.car.report_status(vehicle, now), timeout=0.2)
+        daemon.reports.flush()
+        eventually(lambda: daemon.reported_status().get("battery_level") == 40)
+
+        assert (await get_status(vehicle, now)).battery_level == 70
+    finally:
+        await daemon.close()
+
+
+@pytest.mark.asyncio
+async def test_reading_is_recorded_once_the_charger_can_be_read(clock, tmp_path):
+    telemetry = TelemetryStore(str(tmp_path))
+    daemon = Daemon(clock, telemetry=telemetry)
+    try:
+        now = dt.datetime.now().replace(microsecond=0)
+        status = Status(now, 40, 120, False, read_at=now)
+        config = Config(charge_from_grid=True, charge_schedule=None)
+
+        daemon.andersen.service.profile.error_rate = 1.0
+        await daemon.car.record_telemetry(status, config)
+        assert len(telemetry.query("zoe", now, now + dt.timedelta(seconds=1))) == 0
+
+        daemon.andersen.service.profile.error_rate = 0.0
+        await daemon.car.record_telemetry(status, config)
+        records = telemetry.query("zoe", now, now + dt.timedelta(seconds=1))
+        assert len(records) == 1
+        assert not records[0]["charge_from_grid"]
+    finally:
+        await daemon.close()
@@ -0,0 +1,135 @@
+import json
+import pytest
+import time
+
+from iot.shadow import IoTClient
+from .iot import ConflictException, FakeShadowService, parse_request, topic_matches
+from .service import ServiceProfile
+
+FAST = ServiceProfile(latency=0.001)
+
+
+def eventually(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def shadows():
+    service = FakeShadowService(FAST, seed=1)
+    yield service
+    service.close()
+
+
+@pytest.mark.parametrize(
+    "topic_filter,topic,expect",
+    [
+        (
+            "$aws/things/a/shadow/get/accepted",
+            "$aws/things/a/shadow/get/accepted",
+            True,
+        ),
+        (
+            "$aws/things/+/shadow/get/accepted",
+            "$aws/things/a/shadow/get/accepted",
+            True,
+        ),
+        ("$aws/things/+/shadow/#", "$aws/things/a/shadow/update/delta", True),
+        ("$aws/things/+/shadow/get/accepted", "$aws/things/a/shadow/get", False),
+        (
+            "$aws/things/b/shadow/get/accepted",
+            "$aws/things/a/shadow/get/accepted",
+            False,
+        ),
+    ],
+)
+def test_topic_matches(topic_filter, topic, expect):
+    assert topic_matches(topic_filter, topic) == expect
+
+
+@pytest.mark.parametrize(
+    "topic,expect",
+    [
+        ("$aws/things/a/shadow/get", (("a", None), "get")),
+        ("$aws/things/a/shadow/name/s/update", (("a", "s"), "update")),
+        ("$aws/things/a/shadow/get/accepted", None),
+        ("other/topic", None),
+    ],
+)
+def test_parse_request(topic, expect):
+    assert parse_request(topic) == expect
+
+
+def test_thing_creates_its_shadow_with_the_default(shadows):
+    client = IoTClient(shadows.connect())
+    client.register_thing("heater", "state", "off", callback=lambda value: None)
+    client.ready().result(timeout=2)
+    eventually(lambda: shadows.document("heater") is not None)
+    assert shadows.document("heater")["reported"] == {"state": "off"}
+
+
+def test_reported_value_is_updated(shadows):
+    client = IoTClient(shadows.connect())
+    thing = client.register_thing("status", "state", default_value={})
+    client.ready().result(timeout=2)
+    thing.change_shadow_value({"battery_level": 50})
+    eventually(
+        lambda: (shadows.document("status") or {}).get("reported")
+        == {"state": {"battery_level": 50}}
+    )
+
+
+def test_desired_change_reaches_the_daemon(shadows):
+    changes = []
+    client = IoTClient(shadows.connect())
+    client.register_thing("heater", "state", "off", callback=changes.append)
+    document = client.register_shadow_document(
+        "status", "charge_intent", callback=changes.append
+    )
+    client.ready().result(timeout=2)
+
+    iot_data = shadows.iot_data()
+    iot_data.update_thing_shadow(
+        thingName="heater", payload=json.dumps({"state": {"desired": {"state": "on"}}})
+    )
+    iot_data.update_thing_shadow(
+        thingName="status",
+        shadowName="charge_intent",
+        payload=json.dumps({"state": {"desired": {"2024-08-01": 80}}}),
+    )
+    eventually(lambda: len(changes) == 2)
+    assert "on" in changes and {"2024-08-01": 80} in changes
+    assert document.desired == {"2024-08-01": 80}
+
+
+def test_iot_data_reads_and_writes_versioned_shadows(shadows):
+    iot_data = shadows.iot_data()
+    with pytest.raises(iot_data.exceptions.ResourceNotFoundException):
+        iot_data.get_thing_shadow(thingName="status", shadowName="charge_intent")
+
+    payload = {"state": {"desired": {"2024-08-01": 80}}, "version": 0}
+    iot_data.update_thing_shadow(
+        thingName="status", shadowName="charge_intent", payload=json.dumps(payload)
+    )
+    response = iot_data.get_thing_shadow(thingName="status", shadowName="charge_intent")
+    document = json.loads(response["payload"].read())
+    assert document["state"]["desired"] == {"2024-08-01": 80}
+    assert document["version"] == 1
+
+    with pytest.raises(ConflictException):
+        iot_data.update_thing_shadow(
+            thingName="status", shadowName="charge_intent", payload=json.dumps(payload)
+        )
+
+
+def test_failed_requests_are_rejected():
+    shadows = FakeShadowService(ServiceProfile(latency=0.001, error_rate=1.0))
+    try:
+        client = IoTClient(shadows.connect())
+        client.register_thing("heater", "state", "off", callback=lambda value: None)
+        with pytest.raises(Exception, match="code=500"):
+            client.ready().result(timeout=2)
+    finally:
+        shadows.close()
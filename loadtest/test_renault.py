@@ -0,0 +1,84 @@
+import pytest
+
+from devices.vehicle import ChargeScheduleState, Credentials, VehicleConnection
+from .renault import FakeRenault
+from .service import ServiceError, ServiceProfile
+
+FAST = ServiceProfile(latency=0.001)
+
+
+def connection(renault: FakeRenault) -> VehicleConnection:
+    return VehicleConnection(login_factory=renault.login)
+
+
+@pytest.mark.asyncio
+async def test_reads_the_car_through_the_real_client():
+    renault = FakeRenault(FAST, seed=1)
+    renault.add_car("driver", "AB12CDE", battery_level=42)
+    vehicles = connection(renault)
+    try:
+        vehicle = await vehicles.get_vehicle(Credentials("driver", "pw", "AB12CDE"))
+        battery = await vehicle.get_battery_status()
+        assert (battery.battery_level, battery.estimated_range) == (42, 126)
+        assert battery.read_at is not None
+        assert not await vehicle.get_hvac_state()
+    finally:
+        await vehicles.close()
+
+
+@pytest.mark.asyncio
+async def test_commands_change_the_car():
+    renault = FakeRenault(FAST, seed=1)
+    car = renault.add_car("driver", "AB12CDE")
+    vehicles = connection(renault)
+    try:
+        vehicle = await vehicles.get_vehicle(Credentials("driver", "pw", "AB12CDE"))
+        await vehicle.set_hvac_state(True, 21)
+        assert car.hvac
+
+        desired = ChargeScheduleState(enabled=True, start="01:30", duration=120)
+        await vehicle.set_charge_schedule_state(desired, None)
+        assert car.charge_mode == "schedule_mode"
+        assert await vehicle.get_charge_schedule_state() == desired
+    finally:
+        await vehicles.close()
+
+
+@pytest.mark.asyncio
+async def test_cars_on_one_account_share_a_login():
+    renault = FakeRenault(FAST, seed=1)
+    renault.add_car("driver", "AB12CDE")
+    renault.add_car("driver", "FG34HIJ")
+    vehicles = connection(renault)
+    try:
+        for registration in ["AB12CDE", "FG34HIJ"]:
+            await vehicles.get_vehicle(Credentials("driver", "pw", registration))
+        assert renault.service.calls["login"] == 1
+        assert renault.service.calls["get_vehicles"] == 2
+    finally:
+        await vehicles.close()
+
+
+@pytest.mark.asyncio
+async def test_injected_failures_reach_the_caller():
+    renault = FakeRenault(ServiceProfile(latency=0.001, error_rate=1.0))
+    renault.add_car("driver", "AB12CDE")
+    vehicles = connection(renault)
+    try:
+        with pytest.raises(ServiceError):
+            await vehicles.get_vehicle(Credentials("driver", "pw", "AB12CDE"))
+    finally:
+        await vehicles.close()
+
+
+@pytest.mark.asyncio
+async def test_unreadable_charge_schedule_is_unknown():
+    renault = FakeRenault(FAST, seed=1)
+    renault.add_car("driver", "AB12CDE")
+    vehicles = connection(renault)
+    try:
+        vehicle = await vehicles.get_vehicle(Credentials("driver", "pw", "AB12CDE"))
+        renault.service.profile.error_rate = 1.0
+        assert await vehicle.get_charge_schedule_state() is None
+    finally:
+        await vehicles.close()
@@ -0,0 +1,40 @@
+import pytest
+from .service import RateLimited, Service, ServiceError, ServiceProfile
+
+
+def test_calls_beyond_the_rate_limit_are_refused(clock):
+    service = Service(
+        "test", ServiceProfile(requests_per_minute=60, burst=2), clock=clock
+    )
+    assert [service.outcome("get")[1] for _ in range(2)] == [None, None]
+    assert isinstance(service.outcome("get")[1], RateLimited)
+    clock.now += 1
+    assert service.outcome("get")[1] is None
+    assert service.summary()["rate_limited"] == 1
+
+
+@pytest.mark.parametrize("error_rate,errors", [(0.0, 0), (1.0, 20)])
+def test_injected_failures(error_rate, errors):
+    service = Service("test", ServiceProfile(error_rate=error_rate), seed=1)
+    outcomes = [service.outcome("get") for _ in range(20)]
+    assert sum(isinstance(error, ServiceError) for _, error in outcomes) == errors
+    assert service.summary() == {
+        "calls": 20,
+        "errors": errors,
+        "rate_limited": 0,
+        "by_call": {"get": 20},
+    }
+
+
+def test_latency_spreads_around_the_median():
+    service = Service("test", ServiceProfile(latency=0.1, jitter=0.5), seed=1)
+    delays = sorted(service.outcome("get")[0] for _ in range(1001))
+    assert 0.08 < delays[500] < 0.12
+    assert delays[0] < 0.05 and delays[-1] > 0.2
+
+
+@pytest.mark.asyncio
+async def test_call_raises_the_injected_failure():
+    service = Service("test", ServiceProfile(latency=0.001, error_rate=1.0))
+    with pytest.raises(ServiceError):
+        await service.call("get")
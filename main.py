@@ -1,25 +1,46 @@
-import aiohttp
 import argparse
 import asyncio
 import boto3
 import datetime as dt
 import dotenv
+import functools
 import json
 import logging
+import numpy as np
 import os
 import sys
-from async_cron.job import CronJob
-from async_cron.schedule import Scheduler
 from datetime import datetime, time
-from devices.andersen import AndersenA2
-from devices.vehicle import Vehicle, Credentials
-from iot import IoTClient, IoTThing
+from devices.andersen import AndersenConnection
+from devices.ratelimit import RateLimiter
+from devices.reconciler import Reconciler
+from devices.status_cache import StatusCache
+from devices.vehicle import (
+    ChargeScheduleState,
+    Vehicle,
+    VehicleConnection,
+)
+from fleet import CarConfig, load_fleet_config
+from iot import IoTClient, IoTShadowDocument, ShadowWriteBuffer
+from iot.stats import prometheus as shadow_prometheus
+from metrics import recorder, span, start_metrics_server, start_tick
+from model.charge_curve import ChargeCurve
 from model.config import Config, get_config
 from model.schedule import ChargeSchedule
 from model.status import Status
-from model.intent import Intent
+from model.tariff import Tariff, TariffFile
+from model.horizon import HorizonPlanner, tonights_intent
+from model.intent import (
+    Intent,
+    charge_date,
+    charge_targets,
+    intent_from_charge_intent,
+)
 from model.environment import Environment
-from typing import Tuple
+from model.wakeup import next_wakeup
+from telemetry import RECORD, TelemetryRecord, TelemetryStore
+from typing import Awaitable, Tuple, TypeVar
+
+T = TypeVar("T")
 
 
 logging.basicConfig(
@@ -29,152 +50,475 @@ logging.basicConfig(
 )
 
 dotenv.load_dotenv()
-iot_data = boto3.client("iot-data")
 
+BATTERY_CAPACITY_KWH = 60
+CHARGE_RATE_KW = 7.2
+# days of telemetry the charge curve is learned from at startup
+CHARGE_CURVE_HISTORY = dt.timedelta(days=90)
+# allowance for the age of a reading on top of the time between ticks
+CHARGE_CURVE_READING_AGE = dt.timedelta(minutes=30)
+# dates ahead in the charge intent shadow that charging is planned for
+HORIZON_DAYS = 14
+# battery used in a typical day, in percent, for planning ahead
+DAILY_USE = 15
 
-def require_env(name: str) -> str:
+
+async def get_status(
+    vehicle: Vehicle, now: dt.datetime, stale_ok: bool = False
+) -> Status:
     """
-    Read an environment variable, raising an Error if not defined
+    The car's readings. Those past their ttl are waited for, or with stale_ok
+    returned as they are while fresh ones are fetched in the background
     """
-    value = os.getenv(name)
-    if not value:
-        raise Exception(f"Required environment variable {name} not defined")
-    return value
-
-
-def get_andersen_a2() -> AndersenA2:
-    return AndersenA2(
-        require_env("ANDERSEN_USERNAME"),
-        require_env("ANDERSEN_PASSWORD"),
-        require_env("ANDERSEN_DEVICE_NAME"),
+    battery, hvac = await asyncio.gather(
+        vehicle.get_battery_status(stale_ok), vehicle.get_hvac_state(stale_ok)
     )
+    status = Status(
+        battery_level=battery.battery_level,
+        estimated_range=battery.estimated_range,
+        hvac_state=hvac,
+        now=now,
+        read_at=battery.read_at,
+    )
+    logging.info(f"{status}")
+    return status
 
 
-async def get_vehicle(session: aiohttp.ClientSession) -> Vehicle:
-    vehicle = Vehicle(
-        session,
-        Credentials(
-            username=require_env("RENAULT_USERNAME"),
-            password=require_env("RENAULT_PASSWORD"),
-            registration=require_env("RENAULT_REGISTRATION"),
-        ),
-    )
-    await vehicle.connect()
-    return vehicle
+@functools.cache
+def default_iot_data():
+    # made on first use, so that importing this module needs no AWS setup
+    return boto3.client("iot-data")
 
 
-def init_iot() -> Tuple[IoTClient, IoTThing, IoTThing]:
-    async def enable_heater(state: bool):
-        logging.info(f"set hvac state {state}")
-        async with aiohttp.ClientSession() as session:
-            vehicle = await get_vehicle(session)
-            await vehicle.set_hvac_state(state, 19)
+async def get_charge_intent(charge_intent: IoTShadowDocument, iot_data=None) -> dict:
+    desired = charge_intent.desired
+    if desired is None:
+        # the local copy hasn't arrived yet, so ask for the shadow directly
+        with span("iot_data.get_thing_shadow"):
+            data = await asyncio.to_thread(
+                (iot_data or default_iot_data()).get_thing_shadow,
+                thingName=charge_intent.thing_name,
+                shadowName=charge_intent.shadow_name,
+            )
+        shadow = json.load(data["payload"])
+        desired = shadow.get("state", {}).get("desired", {})
+    return desired
 
-    def heater_state_updated(state: str):
-        asyncio.run(enable_heater(state == "on"))
 
-    iot_client = IoTClient()
-    heater = iot_client.register_thing(
-        thing_name="car_heater",
-        property="state",
-        default_value="off",
-        callback=heater_state_updated,
+def get_intent(
+    env: Environment, status: Status, desired: dict, horizon: HorizonPlanner
+) -> Intent:
+    now = status.now
+    requested = intent_from_charge_intent(desired, env.ready_by, now)
+    logging.info(
+        f"maximum requested charge on {charge_date(env.ready_by, now)} is {requested.max_grid_charge}"
     )
-    status = iot_client.register_thing(
-        thing_name="car_status", property="state", default_value={}
+    plan = horizon.plan(
+        env,
+        now,
+        status.battery_level,
+        charge_targets(desired, env.ready_by, now, HORIZON_DAYS),
     )
-    return iot_client, heater, status
+    intent = tonights_intent(requested, plan, status.battery_level)
+    if intent != requested:
+        logging.info(
+            f"charging ahead to {intent.max_grid_charge} for the days after, planned levels {plan.levels}"
+        )
+    return intent
 
 
-async def get_status(vehicle: Vehicle) -> Status:
-    battery = await vehicle.get_battery_status()
-    hvac = await vehicle.get_hvac_state()
-    status = Status(
-        battery_level=battery.batteryLevel,
-        estimated_range=battery.batteryAutonomy,
-        hvac_state=hvac,
-        now=dt.datetime.now(),
-    )
-    logging.info(f"{status}")
-    return status
+async def timed(name: str, awaitable: Awaitable[T]) -> T:
+    with span(name):
+        return await awaitable
 
 
-def get_intent(env: Environment, status: Status) -> Intent:
-    data = iot_data.get_thing_shadow(thingName="car_status", shadowName="charge_intent")
-    shadow = json.load(data["payload"])
-    today = dt.datetime.now()
-    if today.time() > env.ready_by:
-        today += dt.timedelta(days=1)
-    default_charge_level = 60 if status.now.month in [4, 5, 6, 7, 8, 9] else 75
-    max_charge_today = (
-        shadow
-        .get("state", {})
-        .get("desired", {})
-        .get(today.date().isoformat(), str(default_charge_level))
+def to_charge_schedule_state(c: ChargeSchedule | None) -> ChargeScheduleState:
+    if c is None:
+        return ChargeScheduleState(enabled=False)
+    duration_mins = int((c.end - c.start).total_seconds() / 60)
+    return ChargeScheduleState(
+        enabled=True, start=c.start.time().isoformat()[:5], duration=duration_mins
     )
-    logging.info(f"maximum requested charge on {today.date()} is {max_charge_today}")
-    return Intent(max_grid_charge=int(max_charge_today))
 
 
-def to_charge_schedule(c: ChargeSchedule) -> Tuple[str, int]:
-    start = dt.datetime.combine(dt.date.today(), c.start)
-    end = dt.datetime.combine(dt.date.today(), c.end)
-    duration_mins = int((end - start).total_seconds() / 60)
-    return c.start.isoformat()[:5], duration_mins
+async def write_charge_schedule(
+    vehicle: Vehicle,
+    desired: ChargeScheduleState,
+    current: ChargeScheduleState | None,
+):
+    try:
+        await vehicle.set_charge_schedule_state(desired, current)
+    except Exception:
+        await vehicle.enable_charge_schedule(False)
+        raise
 
 
-async def main():
-    iot_client, iot_heater, iot_status = init_iot()
+def log_shadow_stats(iot_client: IoTClient):
+    for name, stats in iot_client.shadow_stats().items():
+        fields = " ".join(f"{key}={value}" for key, value in stats.items())
+        logging.info(f"shadow request={name} {fields}")
+
+
+async def report_shadow_stats(iot_client: IoTClient, interval: dt.timedelta):
+    while True:
+        await asyncio.sleep(interval.total_seconds())
+        log_shadow_stats(iot_client)
+
+
+class Car:
+    """
+    The vehicle, charger and shadows bound to one car, and the state carried
+    from one of its ticks to the next
+    """
+
+    def __init__(
+        self,
+        config: CarConfig,
+        iot_client: IoTClient,
+        vehicles: VehicleConnection,
+        andersen: AndersenConnection,
+        concurrency: asyncio.Semaphore,
+        reports: ShadowWriteBuffer,
+        heartbeat: dt.timedelta = dt.timedelta(hours=1),
+        telemetry: TelemetryStore | None = None,
+        tariff: TariffFile | None = None,
+        iot_data=None,
+    ):
+        self.config = config
+        self._iot_data = iot_data
+        self._tariff = tariff
+        self._heartbeat = heartbeat
+        self._telemetry = telemetry
+        self._vehicles = vehicles
+        self._charger = andersen.get_charger(
+            config.andersen.username,
+            config.andersen.password,
+            config.andersen.device_name,
+        )
+        self._concurrency = concurrency
+        self._reports = reports
+        self._loop = asyncio.get_running_loop()
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._reconciler = Reconciler()
+        history = self._read_history()
+        self._charge_curve = self._learn_charge_curve(history)
+        # the time of the last reading recorded, so that each is recorded once
+        self._recorded_until: dt.datetime | None = (
+            history["time"][-1].item() if len(history) else None
+        )
+        self._horizon = HorizonPlanner(daily_use=DAILY_USE)
+
+        self._heater = iot_client.register_thing(
+            thing_name=config.heater_thing,
+            property="state",
+            default_value="off",
+            callback=self._heater_state_updated,
+        )
+        self._status = iot_client.register_thing(
+            thing_name=config.status_thing, property="state", default_value={}
+        )
+        self._charge_intent = iot_client.register_shadow_document(
+            thing_name=config.status_thing,
+            shadow_name=config.charge_intent_shadow,
+            callback=self._charge_intent_changed,
+        )
+
+    def _read_history(self) -> np.ndarray:
+        if self._telemetry is None:
+            return np.empty(0, dtype=RECORD)
+        now = dt.datetime.now()
+        try:
+            return self._telemetry.query(
+                self.config.name, now - CHARGE_CURVE_HISTORY, now
+            )
+        except OSError as e:
+            logging.error(f"{self.config.name}: failed to read telemetry: {e}")
+            return np.empty(0, dtype=RECORD)
+
+    def _learn_charge_curve(self, history: np.ndarray) -> ChargeCurve:
+        # while charging, readings are a heartbeat apart give or take their age
+        curve = ChargeCurve(
+            BATTERY_CAPACITY_KWH,
+            CHARGE_RATE_KW,
+            max_gap=self._heartbeat + CHARGE_CURVE_READING_AGE,
+        )
+        records = history[history["battery_level"] >= 0]
+        curve.fit(
+            records["time"], records["battery_level"], records["charge_from_grid"]
+        )
+        logging.info(
+            f"{self.config.name}: learned charge curve from {len(records)} records"
+        )
+        return curve
+
+    def current_tariff(self) -> Tariff | None:
+        if self._tariff is None:
+            return None
+        try:
+            return self._tariff.get()
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"{self.config.name}: failed to load tariff: {e}")
+            return None
+
+    def _heater_state_updated(self, state: str):
+        # called on the MQTT thread; hand the command to the daemon's loop so
+        # it goes out on the warm, already logged in vehicle connection
+        asyncio.run_coroutine_threadsafe(self.set_heater(state == "on"), self._loop)
+
+    async def set_heater(self, state: bool):
+        logging.info(f"{self.config.name}: set hvac state {state}")
+        try:
+            vehicle = await self._vehicles.get_vehicle(self.config.renault)
+            await vehicle.set_hvac_state(state, 19)
+        except Exception as e:
+            logging.error(f"{self.config.name}: failed to set hvac state: {e}")
 
-    def update_iot(status: Status):
-        if status.hvac_state:
-            get_andersen_a2().set_charge_from_grid(True)
-        iot_heater.change_shadow_value("on" if status.hvac_state else "off")
-        iot_status.change_shadow_value(
+    def _charge_intent_changed(self, desired: dict):
+        # called on the MQTT thread; apply the new intent now rather than
+        # waiting for the next scheduled update
+        logging.info(f"{self.config.name}: charge intent changed")
+        self._loop.call_soon_threadsafe(self._wake.set)
+
+    def update_iot(self, status: Status):
+        self._reports.report(self._heater, "on" if status.hvac_state else "off")
+        self._reports.report(
+            self._status,
             {
                 "battery_level": status.battery_level,
                 "estimated_range": status.estimated_range,
-            }
+            },
         )
 
-    async def apply_config(vehicle: Vehicle, config: Config):
-        andersen = get_andersen_a2()
-        andersen.set_charge_from_grid(config.charge_from_grid)
+    async def report_status(self, vehicle: Vehicle, now: dt.datetime):
+        """
+        Report the readings held for the car straight away, without waiting
+        on the slow battery endpoint for fresh ones
+        """
+        self.update_iot(await get_status(vehicle, now, stale_ok=True))
+
+    async def record_telemetry(self, status: Status, config: Config):
+        """
+        Record a new battery reading, at the time the car took it, alongside
+        the charger's state as read back from it
+        """
+        read_at = status.read_at or status.now
+        if self._recorded_until is not None and read_at <= self._recorded_until:
+            return
+        charge_from_grid = await self._charger.get_charge_from_grid()
+        if charge_from_grid is None:
+            # recorded on a later tick, once the charger can be read
+            return
+        schedule = config.charge_schedule
+        try:
+            self._telemetry.append(
+                self.config.name,
+                TelemetryRecord(
+                    time=read_at,
+                    battery_level=status.battery_level,
+                    estimated_range=status.estimated_range,
+                    hvac=status.hvac_state,
+                    charge_from_grid=charge_from_grid,
+                    schedule_start=schedule.start if schedule else None,
+                    schedule_end=schedule.end if schedule else None,
+                ),
+            )
+        except OSError as e:
+            logging.error(f"{self.config.name}: failed to record telemetry: {e}")
+            return
+        self._recorded_until = read_at
 
-        if config.charge_schedule:
+    async def update(self) -> dt.datetime:
+        async with self._lock, self._concurrency:
+            tick = start_tick()
             try:
-                (start, duration) = to_charge_schedule(config.charge_schedule)
-                await vehicle.set_charge_schedule(start, duration)
-                await vehicle.enable_charge_schedule(True)
-            except Exception:
-                await vehicle.enable_charge_schedule(False)
-        else:
-            await vehicle.enable_charge_schedule(False)
+                with span("tick"):
+                    return await self.tick()
+            finally:
+                summary = " ".join(
+                    f"{name}={seconds:.3f}s"
+                    for name, seconds in recorder.tick_summary(tick).items()
+                )
+                logging.info(f"{self.config.name}: tick {summary}")
 
-    async def update():
-        async with aiohttp.ClientSession() as session:
-            env = Environment(
-                cheap_rate_start=dt.time(hour=0, minute=0),
-                cheap_rate_end=dt.time(hour=4, minute=59),
-                ready_by=dt.time(hour=7, minute=0),
-                battery_capacity_kwh=60,
-                charge_rate_kw=7.2,
+    async def run(self):
+        """
+        Update the car, then sleep until the next time a decision could
+        change, or until woken early by a change of charge intent
+        """
+        while True:
+            self._wake.clear()
+            try:
+                wakeup = await self.update()
+            except Exception as e:
+                logging.error(f"{self.config.name}: update failed: {e}")
+                wakeup = dt.datetime.now() + min(
+                    self._heartbeat, dt.timedelta(minutes=15)
+                )
+            logging.info(f"{self.config.name}: next update at {wakeup}")
+            delay = (wakeup - dt.datetime.now()).total_seconds()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(0, delay))
+            except asyncio.TimeoutError:
+                pass
+
+    async def tick(self) -> dt.datetime:
+        env = Environment(
+            cheap_rate_start=dt.time(hour=0, minute=0),
+            cheap_rate_end=dt.time(hour=4, minute=59),
+            ready_by=dt.time(hour=7, minute=0),
+            battery_capacity_kwh=BATTERY_CAPACITY_KWH,
+            charge_rate_kw=CHARGE_RATE_KW,
+            charge_curve=self._charge_curve,
+            tariff=self.current_tariff(),
+        )
+        now = dt.datetime.now()
+        charger = self._charger
+
+        async def read_vehicle() -> Tuple[Vehicle, Status]:
+            vehicle = await timed(
+                "connect", self._vehicles.get_vehicle(self.config.renault)
             )
-            vehicle = await get_vehicle(session)
-            status = await get_status(vehicle)
-            intent = get_intent(env, status)
+            # the shadows get the readings held already, while charging is
+            # decided from fresh ones
+            _, status = await asyncio.gather(
+                timed("report_status", self.report_status(vehicle, now)),
+                timed("get_status", get_status(vehicle, now)),
+            )
+            return vehicle, status
+
+        # Reads are independent of each other, so run them all at once
+        (vehicle, status), desired = await asyncio.gather(
+            read_vehicle(),
+            timed("get_intent", get_charge_intent(self._charge_intent, self._iot_data)),
+        )
+        with span("plan_horizon"):
+            intent = get_intent(env, status, desired, self._horizon)
+        with span("get_config"):
             config = get_config(env, intent, status)
 
-            await apply_config(vehicle, config)
-            update_iot(status)
+        # Only devices whose desired state has changed get written to. The
+        # charger is also told to charge from the grid while the heater is
+        # running, so that preconditioning doesn't drain the battery.
+        results = await timed(
+            "apply_config",
+            asyncio.gather(
+                self._reconciler.reconcile(
+                    "andersen",
+                    config.charge_from_grid or status.hvac_state,
+                    charger.get_charge_from_grid,
+                    charger.set_charge_from_grid,
+                    now,
+                ),
+                self._reconciler.reconcile(
+                    "vehicle",
+                    to_charge_schedule_state(config.charge_schedule),
+                    vehicle.get_charge_schedule_state,
+                    lambda desired, current: write_charge_schedule(
+                        vehicle, desired, current
+                    ),
+                    now,
+                ),
+                return_exceptions=True,
+            ),
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logging.error(f"{self.config.name}: failed to apply config: {result}")
+        if self._telemetry is not None:
+            await timed("record_telemetry", self.record_telemetry(status, config))
+        if status.battery_level is not None:
+            # keep learning from the charging seen since the last reading
+            self._charge_curve.add_sample(
+                status.read_at or status.now,
+                status.battery_level,
+                config.charge_from_grid or status.hvac_state,
+            )
+        return next_wakeup(env, intent, status, config, self._heartbeat)
 
-    if "--test" in sys.argv:
-        await update()
-    else:
-        msh = Scheduler(locale="en_GB")
-        for minute in [0, 15, 30, 45]:
-            msh.add_job(CronJob().every().hour.at(f":{minute}").go(update))
-        await msh.start()
+
+async def main():
+    fleet = load_fleet_config()
+
+    # Connections and rate limits are per API provider, shared by every car
+    vehicles = VehicleConnection(
+        RateLimiter(
+            fleet.renault_rate_limit.requests_per_minute,
+            fleet.renault_rate_limit.burst,
+        ),
+        StatusCache(
+            fleet.status_cache.path,
+            max_stale=fleet.status_cache.max_stale_minutes * 60,
+        ),
+        battery_ttl=dt.timedelta(minutes=fleet.status_cache.battery_ttl_minutes),
+        hvac_ttl=dt.timedelta(minutes=fleet.status_cache.hvac_ttl_minutes),
+    )
+    andersen = AndersenConnection(
+        RateLimiter(
+            fleet.andersen_rate_limit.requests_per_minute,
+            fleet.andersen_rate_limit.burst,
+        )
+    )
+    iot_client = IoTClient()
+    concurrency = asyncio.Semaphore(fleet.max_concurrent_cars)
+    # shadow reports from every car are sent together, and only when changed
+    reports = ShadowWriteBuffer()
+    heartbeat = dt.timedelta(minutes=fleet.heartbeat_minutes)
+    telemetry = TelemetryStore(fleet.telemetry_path) if fleet.telemetry_path else None
+    tariff = TariffFile(fleet.tariff_path) if fleet.tariff_path else None
+    cars = [
+        Car(
+            car,
+            iot_client,
+            vehicles,
+            andersen,
+            concurrency,
+            reports,
+            heartbeat,
+            telemetry,
+            tariff,
+        )
+        for car in fleet.cars
+    ]
+    try:
+        # every car's shadows subscribe in parallel; wait for them together
+        await asyncio.wait_for(asyncio.wrap_future(iot_client.ready()), timeout=30)
+    except Exception as e:
+        # the first update falls back to reading the shadows directly
+        logging.warning(f"IoT shadows not ready: {e!r}")
+
+    async def update():
+        results = await asyncio.gather(
+            *(car.update() for car in cars), return_exceptions=True
+        )
+        for car, result in zip(cars, results):
+            if isinstance(result, Exception):
+                logging.error(f"{car.config.name}: update failed: {result}")
+
+    metrics_server = None
+    if fleet.metrics_port is not None:
+        metrics_server = await start_metrics_server(
+            lambda: recorder.prometheus()
+            + shadow_prometheus(iot_client.shadow_stats()),
+            host=fleet.metrics_host,
+            port=fleet.metrics_port,
+        )
+
+    try:
+        if "--test" in sys.argv:
+            await update()
+            log_shadow_stats(iot_client)
+        else:
+            await asyncio.gather(
+                report_shadow_stats(iot_client, heartbeat),
+                *(car.run() for car in cars),
+            )
+    finally:
+        reports.flush()
+        if metrics_server is not None:
+            await metrics_server.cleanup()
+        await vehicles.close()
+        andersen.close()
 
 
 if __name__ == "__main__":
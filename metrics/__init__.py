@@ -0,0 +1,2 @@
+from .server import start_metrics_server
+from .spans import SpanRecorder, recorder, retry, span, start_tick
@@ -0,0 +1,23 @@
+import logging
+from aiohttp import web
+from typing import Callable
+
+
+async def start_metrics_server(
+    render: Callable[[], str], host: str, port: int
+) -> web.AppRunner:
+    """
+    Serve the text returned by render at /metrics, in the Prometheus text
+    exposition format
+    """
+
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"serving metrics on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,202 @@
+import bisect
+import contextvars
+import itertools
+import time
+from typing import Callable
+
+# upper bounds of the duration buckets, in seconds
+BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float("inf")]
+
+# the tick a span belongs to, inherited by the tasks a tick starts
+current_tick: contextvars.ContextVar[int] = contextvars.ContextVar(
+    "current_tick", default=0
+)
+
+
+class Span:
+    """
+    One finished span in the recorder's ring. Slots are overwritten in turn,
+    so recording a span allocates nothing.
+    """
+
+    __slots__ = ("name_id", "tick", "duration", "error")
+
+    def __init__(self):
+        self.name_id = -1
+        self.tick = 0
+        self.duration = 0.0
+        self.error = False
+
+
+class _Timer:
+    """
+    Times one span, which is only written to the ring when it ends, so one
+    left open while the ring goes round is neither lost nor overwritten.
+    Timers come from their recorder's pool and go back to it when they end.
+    """
+
+    __slots__ = ("_recorder", "_name_id", "_tick", "_start")
+
+    def __init__(self, recorder: "SpanRecorder"):
+        self._recorder = recorder
+        self._name_id = -1
+        self._tick = 0
+        self._start = 0.0
+
+    def __enter__(self) -> "_Timer":
+        self._start = self._recorder.clock()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        recorder = self._recorder
+        recorder._finish(
+            self._name_id,
+            self._tick,
+            recorder.clock() - self._start,
+            exc_type is not None,
+        )
+        recorder._release(self)
+
+    async def __aenter__(self) -> "_Timer":
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.__exit__(exc_type, exc, tb)
+
+
+class SpanRecorder:
+    """
+    Times named stages of the daemon's work. The most recent spans are kept
+    in a fixed ring for per-tick summaries, and every span also adds to
+    running totals per name, which are exported in Prometheus format.
+    Spans are timed by a fixed pool of timers, enough for as many spans as
+    are open at once, so timing a span allocates nothing either.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 1024,
+        clock: Callable[[], float] = time.perf_counter,
+        timers: int = 1024,
+    ):
+        self.clock = clock
+        self._ring = [Span() for _ in range(capacity)]
+        self._next = 0
+        # a stack of timers, of which the first _idle are free to hand out
+        self._timers = [_Timer(self) for _ in range(timers)]
+        self._idle = timers
+        self._names: list[str] = []
+        self._ids: dict[str, int] = {}
+        self._buckets: list[list[int]] = []
+        self._sums: list[float] = []
+        self._errors: list[int] = []
+        self._retries: list[int] = []
+
+    def _id(self, name: str) -> int:
+        name_id = self._ids.get(name)
+        if name_id is None:
+            name_id = self._ids[name] = len(self._names)
+            self._names.append(name)
+            self._buckets.append([0] * len(BUCKETS))
+            self._sums.append(0.0)
+            self._errors.append(0)
+            self._retries.append(0)
+        return name_id
+
+    def span(self, name: str) -> _Timer:
+        """
+        A context manager (sync or async) timing one span
+        """
+        if self._idle:
+            self._idle -= 1
+            timer = self._timers[self._idle]
+        else:
+            # more spans are open than the pool holds
+            timer = _Timer(self)
+        timer._name_id = self._id(name)
+        timer._tick = current_tick.get()
+        return timer
+
+    def _release(self, timer: _Timer):
+        if self._idle < len(self._timers):
+            self._timers[self._idle] = timer
+            self._idle += 1
+
+    def retry(self, name: str):
+        self._retries[self._id(name)] += 1
+
+    def _finish(self, name_id: int, tick: int, duration: float, error: bool):
+        span = self._ring[self._next]
+        self._next = (self._next + 1) % len(self._ring)
+        span.name_id = name_id
+        span.tick = tick
+        span.duration = duration
+        span.error = error
+        self._buckets[name_id][bisect.bisect_left(BUCKETS, duration)] += 1
+        self._sums[name_id] += duration
+        if error:
+            self._errors[name_id] += 1
+
+    def tick_summary(self, tick: int) -> dict[str, float]:
+        """
+        Total time per span name of the given tick, from the spans still in
+        the ring
+        """
+        totals: dict[str, float] = {}
+        for span in self._ring:
+            if span.tick == tick and span.name_id >= 0:
+                name = self._names[span.name_id]
+                totals[name] = totals.get(name, 0.0) + span.duration
+        return totals
+
+    def prometheus(self) -> str:
+        lines = [
+            "# TYPE ev_span_duration_seconds histogram",
+        ]
+        for name_id, name in enumerate(self._names):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, self._buckets[name_id]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(
+                    f'ev_span_duration_seconds_bucket{{span="{name}",le="{le}"}} {cumulative}'
+                )
+            lines.append(
+                f'ev_span_duration_seconds_sum{{span="{name}"}} {self._sums[name_id]:.6f}'
+            )
+            lines.append(
+                f'ev_span_duration_seconds_count{{span="{name}"}} {cumulative}'
+            )
+        lines.append("# TYPE ev_span_errors_total counter")
+        for name_id, name in enumerate(self._names):
+            lines.append(
+                f'ev_span_errors_total{{span="{name}"}} {self._errors[name_id]}'
+            )
+        lines.append("# TYPE ev_span_retries_total counter")
+        for name_id, name in enumerate(self._names):
+            lines.append(
+                f'ev_span_retries_total{{span="{name}"}} {self._retries[name_id]}'
+            )
+        return "\n".join(lines) + "\n"
+
+
+recorder = SpanRecorder()
+_ticks = itertools.count(1)
+
+
+def start_tick() -> int:
+    """
+    Number a new tick, and attribute the spans started from here on in this
+    task (and the tasks it starts) to it
+    """
+    tick = next(_ticks)
+    current_tick.set(tick)
+    return tick
+
+
+def span(name: str) -> _Timer:
+    return recorder.span(name)
+
+
+def retry(name: str):
+    recorder.retry(name)
@@ -0,0 +1,98 @@
+import pytest
+import tracemalloc
+from .spans import SpanRecorder, current_tick
+
+
+def test_span_durations_and_errors_are_totalled(clock):
+    recorder = SpanRecorder(clock=clock)
+    with recorder.span("get_status"):
+        clock.now += 0.3
+    with pytest.raises(ValueError):
+        with recorder.span("get_status"):
+            clock.now += 2
+            raise ValueError()
+    recorder.retry("get_status")
+
+    text = recorder.prometheus()
+    assert 'ev_span_duration_seconds_bucket{span="get_status",le="0.5"} 1' in text
+    assert 'ev_span_duration_seconds_bucket{span="get_status",le="+Inf"} 2' in text
+    assert 'ev_span_duration_seconds_sum{span="get_status"} 2.300000' in text
+    assert 'ev_span_duration_seconds_count{span="get_status"} 2' in text
+    assert 'ev_span_errors_total{span="get_status"} 1' in text
+    assert 'ev_span_retries_total{span="get_status"} 1' in text
+
+
+@pytest.mark.asyncio
+async def test_tick_summary_only_includes_spans_of_that_tick(clock):
+    recorder = SpanRecorder(clock=clock)
+    current_tick.set(1)
+    async with recorder.span("connect"):
+        clock.now += 1
+    current_tick.set(2)
+    async with recorder.span("connect"):
+        clock.now += 2
+    for _ in range(2):
+        async with recorder.span("renault.get_battery_status"):
+            clock.now += 0.5
+    assert recorder.tick_summary(2) == {
+        "connect": 2,
+        "renault.get_battery_status": 1,
+    }
+
+
+def test_ring_keeps_the_latest_spans(clock):
+    recorder = SpanRecorder(capacity=4, clock=clock)
+    current_tick.set(7)
+    for _ in range(6):
+        with recorder.span("tick"):
+            clock.now += 1
+    assert recorder.tick_summary(7) == {"tick": 4}
+    assert 'ev_span_duration_seconds_count{span="tick"} 6' in recorder.prometheus()
+
+
+def test_open_span_survives_the_ring_going_round(clock):
+    recorder = SpanRecorder(capacity=4, clock=clock)
+    current_tick.set(8)
+    with recorder.span("tick"):
+        for _ in range(9):
+            with recorder.span("fast"):
+                clock.now += 1
+        clock.now += 1
+    text = recorder.prometheus()
+    assert 'ev_span_duration_seconds_count{span="tick"} 1' in text
+    assert 'ev_span_duration_seconds_sum{span="tick"} 10.000000' in text
+    assert 'ev_span_duration_seconds_count{span="fast"} 9' in text
+    assert recorder.tick_summary(8) == {"tick": 10, "fast": 3}
+
+
+def test_open_spans_allocate_nothing(clock):
+    recorder = SpanRecorder(clock=clock)
+    with recorder.span("get_status"):
+        pass
+    timers = [None] * 500
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        for i in range(len(timers)):
+            timers[i] = recorder.span("get_status").__enter__()
+        during, _ = tracemalloc.get_traced_memory()
+        for timer in reversed(timers):
+            timer.__exit__(None, None, None)
+    finally:
+        tracemalloc.stop()
+    # well under one object per open span
+    assert during - before < 1000
+    assert 'ev_span_duration_seconds_count{span="get_status"} 501' in (
+        recorder.prometheus()
+    )
+
+
+def test_spans_beyond_the_pool_are_still_timed(clock):
+    recorder = SpanRecorder(clock=clock, timers=1)
+    with recorder.span("tick"):
+        with recorder.span("get_status"):
+            clock.now += 1
+        clock.now += 1
+    text = recorder.prometheus()
+    assert 'ev_span_duration_seconds_sum{span="tick"} 2.000000' in text
+    assert 'ev_span_duration_seconds_sum{span="get_status"} 1.000000' in text
@@ -0,0 +1,175 @@
+import datetime as dt
+import numpy as np
+from dataclasses import dataclass
+from typing import Sequence
+
+from .environment import Environment
+from .tariff import plan_slots_batch
+
+NAT = np.datetime64("NaT", "us")
+
+
+@dataclass
+class BatchChargeSchedule:
+    start: np.ndarray
+    end: np.ndarray
+
+
+@dataclass
+class BatchConfig:
+    charge_from_grid: np.ndarray
+    charge_schedule: BatchChargeSchedule
+
+
+def _time_of_day(t: dt.time) -> np.timedelta64:
+    return np.timedelta64(
+        ((t.hour * 60 + t.minute) * 60 + t.second) * 1_000_000 + t.microsecond, "us"
+    )
+
+
+def _as_datetimes(now: np.ndarray | Sequence[dt.datetime]) -> np.ndarray:
+    return np.asarray(now, dtype="datetime64[us]")
+
+
+def charge_minutes_needed(
+    env: Environment, battery_level: np.ndarray, target_battery_level: np.ndarray
+) -> np.ndarray:
+    """
+    Batch version of Environment.charge_minutes_needed
+    """
+    if env.charge_curve is not None:
+        minutes = env.charge_curve.minutes_array(battery_level, target_battery_level)
+        return np.trunc(minutes).astype(np.int64)
+    kwh_needed = (
+        (np.asarray(target_battery_level) - np.asarray(battery_level))
+        / 100
+        * env.battery_capacity_kwh
+    )
+    hours_needed = kwh_needed / env.charge_rate_kw
+    return np.trunc(hours_needed * 60).astype(np.int64)
+
+
+def charge_schedules(
+    env: Environment,
+    now: np.ndarray | Sequence[dt.datetime],
+    battery_level: np.ndarray | Sequence[int],
+    max_grid_charge: np.ndarray | Sequence[int],
+) -> BatchChargeSchedule:
+    """
+    Batch version of model.schedule.charge_schedule, taking arrays of
+    timestamps, battery levels and targets and giving identical results
+    """
+    now = _as_datetimes(now)
+    day = now.astype("datetime64[D]").astype("datetime64[us]")
+    time_of_day = now - day
+
+    cheap_start = _time_of_day(env.cheap_rate_start)
+    cheap_end = _time_of_day(env.cheap_rate_end)
+    ready_by = _time_of_day(env.ready_by)
+    no_days, one_day = np.timedelta64(0, "D"), np.timedelta64(1, "D")
+
+    # next_cheap_rate_start/end and next_ready_by roll over to tomorrow
+    # once today's end or ready-by time has passed
+    cheap_day = day + np.where(time_of_day < cheap_end, no_days, one_day)
+    next_cheap_start = cheap_day + cheap_start
+    next_cheap_end = cheap_day + cheap_end
+    next_ready_by = day + np.where(time_of_day < ready_by, no_days, one_day) + ready_by
+
+    minutes_needed = charge_minutes_needed(env, battery_level, max_grid_charge)
+    charge_time = minutes_needed.astype("timedelta64[m]").astype("timedelta64[us]")
+
+    # charges too long for the cheap window start with it, or end at ready-by
+    extended_end = next_cheap_start + charge_time
+    fits_before_ready = extended_end < next_ready_by
+    long_start = np.where(
+        fits_before_ready, next_cheap_start, next_ready_by - charge_time
+    )
+    long_end = np.where(fits_before_ready, extended_end, next_ready_by)
+    is_long = minutes_needed > env.cheap_rate_duration_minutes
+
+    in_cheap = (cheap_start < time_of_day) & (time_of_day < cheap_end)
+    after_cheap = (cheap_end <= time_of_day) & (time_of_day < ready_by)
+
+    start = np.select(
+        [in_cheap, after_cheap, is_long],
+        [next_cheap_start, day + cheap_start, long_start],
+        next_cheap_start,
+    )
+    end = np.select(
+        [in_cheap, after_cheap, is_long],
+        [next_cheap_end, now + charge_time, long_end],
+        next_cheap_end,
+    )
+    if env.tariff is not None:
+        start, end = _tariff_schedules(
+            env, now, next_ready_by, minutes_needed, start, end
+        )
+    return BatchChargeSchedule(start=start, end=end)
+
+
+def _tariff_schedules(
+    env: Environment,
+    now: np.ndarray,
+    ready_by: np.ndarray,
+    minutes_needed: np.ndarray,
+    start: np.ndarray,
+    end: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Batch version of model.schedule.tariff_schedule, replacing the start and
+    end of the rows the tariff covers
+    """
+    tariff = env.tariff
+    origin = np.datetime64(tariff.start, "us")
+    slot = np.timedelta64(tariff.slot, "us")
+    covered = (origin <= now) & (ready_by <= np.datetime64(tariff.end, "us"))
+    plan = plan_slots_batch(tariff, now, ready_by, minutes_needed, env.charge_rate_kw)
+
+    # the first run of chosen slots runs from the first chosen column to the
+    # next one not chosen
+    chosen = plan.chosen
+    columns = np.arange(chosen.shape[1])
+    run_start = np.argmax(chosen, axis=1)
+    gap = ~chosen & (columns > run_start[:, None])
+    run_end = np.where(gap.any(axis=1), np.argmax(gap, axis=1), chosen.shape[1])
+    any_chosen = chosen.any(axis=1)
+    tariff_start = np.where(
+        any_chosen, origin + (plan.first_slot + run_start) * slot, ready_by
+    )
+    tariff_end = np.where(
+        any_chosen,
+        np.minimum(origin + (plan.first_slot + run_end) * slot, ready_by),
+        ready_by,
+    )
+    return (
+        np.where(covered, tariff_start, start),
+        np.where(covered, tariff_end, end),
+    )
+
+
+def get_configs(
+    env: Environment,
+    now: np.ndarray | Sequence[dt.datetime],
+    battery_level: np.ndarray | Sequence[int],
+    max_grid_charge: np.ndarray | Sequence[int],
+) -> BatchConfig:
+    """
+    Batch version of model.config.get_config. Where no charge is scheduled
+    the schedule's start and end are NaT.
+    """
+    now = _as_datetimes(now)
+    battery_level = np.asarray(battery_level)
+    max_grid_charge = np.asarray(max_grid_charge)
+
+    schedule = charge_schedules(env, now, battery_level, max_grid_charge)
+    above_limit = (max_grid_charge < 100) & (max_grid_charge < battery_level)
+    in_schedule = (schedule.start <= now) & (now <= schedule.end)
+    charge_from_grid = ~above_limit & in_schedule
+
+    return BatchConfig(
+        charge_from_grid=charge_from_grid,
+        charge_schedule=BatchChargeSchedule(
+            start=np.where(charge_from_grid, schedule.start, NAT),
+            end=np.where(charge_from_grid, schedule.end, NAT),
+        ),
+    )
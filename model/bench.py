@@ -0,0 +1,216 @@
+"""
+Micro and macro benchmarks for the model package.
+
+    python -m model.bench            compare against the stored baseline
+    python -m model.bench --save     store the current timings as the baseline
+    python -m model.bench --check    exit non-zero on a regression
+
+Each benchmark reports the best of several repeats, in microseconds per call.
+Baselines are stored relative to a calibration loop timed in the same run, so
+that they carry over between machines and between busy and quiet moments on
+one. Regressions beyond the threshold are reported, and only fail the run
+with --check.
+"""
+
+import argparse
+import datetime as dt
+import itertools
+import json
+import numpy as np
+import os
+import sys
+import timeit
+from typing import Callable
+
+from .batch import get_configs
+from .config import get_config
+from .environment import Environment
+from .horizon import HorizonPlanner
+from .intent import Intent, charge_targets
+from .schedule import charge_schedule
+from .simulate import Scenario, simulate, synthetic_trace
+from .status import Status
+from .tariff import Tariff, plan_slots_batch
+
+BASELINE = os.path.join(os.path.dirname(__file__), "bench_baseline.json")
+
+ENV = Environment(
+    cheap_rate_start=dt.time(0),
+    cheap_rate_end=dt.time(4, 59),
+    ready_by=dt.time(7),
+    battery_capacity_kwh=60,
+    charge_rate_kw=7.2,
+)
+
+# one sample every 15 minutes through a day, with varying battery levels
+NOWS = [dt.datetime(2024, 7, 27, 12) + dt.timedelta(minutes=15 * i) for i in range(96)]
+STATUSES = [Status(now, (i * 7) % 100, 0, False) for i, now in enumerate(NOWS)]
+INTENT = Intent(max_grid_charge=80)
+
+
+def _each(fn: Callable) -> Callable[[], None]:
+    def run():
+        for arg in NOWS:
+            fn(arg)
+
+    return run
+
+
+def _each_status(fn: Callable) -> Callable[[], None]:
+    def run():
+        for status in STATUSES:
+            fn(ENV, INTENT, status)
+
+    return run
+
+
+def _batch() -> Callable[[], None]:
+    rng = np.random.default_rng(0)
+    count = 35_000
+    now = np.datetime64("2024-01-01T00:00", "m") + rng.integers(
+        0, 366 * 24 * 60, count
+    ).astype("timedelta64[m]")
+    battery = rng.integers(0, 101, count)
+    target = rng.integers(0, 101, count)
+    return lambda: get_configs(ENV, now, battery, target)
+
+
+def _simulation() -> Callable[[], None]:
+    trace = synthetic_trace(dt.datetime(2024, 1, 1), days=30)
+    return lambda: simulate(trace, Scenario(ENV, 80))
+
+
+def _tariff_batch() -> Callable[[], None]:
+    # four weeks of half-hourly prices, and a night's plan for each of 200
+    # vehicles on each of the 28 nights
+    rng = np.random.default_rng(0)
+    start = dt.datetime(2024, 1, 1)
+    tariff = Tariff(start, rng.uniform(5, 35, 28 * 48))
+    nights = np.datetime64(start, "m") + np.arange(28).astype("timedelta64[D]")
+    now = np.repeat(nights + np.timedelta64(18 * 60, "m"), 200)[: 27 * 200]
+    ready_by = now + np.timedelta64(13 * 60, "m")
+    minutes = rng.integers(0, 600, len(now))
+    return lambda: plan_slots_batch(tariff, now, ready_by, minutes, 7.2)
+
+
+def _horizon(replan: bool) -> Callable[[], None]:
+    # targets for each of the next 14 days, solved from scratch or, as on
+    # each tick, re-planned with only tonight changed
+    now = dt.datetime(2024, 7, 27, 20)
+    charge_intent = {
+        (now.date() + dt.timedelta(days=d)).isoformat(): 60 + (d * 13) % 40
+        for d in range(1, 15)
+    }
+    targets = charge_targets(charge_intent, ENV.ready_by, now)
+    planner = HorizonPlanner()
+    if not replan:
+        return lambda: HorizonPlanner().plan(ENV, now, 40, targets)
+    ticks = iter(itertools.count())
+
+    def run():
+        tick = now + dt.timedelta(seconds=next(ticks))
+        planner.plan(ENV, tick, 40, targets)
+
+    planner.plan(ENV, now, 40, targets)
+    return run
+
+
+def _calibration():
+    # plain interpreter work of the kind the scalar model does: arithmetic,
+    # dict lookups and datetime construction
+    table = {i: i * 7 % 100 for i in range(100)}
+    day = dt.date(2024, 7, 27)
+    total = 0
+    for i in range(1000):
+        total += table[i % 100] * 3 // 7
+        dt.datetime.combine(day, dt.time(i % 24))
+    return total
+
+
+# name -> (function, number of calls it makes)
+BENCHMARKS = {
+    "next_cheap_rate_start": (_each(ENV.next_cheap_rate_start), len(NOWS)),
+    "next_cheap_rate_end": (_each(ENV.next_cheap_rate_end), len(NOWS)),
+    "next_ready_by": (_each(ENV.next_ready_by), len(NOWS)),
+    "cheap_rate_duration_minutes": (
+        _each(lambda _: ENV.cheap_rate_duration_minutes),
+        len(NOWS),
+    ),
+    "charge_schedule": (_each_status(charge_schedule), len(STATUSES)),
+    "get_config": (_each_status(get_config), len(STATUSES)),
+    "batch_get_configs_year": (_batch(), 1),
+    "simulate_month": (_simulation(), 1),
+    "batch_plan_slots_4_weeks": (_tariff_batch(), 1),
+    "horizon_14_days": (_horizon(replan=False), 1),
+    "horizon_14_days_replan": (_horizon(replan=True), 1),
+}
+
+
+def _time(fn: Callable, calls: int, repeat: int) -> float:
+    number, _ = timeit.Timer(fn).autorange()
+    best = min(timeit.repeat(fn, number=number, repeat=repeat))
+    return best / number / calls * 1e6
+
+
+def run(names: list[str], repeat: int) -> tuple[dict[str, float], dict[str, float]]:
+    """
+    Microseconds per call of each benchmark, and each as a multiple of a
+    calibration loop timed alongside it, so that a machine busy for part of
+    the run only skews the benchmarks timed while it was
+    """
+    results, relative = {}, {}
+    for name in names:
+        fn, calls = BENCHMARKS[name]
+        calibration = _time(_calibration, 1, repeat)
+        results[name] = _time(fn, calls, repeat)
+        calibration = min(calibration, _time(_calibration, 1, repeat))
+        relative[name] = results[name] / calibration
+    return results, relative
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the model package")
+    parser.add_argument("--save", action="store_true", help="store as baseline")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="allowed slowdown over baseline, as a fraction",
+    )
+    parser.add_argument(
+        "--check", action="store_true", help="exit non-zero on a regression"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("names", nargs="*", default=list(BENCHMARKS))
+    args = parser.parse_args()
+
+    results, relative = run(args.names, args.repeat)
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({k: round(v, 6) for k, v in relative.items()}, f, indent=2)
+            f.write("\n")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    regressions = 0
+    for name, us in results.items():
+        base = baseline.get(name)
+        if base:
+            change = relative[name] / base - 1
+            regressed = change > args.threshold
+            regressions += regressed
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{name:30} {us:12.3f} us  {change:+7.1%} vs baseline{flag}")
+        else:
+            print(f"{name:30} {us:12.3f} us")
+
+    return 1 if regressions and args.check else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import datetime as dt
+import numpy as np
+from typing import Sequence
+
+LEVELS = np.arange(101)
+
+
+class ChargeCurve:
+    """
+    How long the car takes to charge through each percent of battery level,
+    learned from recorded charging. Each percent starts at the constant-rate
+    estimate and moves towards the observed time as evidence builds up.
+
+    The curve is compiled into a table of the minutes needed to charge from
+    0% to each level, so the time between two levels is the difference of
+    two (interpolated) table entries however many percent lie between them.
+
+    Readings are usually taken a while before the tick which reports them,
+    so the time between two readings is only learned from if the charger was
+    charging from the grid throughout: in the state set before the first
+    reading was taken, and at every tick since. max_gap should allow for the
+    longest time between ticks, plus the age of a reading.
+    """
+
+    def __init__(
+        self,
+        battery_capacity_kwh: float,
+        charge_rate_kw: float,
+        prior_weight: float = 5,
+        max_gap: dt.timedelta = dt.timedelta(minutes=90),
+    ):
+        self.linear_minutes_per_percent = (
+            battery_capacity_kwh / 100 / charge_rate_kw * 60
+        )
+        self._prior_weight = prior_weight
+        self._max_gap = max_gap
+        # observed minutes and percent-steps charged through each percent
+        self._minutes = np.zeros(100)
+        self._weight = np.zeros(100)
+        # the latest reading, whether the charger has been charging ever
+        # since it was taken, and the charger's state as last set
+        self._last: tuple[dt.datetime, float] | None = None
+        self._steady = False
+        self._charging: bool | None = None
+        self._compile()
+
+    def _compile(self):
+        prior = self._prior_weight * self.linear_minutes_per_percent
+        per_percent = (self._minutes + prior) / (self._weight + self._prior_weight)
+        self.minutes_per_percent = per_percent
+        self.table = np.concatenate([[0.0], np.cumsum(per_percent)])
+        self._table = self.table.tolist()
+
+    def _observe(self, minutes: float, start: float, end: float):
+        # spread the time evenly over the percents charged through
+        steps = np.clip(
+            np.minimum(LEVELS[1:], end) - np.maximum(LEVELS[:-1], start), 0, None
+        )
+        if steps.sum() > 0:
+            self._minutes += minutes * steps / steps.sum()
+            self._weight += steps
+
+    def add_sample(self, time: dt.datetime, battery_level: float, charging: bool):
+        """
+        Record one reading, taken at the given time, and whether the charger
+        is charging from the grid from this tick on. A rise since the previous
+        reading is learned from if the charger was charging from the grid
+        all the time in between.
+        """
+        last, steady = self._last, self._steady
+        previous = charging if self._charging is None else self._charging
+        self._charging = charging
+        if last is not None and time <= last[0]:
+            # no new reading; the charger has to stay on until there is one
+            self._steady = steady and charging
+            return
+        # this reading was taken while the previous state still held
+        self._last, self._steady = (time, battery_level), previous and charging
+        if last is None:
+            return
+        last_time, last_level = last
+        if (
+            steady
+            and battery_level > last_level
+            and dt.timedelta(0) < time - last_time <= self._max_gap
+        ):
+            minutes = (time - last_time) / dt.timedelta(minutes=1)
+            self._observe(minutes, last_level, battery_level)
+            self._compile()
+
+    def fit(
+        self,
+        times: Sequence[dt.datetime] | np.ndarray,
+        battery_levels: Sequence[float] | np.ndarray,
+        charging: Sequence[bool] | np.ndarray,
+    ) -> "ChargeCurve":
+        """
+        Learn from a history of readings in time order, each with the
+        charger's state as set at the tick which reported it, such as the
+        records of a telemetry store
+        """
+        times = np.asarray(times, dtype="datetime64[s]")
+        levels = np.asarray(battery_levels, dtype=float)
+        charging = np.asarray(charging, dtype=bool)
+        if len(times) == 0:
+            return self
+        # as in add_sample, each reading was taken under the previous state
+        steady = charging & np.concatenate([charging[:1], charging[:-1]])
+        gaps = times[1:] - times[:-1]
+        learn = (
+            steady[:-1]
+            & (levels[1:] > levels[:-1])
+            & (gaps > np.timedelta64(0, "s"))
+            & (gaps <= np.timedelta64(self._max_gap))
+        )
+        minutes = gaps.astype(float) / 60
+        for i in np.flatnonzero(learn):
+            self._observe(minutes[i], levels[i], levels[i + 1])
+        self._last = (times[-1].astype(dt.datetime), levels[-1])
+        self._steady, self._charging = bool(steady[-1]), bool(charging[-1])
+        self._compile()
+        return self
+
+    def minutes(self, battery_level: float, target_battery_level: float) -> float:
+        """
+        The minutes needed to charge between two levels, negative if the
+        target is below the current level
+        """
+        return self._at(target_battery_level) - self._at(battery_level)
+
+    def _at(self, level: float) -> float:
+        level = min(max(level, 0), 100)
+        i = min(int(level), 99)
+        return self._table[i] + (level - i) * (self._table[i + 1] - self._table[i])
+
+    def minutes_array(
+        self, battery_level: np.ndarray, target_battery_level: np.ndarray
+    ) -> np.ndarray:
+        """
+        Batch version of minutes, giving identical results
+        """
+        return self._at_array(target_battery_level) - self._at_array(battery_level)
+
+    def _at_array(self, level: np.ndarray) -> np.ndarray:
+        level = np.clip(np.asarray(level, dtype=float), 0, 100)
+        i = np.minimum(level.astype(np.int64), 99)
+        low, high = self.table[i], self.table[i + 1]
+        return low + (level - i) * (high - low)
+
+    def level_after(self, battery_level: float, minutes: float) -> float:
+        """
+        The battery level reached after charging for some minutes
+        """
+        return float(np.interp(self._at(battery_level) + minutes, self.table, LEVELS))
@@ -1,3 +1,4 @@
+import logging
 from dataclasses import dataclass
 
 from .environment import Environment
@@ -17,7 +18,7 @@ def get_config(env: Environment, intent: Intent, status: Status) -> Config:
         return Config(charge_from_grid=False, charge_schedule=None)
 
     schedule = charge_schedule(env, intent, status)
-    print(f"schedule {schedule}")
+    logging.debug("schedule %s", schedule)
 
     if status.now < schedule.start or schedule.end < status.now:
         return Config(charge_from_grid=False, charge_schedule=None)
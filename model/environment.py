@@ -1,42 +1,75 @@
 import datetime as dt
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import cached_property
 
+from .charge_curve import ChargeCurve
+from .tariff import Tariff
 
-@dataclass
+
+# frozen, as the boundaries and window length are cached from the fields;
+# use dataclasses.replace to vary them
+@dataclass(frozen=True)
 class Environment:
     cheap_rate_start: dt.time
     cheap_rate_end: dt.time
     ready_by: dt.time
     battery_capacity_kwh: float
     charge_rate_kw: float
+    # learned charging times, replacing the constant charge rate when set
+    charge_curve: ChargeCurve | None = field(default=None, repr=False, compare=False)
+    # slot prices, used instead of the cheap rate window wherever they cover
+    tariff: Tariff | None = field(default=None, repr=False, compare=False)
+
+    # cheap rate start, cheap rate end and ready-by datetimes for each date
+    _boundaries: dict[dt.date, tuple[dt.datetime, dt.datetime, dt.datetime]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
 
-    @property
+    @cached_property
     def cheap_rate_duration_minutes(self) -> int:
-        now = dt.datetime.now()
-        duration = self.next_cheap_rate_end(now) - self.next_cheap_rate_start(now)
+        # with naive datetimes the window is the same length on every date
+        today = dt.date.today()
+        duration = dt.datetime.combine(
+            today, self.cheap_rate_end
+        ) - dt.datetime.combine(today, self.cheap_rate_start)
         return int(duration.total_seconds() / 60)
 
+    def _day_boundaries(
+        self, date: dt.date
+    ) -> tuple[dt.datetime, dt.datetime, dt.datetime]:
+        boundaries = self._boundaries.get(date)
+        if boundaries is None:
+            if len(self._boundaries) > 1024:
+                self._boundaries.clear()
+            boundaries = (
+                dt.datetime.combine(date, self.cheap_rate_start),
+                dt.datetime.combine(date, self.cheap_rate_end),
+                dt.datetime.combine(date, self.ready_by),
+            )
+            self._boundaries[date] = boundaries
+        return boundaries
+
+    def _cheap_rate_date(self, now: dt.datetime) -> dt.date:
+        if now.time() < self.cheap_rate_end:
+            return now.date()
+        return now.date() + dt.timedelta(days=1)
+
     def next_cheap_rate_start(self, now: dt.datetime) -> dt.datetime:
-        day_offset = 0 if now.time() < self.cheap_rate_end else 1
-        return dt.datetime.combine(
-            date=now.date() + dt.timedelta(days=day_offset), time=self.cheap_rate_start
-        )
+        return self._day_boundaries(self._cheap_rate_date(now))[0]
 
     def next_cheap_rate_end(self, now: dt.datetime) -> dt.datetime:
-        day_offset = 0 if now.time() < self.cheap_rate_end else 1
-        return dt.datetime.combine(
-            date=now.date() + dt.timedelta(days=day_offset), time=self.cheap_rate_end
-        )
+        return self._day_boundaries(self._cheap_rate_date(now))[1]
 
     def next_ready_by(self, now: dt.datetime) -> dt.datetime:
-        day_offset = 0 if now.time() < self.ready_by else 1
-        return dt.datetime.combine(
-            date=now.date() + dt.timedelta(days=day_offset), time=self.ready_by
-        )
+        if now.time() < self.ready_by:
+            return self._day_boundaries(now.date())[2]
+        return self._day_boundaries(now.date() + dt.timedelta(days=1))[2]
 
     def charge_minutes_needed(
         self, battery_level: int, target_battery_level: int
     ) -> int:
+        if self.charge_curve is not None:
+            return int(self.charge_curve.minutes(battery_level, target_battery_level))
         kwh_needed = (
             (target_battery_level - battery_level) / 100 * self.battery_capacity_kwh
         )
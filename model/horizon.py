@@ -0,0 +1,240 @@
+import datetime as dt
+import numpy as np
+from dataclasses import dataclass
+from typing import Sequence
+
+from .environment import Environment
+from .intent import Intent
+from .tariff import SLOT
+
+LEVELS = np.arange(101)
+
+# cost of each percent a target is missed by, far above the price of any
+# charge, so targets are only missed when no plan can meet them
+SHORTFALL_COST = 1e6
+# a token cost of each percent held at a ready-by time, so that of equally
+# cheap plans the one charging latest wins
+HOLD_COST = 1e-6
+
+
+@dataclass(frozen=True)
+class Night:
+    """
+    One night of the horizon: the charging that can be done from start to
+    the ready-by time of date, and the target level to reach by then
+    """
+
+    date: dt.date
+    start: dt.datetime
+    ready_by: dt.datetime
+    target: int
+    # the highest level to charge to ahead of a later day's target
+    max_level: int
+    # battery used between this ready-by time and the next
+    use: int
+
+
+@dataclass
+class HorizonPlan:
+    nights: list[Night]
+    # battery level planned for each night's ready-by time
+    levels: list[int]
+    # the price of the charging, plus SHORTFALL_COST for each percent a
+    # target is missed by
+    cost: float
+
+    @property
+    def tonight(self) -> int:
+        return self.levels[0]
+
+
+def _slot_prices(
+    env: Environment, start: dt.datetime, end: dt.datetime, peak_price: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Minutes and price of each slot from start to end. Beyond what the
+    tariff covers its prices are assumed to repeat daily. Without a tariff,
+    or one shorter than a day, the cheap rate window costs 1 and other
+    times peak_price.
+    """
+    slot = env.tariff.slot if env.tariff is not None else SLOT
+    slot_starts = []
+    time = start
+    while time < end:
+        slot_starts.append(time)
+        time = min(end, time - (time - dt.datetime.min) % slot + slot)
+    minutes = np.diff(
+        [(t - start) / dt.timedelta(minutes=1) for t in slot_starts + [end]]
+    )
+
+    tariff = env.tariff
+    day = dt.timedelta(days=1)
+    forecast = tariff is not None and tariff.end - tariff.start >= day
+    prices = np.empty(len(slot_starts))
+    for i, time in enumerate(slot_starts):
+        if forecast:
+            # shift by whole days into the time the tariff covers
+            if time >= tariff.end:
+                time -= ((time - tariff.end) // day + 1) * day
+            elif time < tariff.start:
+                time += -(-(tariff.start - time) // day) * day
+            prices[i] = tariff.prices[tariff.slot_index(time)]
+        else:
+            cheap = env.cheap_rate_start <= time.time() < env.cheap_rate_end
+            prices[i] = 1.0 if cheap else peak_price
+    usable = ~np.isnan(prices)
+    return minutes[usable], prices[usable]
+
+
+def _minutes_between_levels(env: Environment) -> np.ndarray:
+    # unrounded, unlike charge_minutes_needed, so that rounding doesn't make
+    # some levels look cheaper to reach than others
+    if env.charge_curve is not None:
+        return env.charge_curve.minutes_array(LEVELS[:, None], LEVELS[None, :])
+    percent = LEVELS[None, :] - LEVELS[:, None]
+    return percent / 100 * env.battery_capacity_kwh / env.charge_rate_kw * 60
+
+
+def _night_costs(env: Environment, night: Night, peak_price: float) -> np.ndarray:
+    """
+    The cost of charging from each level (rows) to each level (columns) in
+    the cheapest slots of the night, inf where that can't be done
+    """
+    minutes, prices = _slot_prices(env, night.start, night.ready_by, peak_price)
+    order = np.argsort(prices, kind="stable")
+    cumulative_minutes = np.concatenate([[0], np.cumsum(minutes[order])])
+    cumulative_cost = np.concatenate(
+        [[0], np.cumsum(minutes[order] * prices[order] / 60 * env.charge_rate_kw)]
+    )
+    needed = _minutes_between_levels(env)
+    costs = np.interp(needed, cumulative_minutes, cumulative_cost)
+    cap = max(night.max_level, night.target)
+    possible = (
+        (LEVELS[None, :] >= LEVELS[:, None])
+        & (needed <= cumulative_minutes[-1] + 1e-9)
+        & (LEVELS[None, :] <= cap)
+    )
+    # staying put is always possible, even above the cap
+    possible |= np.eye(len(LEVELS), dtype=bool)
+    return np.where(possible, np.maximum(costs, 0), np.inf)
+
+
+def _solve_night(
+    costs: np.ndarray, night: Night, following: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    shortfall = np.maximum(night.target - LEVELS, 0) * SHORTFALL_COST
+    after_use = np.maximum(LEVELS - night.use, 0)
+    total = costs + (shortfall + LEVELS * HOLD_COST + following[after_use])[None, :]
+    choice = np.argmin(total, axis=1)
+    return total[LEVELS, choice], choice
+
+
+class HorizonPlanner:
+    """
+    Plans the level to charge to on each night up to the last date with a
+    target, so cheap nights can charge ahead for a later day which needs
+    more than one night can give. Nights are solved by dynamic programming
+    over whole-percent battery levels, from the last night back.
+
+    Each night's solution depends only on it and the nights after, so a
+    night is solved again only when it or a later night changes; a change
+    of battery level needs no solving at all.
+    """
+
+    def __init__(
+        self,
+        daily_use: int = 15,
+        max_level: int = 90,
+        peak_price: float = 3.0,
+    ):
+        self._daily_use = daily_use
+        self._max_level = max_level
+        self._peak_price = peak_price
+        # the key of each night solved, and its value and choice tables
+        self._solved: list[tuple[tuple, np.ndarray, np.ndarray]] = []
+        self.nights_solved = 0
+
+    def nights(
+        self,
+        env: Environment,
+        now: dt.datetime,
+        targets: Sequence[tuple[dt.date, int]],
+    ) -> list[Night]:
+        nights = []
+        start = now
+        for date, target in targets:
+            ready_by = dt.datetime.combine(date, env.ready_by)
+            nights.append(
+                Night(
+                    date,
+                    start,
+                    ready_by,
+                    target,
+                    self._max_level,
+                    self._daily_use,
+                )
+            )
+            start = ready_by
+        return nights
+
+    def _key(self, env: Environment, night: Night) -> tuple:
+        curve = env.charge_curve
+        tariff = env.tariff
+        return (
+            night,
+            env.cheap_rate_start,
+            env.cheap_rate_end,
+            env.battery_capacity_kwh,
+            env.charge_rate_kw,
+            None if curve is None else curve.table.tobytes(),
+            None if tariff is None else (tariff.start, tariff.prices.tobytes()),
+        )
+
+    def plan(
+        self,
+        env: Environment,
+        now: dt.datetime,
+        battery_level: int,
+        targets: Sequence[tuple[dt.date, int]],
+    ) -> HorizonPlan:
+        nights = self.nights(env, now, targets)
+        keys = [self._key(env, night) for night in nights]
+
+        # reuse the solutions of the nights at the end of the horizon which
+        # are unchanged, along with every night after them
+        reused = 0
+        for key, (old_key, _, _) in zip(reversed(keys), reversed(self._solved)):
+            if key != old_key:
+                break
+            reused += 1
+        solved = self._solved[len(self._solved) - reused :]
+
+        following = solved[0][1] if solved else np.zeros(len(LEVELS))
+        for night, key in zip(
+            reversed(nights[: len(nights) - reused]),
+            reversed(keys[: len(keys) - reused]),
+        ):
+            costs = _night_costs(env, night, self._peak_price)
+            following, choice = _solve_night(costs, night, following)
+            solved.insert(0, (key, following, choice))
+            self.nights_solved += 1
+        self._solved = solved
+
+        level = min(max(int(battery_level), 0), 100)
+        levels = []
+        for night, (_, _, choice) in zip(nights, solved):
+            planned = int(choice[level])
+            levels.append(planned)
+            level = max(planned - night.use, 0)
+        cost = float(solved[0][1][min(max(int(battery_level), 0), 100)])
+        return HorizonPlan(nights, levels, cost)
+
+
+def tonights_intent(requested: Intent, plan: HorizonPlan, battery_level: int) -> Intent:
+    """
+    The intent for the coming night: the requested level, or higher where
+    the plan charges ahead for a later day
+    """
+    if plan.tonight > max(requested.max_grid_charge, battery_level):
+        return Intent(max_grid_charge=plan.tonight)
+    return requested
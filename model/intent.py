@@ -1,6 +1,60 @@
+import datetime as dt
 from dataclasses import dataclass
 
 
 @dataclass
 class Intent:
     max_grid_charge: int
+
+
+def default_charge_level(now: dt.datetime) -> int:
+    return 60 if now.month in [4, 5, 6, 7, 8, 9] else 75
+
+
+def charge_date(ready_by: dt.time, now: dt.datetime) -> dt.date:
+    """
+    The date of the next ready-by time, which is the date the charge
+    intent applies to
+    """
+    if now.time() > ready_by:
+        now += dt.timedelta(days=1)
+    return now.date()
+
+
+def intent_from_charge_intent(
+    charge_intent: dict[str, int | str], ready_by: dt.time, now: dt.datetime
+) -> Intent:
+    """
+    Pick the intent for the next ready-by time from the date-keyed
+    charge_intent shadow, falling back to the seasonal default
+    """
+    date = charge_date(ready_by, now)
+    max_charge = charge_intent.get(date.isoformat(), default_charge_level(now))
+    return Intent(max_grid_charge=int(max_charge))
+
+
+def charge_targets(
+    charge_intent: dict[str, int | str],
+    ready_by: dt.time,
+    now: dt.datetime,
+    max_days: int = 14,
+) -> list[tuple[dt.date, int]]:
+    """
+    The target for every date from the next ready-by time to the last date
+    in the charge_intent shadow, up to max_days of them. Dates in between
+    without a target of their own get the seasonal default.
+    """
+    first = charge_date(ready_by, now)
+    dates = []
+    for key in charge_intent:
+        try:
+            dates.append(dt.date.fromisoformat(key))
+        except ValueError:
+            continue
+    days = min(max_days, max([(d - first).days + 1 for d in dates] + [1]))
+    targets = []
+    for day in range(days):
+        date = first + dt.timedelta(days=day)
+        default = default_charge_level(dt.datetime.combine(date, ready_by))
+        targets.append((date, int(charge_intent.get(date.isoformat(), default))))
+    return targets
@@ -4,6 +4,7 @@ from dataclasses import dataclass
 from .status import Status
 from .intent import Intent
 from .environment import Environment
+from .tariff import plan_slots
 
 
 @dataclass
@@ -12,7 +13,34 @@ class ChargeSchedule:
     end: dt.datetime
 
 
+def tariff_schedule(
+    env: Environment, intent: Intent, status: Status
+) -> ChargeSchedule | None:
+    """
+    The run of cheapest tariff slots that now is in or that comes next, or
+    None if the tariff doesn't reach the next ready-by time. When no charge
+    is needed the schedule is empty, at ready-by.
+    """
+    ready_by = env.next_ready_by(status.now)
+    if env.tariff is None or not env.tariff.covers(status.now, ready_by):
+        return None
+    minutes_needed = env.charge_minutes_needed(
+        status.battery_level, intent.max_grid_charge
+    )
+    plan = plan_slots(
+        env.tariff, status.now, ready_by, minutes_needed, env.charge_rate_kw
+    )
+    if not plan.runs:
+        return ChargeSchedule(start=ready_by, end=ready_by)
+    return ChargeSchedule(*plan.runs[0])
+
+
 def charge_schedule(env: Environment, intent: Intent, status: Status) -> ChargeSchedule:
+    if env.tariff is not None:
+        schedule = tariff_schedule(env, intent, status)
+        if schedule is not None:
+            return schedule
+
     if env.cheap_rate_start < status.now.time() < env.cheap_rate_end:
         return ChargeSchedule(
             start=env.next_cheap_rate_start(status.now),
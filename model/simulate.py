@@ -0,0 +1,273 @@
+import csv
+import datetime as dt
+import itertools
+import numpy as np
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+
+from .config import get_config
+from .environment import Environment
+from .intent import Intent, default_charge_level
+from .status import Status
+
+TICK = dt.timedelta(minutes=15)
+
+
+@dataclass
+class Trace:
+    """
+    Energy used by driving in each tick of a period, which the simulated
+    battery has to make up by charging
+    """
+
+    start: dt.datetime
+    tick: dt.timedelta
+    consumption_kwh: np.ndarray
+    initial_battery_level: float
+
+
+@dataclass
+class Scenario:
+    env: Environment
+    # None means the seasonal default used by the daemon
+    charge_level: int | None = None
+
+
+@dataclass
+class Result:
+    scenario: Scenario
+    grid_kwh: float
+    cheap_rate_kwh: float
+    ready_by_checks: int
+    missed_ready_by: int
+
+    @property
+    def cheap_rate_coverage(self) -> float:
+        return self.cheap_rate_kwh / self.grid_kwh if self.grid_kwh else 1.0
+
+
+def load_status_history(
+    path: str, battery_capacity_kwh: float, tick: dt.timedelta = TICK
+) -> Trace:
+    """
+    Build a trace from a CSV of recorded status with columns `now` and
+    `battery_level`. Falls in battery level between samples are taken to be
+    driving; rises are charging, which the simulation replaces with its own.
+    """
+    with open(path) as f:
+        rows = sorted(
+            (dt.datetime.fromisoformat(row["now"]), float(row["battery_level"]))
+            for row in csv.DictReader(f)
+        )
+    start = rows[0][0]
+    ticks = int((rows[-1][0] - start) / tick) + 1
+    consumption = np.zeros(ticks)
+    for (_, previous), (now, level) in zip(rows, rows[1:]):
+        if level < previous:
+            i = int((now - start) / tick)
+            consumption[i] += (previous - level) / 100 * battery_capacity_kwh
+    return Trace(start, tick, consumption, rows[0][1])
+
+
+def synthetic_trace(
+    start: dt.datetime,
+    days: int,
+    daily_kwh: float = 8,
+    daily_kwh_spread: float = 4,
+    departure: dt.time = dt.time(8),
+    home: dt.time = dt.time(18),
+    seed: int = 0,
+    tick: dt.timedelta = TICK,
+) -> Trace:
+    """
+    A trace of a car driven every day between departure and home, using a
+    random amount of energy drawn around daily_kwh
+    """
+    rng = np.random.default_rng(seed)
+    ticks_per_day = int(dt.timedelta(days=1) / tick)
+    consumption = np.zeros(days * ticks_per_day)
+    start = dt.datetime.combine(start.date(), dt.time())
+    first = int(dt.timedelta(hours=departure.hour, minutes=departure.minute) / tick)
+    last = int(dt.timedelta(hours=home.hour, minutes=home.minute) / tick)
+    daily = np.clip(rng.normal(daily_kwh, daily_kwh_spread, days), 0, None)
+    for day, kwh in enumerate(daily):
+        base = day * ticks_per_day
+        consumption[base + first : base + last] = kwh / (last - first)
+    return Trace(start, tick, consumption, 50.0)
+
+
+def _in_window(time: dt.time, start: dt.time, end: dt.time) -> bool:
+    if start <= end:
+        return start <= time < end
+    return time >= start or time < end
+
+
+def simulate(trace: Trace, scenario: Scenario) -> Result:
+    """
+    Replay the trace through get_config, charging a simulated battery at
+    the environment's charge rate, or along its charge curve, whenever the
+    charger is told to charge from the grid
+    """
+    env = scenario.env
+    hours_per_tick = trace.tick / dt.timedelta(hours=1)
+    curve = env.charge_curve
+    charge_per_tick = (
+        env.charge_rate_kw * hours_per_tick / env.battery_capacity_kwh * 100
+    )
+    used_per_tick = (trace.consumption_kwh / env.battery_capacity_kwh * 100).tolist()
+
+    battery = trace.initial_battery_level
+    grid_kwh = cheap_rate_kwh = 0.0
+    checks = missed = 0
+    target = None
+    now = trace.start
+    for used in used_per_tick:
+        # check the target set for the night just ended, before driving off
+        previous = now - trace.tick
+        if target is not None and previous.time() < env.ready_by <= now.time():
+            checks += 1
+            missed += int(battery < target)
+
+        target = (
+            scenario.charge_level
+            if scenario.charge_level is not None
+            else default_charge_level(now)
+        )
+        status = Status(
+            now=now, battery_level=int(battery), estimated_range=0, hvac_state=False
+        )
+        if get_config(env, Intent(max_grid_charge=target), status).charge_from_grid:
+            if curve is not None:
+                charged = curve.level_after(battery, hours_per_tick * 60) - battery
+            else:
+                charged = min(charge_per_tick, 100 - battery)
+            kwh = charged / 100 * env.battery_capacity_kwh
+            battery += charged
+            grid_kwh += kwh
+            if _in_window(now.time(), env.cheap_rate_start, env.cheap_rate_end):
+                cheap_rate_kwh += kwh
+
+        battery = max(0.0, battery - used)
+        now += trace.tick
+
+    return Result(scenario, grid_kwh, cheap_rate_kwh, checks, missed)
+
+
+def _simulate(args: tuple[Trace, Scenario]) -> Result:
+    return simulate(*args)
+
+
+def sweep(
+    trace: Trace, scenarios: list[Scenario], processes: int | None = None
+) -> list[Result]:
+    """
+    Simulate every scenario against the same trace, spread across a pool of
+    processes
+    """
+    workers = processes or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunksize = max(1, len(scenarios) // (4 * workers))
+        return list(
+            pool.map(
+                _simulate,
+                zip(itertools.repeat(trace), scenarios),
+                chunksize=chunksize,
+            )
+        )
+
+
+def scenario_grid(
+    env: Environment,
+    charge_levels: list[int | None],
+    cheap_rate_starts: list[dt.time],
+    cheap_rate_ends: list[dt.time],
+    ready_bys: list[dt.time],
+) -> list[Scenario]:
+    return [
+        Scenario(
+            replace(env, cheap_rate_start=start, cheap_rate_end=end, ready_by=ready_by),
+            charge_level,
+        )
+        for charge_level, start, end, ready_by in itertools.product(
+            charge_levels, cheap_rate_starts, cheap_rate_ends, ready_bys
+        )
+    ]
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from tabulate import tabulate
+
+    def times(value: str) -> list[dt.time]:
+        return [dt.time.fromisoformat(t) for t in value.split(",")]
+
+    def levels(value: str) -> list[int | None]:
+        return [None if v == "default" else int(v) for v in value.split(",")]
+
+    parser = argparse.ArgumentParser(description="Backtest the charging policy")
+    parser.add_argument("--history", help="CSV of recorded status history")
+    parser.add_argument("--days", type=int, default=90, help="days of synthetic data")
+    parser.add_argument("--daily-kwh", type=float, default=8)
+    parser.add_argument("--charge-levels", type=levels, default=[None])
+    parser.add_argument("--cheap-rate-starts", type=times, default=times("00:00"))
+    parser.add_argument("--cheap-rate-ends", type=times, default=times("04:59"))
+    parser.add_argument("--ready-bys", type=times, default=times("07:00"))
+    parser.add_argument("--battery-capacity-kwh", type=float, default=60)
+    parser.add_argument("--charge-rate-kw", type=float, default=7.2)
+    parser.add_argument("--processes", type=int)
+    args = parser.parse_args()
+
+    if args.history:
+        trace = load_status_history(args.history, args.battery_capacity_kwh)
+    else:
+        trace = synthetic_trace(
+            dt.datetime(2024, 1, 1), args.days, daily_kwh=args.daily_kwh
+        )
+
+    env = Environment(
+        cheap_rate_start=dt.time(0),
+        cheap_rate_end=dt.time(4, 59),
+        ready_by=dt.time(7),
+        battery_capacity_kwh=args.battery_capacity_kwh,
+        charge_rate_kw=args.charge_rate_kw,
+    )
+    scenarios = scenario_grid(
+        env,
+        args.charge_levels,
+        args.cheap_rate_starts,
+        args.cheap_rate_ends,
+        args.ready_bys,
+    )
+
+    started = time.perf_counter()
+    results = sweep(trace, scenarios, args.processes)
+    elapsed = time.perf_counter() - started
+
+    print(
+        tabulate(
+            [
+                [
+                    r.scenario.charge_level or "default",
+                    r.scenario.env.cheap_rate_start,
+                    r.scenario.env.cheap_rate_end,
+                    r.scenario.env.ready_by,
+                    f"{r.grid_kwh:.1f}",
+                    f"{r.cheap_rate_coverage:.1%}",
+                    f"{r.missed_ready_by}/{r.ready_by_checks}",
+                ]
+                for r in results
+            ],
+            headers=[
+                "level",
+                "cheap from",
+                "cheap to",
+                "ready by",
+                "grid kWh",
+                "cheap",
+                "missed",
+            ],
+        )
+    )
+    print(f"{len(scenarios)} scenarios in {elapsed:.2f}s")
@@ -8,3 +8,5 @@ class Status:
     battery_level: int
     estimated_range: int
     hvac_state: bool
+    # when the battery reading was taken, if known; it may be before now
+    read_at: dt.datetime | None = None
@@ -0,0 +1,237 @@
+import csv
+import datetime as dt
+import heapq
+import numpy as np
+import os
+from dataclasses import dataclass
+from typing import Sequence
+
+SLOT = dt.timedelta(minutes=30)
+
+
+@dataclass
+class Tariff:
+    """
+    Prices per kWh for a run of equal length slots, such as the 48 half
+    hours of a day. Times are naive local times like the rest of the model.
+    A slot with an unknown price is NaN and is never charged in.
+    """
+
+    start: dt.datetime
+    prices: np.ndarray
+    slot: dt.timedelta = SLOT
+
+    @property
+    def end(self) -> dt.datetime:
+        return self.start + self.slot * len(self.prices)
+
+    def covers(self, start: dt.datetime, end: dt.datetime) -> bool:
+        return self.start <= start and end <= self.end
+
+    def slot_index(self, time: dt.datetime) -> int:
+        return (time - self.start) // self.slot
+
+    def slot_start(self, index: int) -> dt.datetime:
+        return self.start + self.slot * index
+
+    @classmethod
+    def from_daily_rates(
+        cls,
+        date: dt.date,
+        days: int,
+        rates: Sequence[tuple[dt.time, float]],
+        slot: dt.timedelta = SLOT,
+    ) -> "Tariff":
+        """
+        A tariff repeating every day, from the times its price changes and
+        the price from each of them. The last price runs on past midnight
+        until the first change of the next day.
+        """
+        start = dt.datetime.combine(date, dt.time(0))
+        slot_times = start + slot * np.arange(int(dt.timedelta(days=days) / slot))
+        rates = sorted(rates)
+        prices = np.full(len(slot_times), rates[-1][1], dtype=float)
+        for i, slot_start in enumerate(slot_times.tolist()):
+            for time, price in rates:
+                if slot_start.time() >= time:
+                    prices[i] = price
+        return cls(start, prices, slot)
+
+
+def load_tariff(path: str) -> Tariff:
+    """
+    Load a CSV of slot prices with columns `start` and `price`, as published
+    a day or more ahead by time-of-use suppliers. The slot length is the
+    shortest gap between starts, and slots missing from the file have an
+    unknown price.
+    """
+    with open(path) as f:
+        rows = sorted(
+            (_local(dt.datetime.fromisoformat(row["start"])), float(row["price"]))
+            for row in csv.DictReader(f)
+        )
+    if not rows:
+        raise ValueError(f"{path}: no tariff slots")
+    starts = [start for start, _ in rows]
+    gaps = [b - a for a, b in zip(starts, starts[1:]) if b > a]
+    slot = min(gaps, default=SLOT)
+    start = starts[0]
+    prices = np.full((starts[-1] - start) // slot + 1, np.nan)
+    for time, price in rows:
+        prices[(time - start) // slot] = price
+    return Tariff(start, prices, slot)
+
+
+def _local(time: dt.datetime) -> dt.datetime:
+    if time.tzinfo is None:
+        return time
+    return time.astimezone().replace(tzinfo=None)
+
+
+class TariffFile:
+    """
+    The tariff in a file which is replaced as new prices are published,
+    loaded again whenever it changes
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._mtime: float | None = None
+        self._tariff: Tariff | None = None
+
+    def get(self) -> Tariff | None:
+        try:
+            mtime = os.path.getmtime(self._path)
+        except FileNotFoundError:
+            return None
+        if mtime != self._mtime:
+            self._tariff = load_tariff(self._path)
+            self._mtime = mtime
+        return self._tariff
+
+
+@dataclass
+class SlotPlan:
+    # (start, end) of each run of chosen slots in time order, ending no
+    # later than ready-by
+    runs: list[tuple[dt.datetime, dt.datetime]]
+    minutes: float
+    cost: float
+
+
+def _available_minutes(
+    tariff: Tariff, now: dt.datetime, ready_by: dt.datetime
+) -> list[tuple[int, float]]:
+    first = max(0, tariff.slot_index(now))
+    last = min(len(tariff.prices), -(-(ready_by - tariff.start) // tariff.slot))
+    available = []
+    for i in range(first, last):
+        start = max(tariff.slot_start(i), now)
+        end = min(tariff.slot_start(i + 1), ready_by)
+        if end > start:
+            available.append((i, (end - start) / dt.timedelta(minutes=1)))
+    return available
+
+
+def plan_slots(
+    tariff: Tariff,
+    now: dt.datetime,
+    ready_by: dt.datetime,
+    minutes_needed: float,
+    charge_rate_kw: float,
+) -> SlotPlan:
+    """
+    The cheapest slots between now and ready_by giving minutes_needed of
+    charging, taken cheapest first from a heap with earlier slots winning
+    ties. The slot now is in only counts for what is left of it, and the
+    last slot taken may only be partly used. If there isn't enough time
+    every slot with a price is used.
+    """
+    heap = [
+        (tariff.prices[i], i, minutes)
+        for i, minutes in _available_minutes(tariff, now, ready_by)
+        if not np.isnan(tariff.prices[i])
+    ]
+    heapq.heapify(heap)
+    chosen = []
+    remaining = minutes_needed
+    cost = 0.0
+    while remaining > 0 and heap:
+        price, i, minutes = heapq.heappop(heap)
+        used = min(minutes, remaining)
+        remaining -= used
+        cost += price * used / 60 * charge_rate_kw
+        chosen.append(i)
+
+    runs = []
+    for i in sorted(chosen):
+        start = tariff.slot_start(i)
+        end = min(tariff.slot_start(i + 1), ready_by)
+        if runs and runs[-1][1] == start:
+            runs[-1] = (runs[-1][0], end)
+        else:
+            runs.append((start, end))
+    return SlotPlan(runs, minutes_needed - max(0, remaining), cost)
+
+
+@dataclass
+class BatchSlotPlan:
+    # index into the tariff of column 0 of the rows below
+    first_slot: np.ndarray
+    # minutes of charging planned in each slot from first_slot on
+    minutes: np.ndarray
+    cost: np.ndarray
+
+    @property
+    def chosen(self) -> np.ndarray:
+        return self.minutes > 0
+
+
+def plan_slots_batch(
+    tariff: Tariff,
+    now: np.ndarray | Sequence[dt.datetime],
+    ready_by: np.ndarray | Sequence[dt.datetime],
+    minutes_needed: np.ndarray | Sequence[float],
+    charge_rate_kw: float,
+) -> BatchSlotPlan:
+    """
+    Batch version of plan_slots for many vehicles or nights at once, giving
+    the same choice of slots. Each row is planned over a window of columns
+    as wide as the longest time to ready-by, so a fleet's nights for weeks
+    ahead are one sort.
+    """
+    origin = np.datetime64(tariff.start, "us")
+    minute = np.timedelta64(1, "m")
+    # times as minutes from the start of the tariff
+    now = (np.asarray(now, dtype="datetime64[us]") - origin) / minute
+    ready_by = (np.asarray(ready_by, dtype="datetime64[us]") - origin) / minute
+    minutes_needed = np.asarray(minutes_needed, dtype=float)
+    slot = tariff.slot / dt.timedelta(minutes=1)
+    count = len(tariff.prices)
+
+    first = np.clip(now // slot, 0, count).astype(np.int64)
+    last = np.clip(np.ceil(ready_by / slot), 0, count).astype(np.int64)
+    width = max(1, int((last - first).max(initial=0)))
+    index = first[:, None] + np.arange(width)
+    valid = index < last[:, None]
+    index = np.minimum(index, count - 1)
+
+    slot_start = index * slot
+    start = np.maximum(slot_start, now[:, None])
+    end = np.minimum(slot_start + slot, ready_by[:, None])
+    available = np.where(valid, end - start, 0)
+    prices = tariff.prices[index]
+    usable = valid & (available > 0) & ~np.isnan(prices)
+    available = np.where(usable, available, 0)
+
+    # cheapest first, and earliest first among equal prices as the heap does
+    order = np.argsort(np.where(usable, prices, np.inf), axis=1, kind="stable")
+    sorted_available = np.take_along_axis(available, order, axis=1)
+    before = np.cumsum(sorted_available, axis=1) - sorted_available
+    remaining = np.maximum(minutes_needed[:, None] - before, 0)
+    used = np.minimum(sorted_available, remaining)
+    minutes = np.zeros_like(used)
+    np.put_along_axis(minutes, order, used, axis=1)
+
+    cost = (np.where(usable, prices, 0) * minutes).sum(axis=1) / 60 * charge_rate_kw
+    return BatchSlotPlan(first_slot=first, minutes=minutes, cost=cost)
@@ -0,0 +1,99 @@
+import datetime as dt
+import numpy as np
+import pytest
+
+from .batch import charge_schedules, get_configs
+from .config import get_config
+from .environment import Environment
+from .intent import Intent
+from .schedule import charge_schedule
+from .status import Status
+from . import test_config, test_schedule
+
+
+def make_env(start_time, end_time, ready_by):
+    return Environment(
+        cheap_rate_start=dt.time.fromisoformat(start_time),
+        cheap_rate_end=dt.time.fromisoformat(end_time),
+        ready_by=dt.time.fromisoformat(ready_by),
+        battery_capacity_kwh=100,
+        charge_rate_kw=10,
+    )
+
+
+def to_datetime(value: np.datetime64) -> dt.datetime:
+    return value.astype("datetime64[us]").astype(dt.datetime)
+
+
+@pytest.mark.parametrize(
+    "start_time,end_time,ready_by,now,battery,target,start,end",
+    test_schedule.CASES,
+)
+def test_batch_charge_schedule_matches_test_schedule_cases(
+    start_time, end_time, ready_by, now, battery, target, start, end
+):
+    env = make_env(start_time, end_time, ready_by)
+    schedule = charge_schedules(
+        env, [dt.datetime.fromisoformat(now)], [battery], [target]
+    )
+    assert to_datetime(schedule.start[0]) == dt.datetime.fromisoformat(start)
+    assert to_datetime(schedule.end[0]) == dt.datetime.fromisoformat(end)
+
+
+def test_batch_config_matches_test_config_cases():
+    by_env = {}
+    for start_time, end_time, ready_by, battery, target, now, _ in test_config.CASES:
+        by_env.setdefault((start_time, end_time, ready_by), []).append(
+            (dt.datetime.fromisoformat(now), battery, target)
+        )
+
+    for (start_time, end_time, ready_by), rows in by_env.items():
+        env = make_env(start_time, end_time, ready_by)
+        now, battery, target = zip(*rows)
+        batch = get_configs(env, now, battery, target)
+        for i, row in enumerate(rows):
+            expected = get_config(env, Intent(row[2]), Status(row[0], row[1], 0, False))
+            assert batch.charge_from_grid[i] == expected.charge_from_grid
+
+
+@pytest.mark.parametrize(
+    "start_time,end_time,ready_by",
+    [
+        ("00:00", "05:00", "07:00"),
+        ("00:30", "04:30", "09:00"),
+        ("01:00", "04:59", "07:00"),
+        ("23:30", "05:00", "07:00"),
+    ],
+)
+def test_batch_matches_scalar_over_a_year(start_time, end_time, ready_by):
+    env = make_env(start_time, end_time, ready_by)
+    rng = np.random.default_rng(1)
+    count = 2000
+    start = np.datetime64("2024-01-01T00:00:00", "s")
+    now = start + rng.integers(0, 366 * 24 * 3600, count).astype("timedelta64[s]")
+    battery = rng.integers(0, 101, count)
+    target = rng.integers(0, 101, count)
+
+    schedules = charge_schedules(env, now, battery, target)
+    configs = get_configs(env, now, battery, target)
+
+    for i in range(count):
+        status = Status(to_datetime(now[i]), int(battery[i]), 0, False)
+        intent = Intent(int(target[i]))
+        schedule = charge_schedule(env, intent, status)
+        assert to_datetime(schedules.start[i]) == schedule.start
+        assert to_datetime(schedules.end[i]) == schedule.end
+
+        config = get_config(env, intent, status)
+        assert configs.charge_from_grid[i] == config.charge_from_grid
+        if config.charge_schedule is None:
+            assert np.isnat(configs.charge_schedule.start[i])
+        else:
+            assert (
+                to_datetime(configs.charge_schedule.start[i])
+                == config.charge_schedule.start
+            )
+            assert (
+                to_datetime(configs.charge_schedule.end[i])
+                == config.charge_schedule.end
+            )
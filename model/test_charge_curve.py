@@ -0,0 +1,148 @@
+import datetime as dt
+import numpy as np
+import pytest
+from dataclasses import replace
+
+from .batch import charge_minutes_needed
+from .charge_curve import ChargeCurve
+from .environment import Environment
+
+START = dt.datetime(2024, 8, 1, 0, 0)
+QUARTER = dt.timedelta(minutes=15)
+
+
+def make_env(curve: ChargeCurve | None = None) -> Environment:
+    return Environment(
+        cheap_rate_start=dt.time(hour=0),
+        cheap_rate_end=dt.time(hour=5),
+        ready_by=dt.time(hour=9),
+        battery_capacity_kwh=100,
+        charge_rate_kw=10,
+        charge_curve=curve,
+    )
+
+
+def tapering_session(start_level: int = 20) -> tuple[list, list, list]:
+    """
+    A session charging 4% per quarter hour up to 80%, then 1% per quarter
+    hour to 100%
+    """
+    times, levels = [START], [start_level]
+    while levels[-1] < 100:
+        times.append(times[-1] + QUARTER)
+        levels.append(min(100, levels[-1] + (4 if levels[-1] < 80 else 1)))
+    return times, levels, [True] * len(times)
+
+
+@pytest.mark.parametrize(
+    "level,target",
+    [(0, 100), (20, 80), (50, 51), (80, 20), (45, 45)],
+)
+def test_untrained_curve_matches_constant_rate(level, target):
+    assert make_env(ChargeCurve(100, 10)).charge_minutes_needed(
+        level, target
+    ) == make_env().charge_minutes_needed(level, target)
+
+
+def test_fit_learns_slower_charging_near_full():
+    curve = ChargeCurve(100, 10, prior_weight=0.001).fit(*tapering_session())
+    assert curve.minutes(20, 80) == pytest.approx(225, rel=0.01)
+    assert curve.minutes(80, 100) == pytest.approx(300, rel=0.01)
+    # levels never charged through keep the constant rate
+    assert curve.minutes(0, 10) == pytest.approx(60)
+
+
+def test_add_sample_matches_fit():
+    times, levels, charging = tapering_session()
+    fitted = ChargeCurve(100, 10).fit(times, levels, charging)
+    incremental = ChargeCurve(100, 10)
+    for time, level, on in zip(times, levels, charging):
+        incremental.add_sample(time, level, on)
+    np.testing.assert_allclose(incremental.table, fitted.table)
+
+
+@pytest.mark.parametrize(
+    "second,level,charging",
+    [
+        (START + QUARTER, 24, False),  # charger off, e.g. solar
+        (START + QUARTER, 20, True),  # not plugged in
+        (START + dt.timedelta(hours=2), 40, True),  # a gap in the readings
+    ],
+)
+def test_add_sample_ignores_readings_without_grid_charging(second, level, charging):
+    curve = ChargeCurve(100, 10)
+    table = curve.table.copy()
+    curve.add_sample(START, 20, charging)
+    curve.add_sample(second, level, True)
+    np.testing.assert_array_equal(curve.table, table)
+
+
+def test_level_after_inverts_minutes():
+    curve = ChargeCurve(100, 10).fit(*tapering_session())
+    minutes = curve.minutes(30, 90)
+    assert curve.level_after(30, minutes) == pytest.approx(90)
+    assert curve.level_after(95, 1000) == 100
+
+
+def test_batch_charge_minutes_needed_matches_curve():
+    env = make_env(ChargeCurve(100, 10).fit(*tapering_session()))
+    rng = np.random.default_rng(1)
+    levels = rng.integers(0, 101, 500)
+    targets = rng.integers(0, 101, 500)
+    batch = charge_minutes_needed(env, levels, targets)
+    assert batch.tolist() == [
+        env.charge_minutes_needed(int(level), int(target))
+        for level, target in zip(levels, targets)
+    ]
+
+
+def test_environment_compares_equal_with_and_without_curve():
+    env = make_env()
+    assert replace(env, charge_curve=ChargeCurve(100, 10)) == env
+
+
+def hourly_charging(curve: ChargeCurve, repeat_first: bool = False) -> ChargeCurve:
+    """
+    Ticks an hour apart, as the heartbeat spaces them while charging, each
+    reporting a reading taken ten minutes before it. The charger is switched
+    on at midnight and charges 6% an hour, half the constant rate.
+    """
+    level = lambda time: 20 + max(0.0, (time - START) / dt.timedelta(hours=1)) * 6
+    for hour in range(-1, 8):
+        tick = START + dt.timedelta(hours=hour)
+        read_at = tick - dt.timedelta(minutes=10)
+        if repeat_first and hour == 0:
+            # the reading from before the charger came on, reported again
+            read_at -= dt.timedelta(hours=1)
+        curve.add_sample(read_at, level(read_at), tick >= START)
+    return curve
+
+
+def test_learns_from_readings_at_the_heartbeat_spacing():
+    max_gap = dt.timedelta(hours=1) + dt.timedelta(minutes=30)
+    curve = hourly_charging(ChargeCurve(60, 7.2, prior_weight=1, max_gap=max_gap))
+    # halfway between the constant rate and the observed one
+    assert curve.minutes(30, 60) == pytest.approx(225)
+    # before the charger came on, and before the first reading charging,
+    # nothing is learned
+    assert curve.minutes(0, 20) == pytest.approx(100)
+
+
+def test_interval_before_the_charger_came_on_is_not_learned():
+    max_gap = dt.timedelta(hours=2) + dt.timedelta(minutes=30)
+    fresh = hourly_charging(ChargeCurve(60, 7.2, prior_weight=1, max_gap=max_gap))
+    repeated = hourly_charging(
+        ChargeCurve(60, 7.2, prior_weight=1, max_gap=max_gap), repeat_first=True
+    )
+    # the stale reading spans an hour of not charging, so is skipped rather
+    # than crediting that hour to the first percents charged
+    np.testing.assert_allclose(repeated.table, fresh.table)
+    assert repeated.minutes(20, 25) == pytest.approx(25)
+
+
+def test_fit_matches_add_sample_at_the_heartbeat_spacing():
+    incremental = hourly_charging(ChargeCurve(60, 7.2))
+    times = [START + dt.timedelta(hours=h, minutes=-10) for h in range(-1, 8)]
+    levels = [20 + max(0, h - 1 / 6) * 6 for h in range(-1, 8)]
+    fitted = ChargeCurve(60, 7.2).fit(times, levels, [h >= 0 for h in range(-1, 8)])
+    np.testing.assert_allclose(fitted.table, incremental.table)
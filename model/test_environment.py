@@ -1,4 +1,5 @@
 import datetime as dt
+import dataclasses
 import pytest
 from .environment import Environment
 
@@ -87,3 +88,22 @@ def test_charge_minutes_needed(capacity, rate, level, target_level, expect):
         charge_rate_kw=rate,
     )
     assert env.charge_minutes_needed(level, target_level) == expect
+
+
+def test_cached_times_follow_a_changed_window():
+    env = Environment(
+        cheap_rate_start=dt.time(0),
+        cheap_rate_end=dt.time(5),
+        ready_by=dt.time(7),
+        battery_capacity_kwh=60,
+        charge_rate_kw=7.2,
+    )
+    now = dt.datetime(2024, 7, 27, 12)
+    assert env.cheap_rate_duration_minutes == 300
+    assert env.next_cheap_rate_end(now) == dt.datetime(2024, 7, 28, 5)
+
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        env.cheap_rate_end = dt.time(4)
+    changed = dataclasses.replace(env, cheap_rate_end=dt.time(4))
+    assert changed.cheap_rate_duration_minutes == 240
+    assert changed.next_cheap_rate_end(now) == dt.datetime(2024, 7, 28, 4)
@@ -0,0 +1,99 @@
+import datetime as dt
+import pytest
+from dataclasses import replace
+
+from .environment import Environment
+from .horizon import HorizonPlanner, tonights_intent
+from .intent import Intent, charge_targets
+from .tariff import Tariff
+
+# four hours of cheap rate a night, 48% of the battery
+ENV = Environment(
+    cheap_rate_start=dt.time(0, 30),
+    cheap_rate_end=dt.time(4, 30),
+    ready_by=dt.time(7),
+    battery_capacity_kwh=60,
+    charge_rate_kw=7.2,
+)
+NOW = dt.datetime(2024, 8, 1, 20)
+
+
+def plan(charge_intent: dict, battery_level: int, env: Environment = ENV, **kwargs):
+    targets = charge_targets(charge_intent, env.ready_by, NOW)
+    return HorizonPlanner(**kwargs).plan(env, NOW, battery_level, targets)
+
+
+def test_only_tonight_without_later_targets():
+    assert plan({}, 30).levels == [60]
+
+
+def test_charges_no_earlier_than_needed():
+    assert plan({"2024-08-06": 100}, 30).levels == [60, 60, 60, 67, 100]
+
+
+def test_charges_ahead_when_one_night_is_not_enough():
+    # 52% after the day's use, and 48% more on the night before
+    assert plan({"2024-08-03": 100}, 30).levels == [67, 100]
+
+
+def test_charges_ahead_on_a_cheaper_night():
+    # the night before the big day costs four times as much
+    tariff = Tariff.from_daily_rates(
+        dt.date(2024, 8, 2), days=2, rates=[(dt.time(0, 30), 5), (dt.time(4, 30), 30)]
+    )
+    tariff.prices[48:] *= 4
+    # as much as tonight can give, then the rest
+    assert plan({"2024-08-03": 80}, 30, replace(ENV, tariff=tariff)).levels == [
+        78,
+        80,
+    ]
+
+
+def test_max_level_limits_charging_ahead():
+    levels = plan({"2024-08-03": 100}, 30, max_level=60).levels
+    # the rest has to be charged outside the cheap rate window
+    assert levels == [60, 100]
+
+
+def test_stays_above_target_without_charging():
+    assert plan({"2024-08-03": 50}, 95).levels == [95, 80]
+
+
+def test_resolves_only_changed_nights():
+    planner = HorizonPlanner()
+    targets = charge_targets({"2024-08-10": 90}, ENV.ready_by, NOW)
+    planner.plan(ENV, NOW, 30, targets)
+    assert planner.nights_solved == len(targets)
+
+    # a new battery level needs no solving
+    planner.plan(ENV, NOW, 40, targets)
+    assert planner.nights_solved == len(targets)
+
+    # as time passes only tonight, which starts now, is solved again
+    later = NOW + dt.timedelta(minutes=15)
+    planner.plan(ENV, later, 40, targets)
+    assert planner.nights_solved == len(targets) + 1
+
+    # a change part way through solves it and the nights before it
+    changed = charge_targets({"2024-08-05": 80, "2024-08-10": 90}, ENV.ready_by, later)
+    fresh = HorizonPlanner().plan(ENV, later, 40, changed)
+    assert planner.plan(ENV, later, 40, changed) == fresh
+    assert planner.nights_solved == len(targets) + 1 + 4
+
+
+@pytest.mark.parametrize(
+    "requested,tonight,battery_level,expect",
+    [
+        (60, 60, 30, 60),
+        (60, 75, 30, 75),
+        # already above the target; the plan does no charging
+        (60, 70, 70, 60),
+        # a target that can't be reached stays as requested
+        (100, 80, 30, 100),
+    ],
+)
+def test_tonights_intent(requested, tonight, battery_level, expect):
+    result = plan({}, battery_level)
+    result.levels = [tonight]
+    intent = tonights_intent(Intent(requested), result, battery_level)
+    assert intent == Intent(max_grid_charge=expect)
@@ -0,0 +1,47 @@
+import datetime as dt
+import pytest
+from .intent import Intent, charge_targets, intent_from_charge_intent
+
+
+@pytest.mark.parametrize(
+    "charge_intent,now,expect",
+    [
+        # before ready-by the intent for today applies
+        ({"2024-07-28": "90"}, "2024-07-28T06:00:00", 90),
+        # after ready-by the intent for tomorrow applies
+        ({"2024-07-28": "90"}, "2024-07-28T08:00:00", 60),
+        ({"2024-07-29": 80}, "2024-07-28T08:00:00", 80),
+        # seasonal defaults
+        ({}, "2024-07-28T22:00:00", 60),
+        ({}, "2024-12-01T22:00:00", 75),
+    ],
+)
+def test_intent_from_charge_intent(charge_intent, now, expect):
+    intent = intent_from_charge_intent(
+        charge_intent, dt.time(hour=7), dt.datetime.fromisoformat(now)
+    )
+    assert intent == Intent(max_grid_charge=expect)
+
+
+@pytest.mark.parametrize(
+    "charge_intent,now,expect",
+    [
+        ({}, "2024-07-28T08:00:00", [("2024-07-29", 60)]),
+        (
+            {"2024-07-31": "100", "ready_by": "07:00"},
+            "2024-07-28T08:00:00",
+            [("2024-07-29", 60), ("2024-07-30", 60), ("2024-07-31", 100)],
+        ),
+        # past dates are ignored, and the horizon stops at max_days
+        (
+            {"2024-07-27": 90, "2024-08-30": 90},
+            "2024-07-28T06:00:00",
+            [("2024-07-28", 60), ("2024-07-29", 60), ("2024-07-30", 60)],
+        ),
+    ],
+)
+def test_charge_targets(charge_intent, now, expect):
+    targets = charge_targets(
+        charge_intent, dt.time(hour=7), dt.datetime.fromisoformat(now), max_days=3
+    )
+    assert targets == [(dt.date.fromisoformat(d), level) for d, level in expect]
@@ -0,0 +1,71 @@
+import datetime as dt
+from dataclasses import replace
+import numpy as np
+import pytest
+
+from .environment import Environment
+from .simulate import (
+    Scenario,
+    Trace,
+    load_status_history,
+    simulate,
+    sweep,
+    synthetic_trace,
+)
+
+ENV = Environment(
+    cheap_rate_start=dt.time(0),
+    cheap_rate_end=dt.time(5),
+    ready_by=dt.time(7),
+    battery_capacity_kwh=60,
+    charge_rate_kw=7.2,
+)
+
+
+def test_load_status_history_counts_only_falls_in_battery_level(tmp_path):
+    path = tmp_path / "history.csv"
+    path.write_text(
+        "now,battery_level\n"
+        "2024-07-28T08:00:00,80\n"
+        "2024-07-28T08:15:00,70\n"
+        "2024-07-28T08:30:00,75\n"
+        "2024-07-28T09:00:00,65\n"
+    )
+    trace = load_status_history(str(path), battery_capacity_kwh=60)
+    assert trace.start == dt.datetime(2024, 7, 28, 8)
+    assert trace.initial_battery_level == 80
+    assert trace.consumption_kwh.tolist() == pytest.approx([0, 6, 0, 0, 6])
+
+
+def test_charges_to_target_in_cheap_window():
+    trace = Trace(
+        start=dt.datetime(2024, 7, 27, 12),
+        tick=dt.timedelta(minutes=15),
+        consumption_kwh=np.zeros(4 * 24),
+        initial_battery_level=40,
+    )
+    result = simulate(trace, Scenario(ENV, charge_level=60))
+    assert result.ready_by_checks == 1
+    assert result.missed_ready_by == 0
+    assert result.grid_kwh > 0.2 * 60
+    assert result.cheap_rate_coverage == 1.0
+
+
+def test_target_beyond_ready_by_is_missed():
+    trace = Trace(
+        start=dt.datetime(2024, 7, 27, 12),
+        tick=dt.timedelta(minutes=15),
+        consumption_kwh=np.zeros(4 * 24),
+        initial_battery_level=0,
+    )
+    slow = replace(ENV, charge_rate_kw=2)
+    result = simulate(trace, Scenario(slow, charge_level=100))
+    assert result.missed_ready_by == 1
+
+
+def test_sweep_matches_simulate():
+    trace = synthetic_trace(dt.datetime(2024, 1, 1), days=7)
+    scenarios = [Scenario(ENV, level) for level in [None, 60, 80]]
+    assert sweep(trace, scenarios, processes=2) == [
+        simulate(trace, s) for s in scenarios
+    ]
@@ -0,0 +1,201 @@
+import datetime as dt
+import numpy as np
+import os
+import pytest
+from dataclasses import replace
+
+from .batch import charge_schedules, get_configs
+from .config import get_config
+from .environment import Environment
+from .intent import Intent
+from .schedule import ChargeSchedule, charge_schedule
+from .status import Status
+from .tariff import Tariff, TariffFile, load_tariff, plan_slots, plan_slots_batch
+from .test_batch import to_datetime
+
+DAY = dt.datetime(2024, 8, 1)
+
+# a two-window tariff: cheap overnight and again early afternoon
+TWO_WINDOWS = Tariff.from_daily_rates(
+    DAY.date(),
+    days=3,
+    rates=[
+        (dt.time(0, 30), 8),
+        (dt.time(4, 30), 25),
+        (dt.time(13), 12),
+        (dt.time(16), 35),
+        (dt.time(19), 25),
+    ],
+)
+
+
+def at(time: str, day: int = 0) -> dt.datetime:
+    # "07:00+1" is a time the next day
+    time, _, days = time.partition("+")
+    return dt.datetime.combine(DAY.date(), dt.time.fromisoformat(time)) + (
+        dt.timedelta(days=day + int(days or 0))
+    )
+
+
+def make_env(tariff: Tariff | None = TWO_WINDOWS) -> Environment:
+    return Environment(
+        cheap_rate_start=dt.time(0, 30),
+        cheap_rate_end=dt.time(4, 30),
+        ready_by=dt.time(7),
+        battery_capacity_kwh=60,
+        charge_rate_kw=7.2,
+        tariff=tariff,
+    )
+
+
+def test_from_daily_rates():
+    assert len(TWO_WINDOWS.prices) == 3 * 48
+    assert TWO_WINDOWS.prices[0] == 25  # carried over from the evening before
+    assert TWO_WINDOWS.prices[TWO_WINDOWS.slot_index(at("00:30"))] == 8
+    assert TWO_WINDOWS.prices[TWO_WINDOWS.slot_index(at("13:30"))] == 12
+    assert TWO_WINDOWS.end == at("00:00", day=3)
+
+
+def test_load_tariff(tmp_path):
+    path = tmp_path / "tariff.csv"
+    path.write_text(
+        "start,price\n"
+        "2024-08-01T01:00:00,10.5\n"
+        "2024-08-01T00:00:00,12\n"
+        "2024-08-01T00:30:00,11\n"
+        "2024-08-01T02:00:00,9\n"
+    )
+    tariff = load_tariff(str(path))
+    assert tariff.start == at("00:00")
+    assert tariff.slot == dt.timedelta(minutes=30)
+    np.testing.assert_array_equal(tariff.prices, [12, 11, 10.5, np.nan, 9])
+
+
+def test_tariff_file_reloads_when_changed(tmp_path):
+    path = tmp_path / "tariff.csv"
+    tariff_file = TariffFile(str(path))
+    assert tariff_file.get() is None
+    path.write_text("start,price\n2024-08-01T00:00:00,12\n")
+    assert tariff_file.get().prices.tolist() == [12]
+    path.write_text("start,price\n2024-08-01T00:00:00,15\n")
+    os.utime(path, (0, 0))
+    assert tariff_file.get().prices.tolist() == [15]
+
+
+@pytest.mark.parametrize(
+    "now,minutes,runs",
+    [
+        # four hours fill the overnight window
+        ("21:00", 240, [("00:30+1", "04:30+1")]),
+        ("12:00", 90, [("00:30+1", "02:00+1")]),
+        # then the afternoon window, partly used
+        ("12:00", 300, [("13:00", "14:00"), ("00:30+1", "04:30+1")]),
+        # only what is left of the slot now is counted
+        ("03:45", 30, [("03:30", "04:30")]),
+        # not enough time: every slot up to ready-by
+        ("06:00", 120, [("06:00", "07:00")]),
+        ("21:00", 0, []),
+    ],
+)
+def test_plan_slots(now, minutes, runs):
+    now = at(now)
+    ready_by = make_env().next_ready_by(now)
+    plan = plan_slots(TWO_WINDOWS, now, ready_by, minutes, 7.2)
+    assert plan.runs == [(at(start), at(end)) for start, end in runs]
+
+
+def test_plan_slots_cost_and_shortfall():
+    plan = plan_slots(TWO_WINDOWS, at("06:00"), at("07:00"), 120, 7.2)
+    assert plan.minutes == 60
+    assert plan.cost == pytest.approx(25 * 7.2)
+
+
+def test_plan_slots_skips_unknown_prices():
+    prices = np.array([10, np.nan, 10, 20])
+    tariff = Tariff(at("00:00"), prices)
+    plan = plan_slots(tariff, at("00:00"), at("02:00"), 60, 7.2)
+    assert plan.runs == [(at("00:00"), at("00:30")), (at("01:00"), at("01:30"))]
+
+
+def test_batch_plan_matches_scalar():
+    rng = np.random.default_rng(3)
+    # few distinct prices, so there are plenty of ties to break
+    tariff = Tariff(at("00:00"), rng.integers(5, 10, 14 * 48).astype(float))
+    tariff.prices[rng.integers(0, len(tariff.prices), 20)] = np.nan
+    count = 2000
+    start = np.datetime64(tariff.start, "s")
+    now = start + rng.integers(0, 12 * 24 * 3600, count).astype("timedelta64[s]")
+    ready_by = now + rng.integers(1, 24 * 3600, count).astype("timedelta64[s]")
+    minutes = rng.integers(0, 600, count)
+
+    batch = plan_slots_batch(tariff, now, ready_by, minutes, 7.2)
+    for i in range(count):
+        plan = plan_slots(
+            tariff, to_datetime(now[i]), to_datetime(ready_by[i]), minutes[i], 7.2
+        )
+        chosen = batch.first_slot[i] + np.flatnonzero(batch.chosen[i])
+        assert [tariff.slot_start(j) for j in chosen] == [
+            start for start, end in plan.runs for start in _slots(tariff, start, end)
+        ]
+        assert batch.minutes[i].sum() == pytest.approx(plan.minutes)
+        assert batch.cost[i] == pytest.approx(plan.cost)
+
+
+def _slots(tariff: Tariff, start: dt.datetime, end: dt.datetime):
+    while start < end:
+        yield start
+        start += tariff.slot
+
+
+def test_charge_schedule_uses_tariff():
+    env = make_env()
+    status = Status(at("12:00"), 20, 0, False)
+    # five hours of charging: the overnight window, then some of the
+    # afternoon one, which comes first
+    schedule = charge_schedule(env, Intent(max_grid_charge=80), status)
+    assert schedule == ChargeSchedule(at("13:00"), at("14:00"))
+
+    config = get_config(env, Intent(80), replace(status, now=at("13:15")))
+    assert config.charge_from_grid
+    # after an hour's charge what is left fits in the overnight window
+    charged = replace(status, now=at("14:30"), battery_level=32)
+    assert not get_config(env, Intent(80), charged).charge_from_grid
+
+
+def test_charge_schedule_without_tariff_coverage_uses_cheap_window():
+    env = make_env()
+    status = Status(at("12:00", day=2), 50, 0, False)
+    assert charge_schedule(env, Intent(60), status) == charge_schedule(
+        make_env(None), Intent(60), status
+    )
+
+
+def test_charge_schedule_with_nothing_to_charge_is_empty():
+    env = make_env()
+    status = Status(at("21:00"), 80, 0, False)
+    schedule = charge_schedule(env, Intent(60), status)
+    assert schedule.start == schedule.end == at("07:00", day=1)
+    assert not get_config(env, Intent(80), status).charge_from_grid
+
+
+def test_batch_schedules_match_scalar_with_tariff():
+    env = make_env()
+    rng = np.random.default_rng(4)
+    count = 2000
+    start = np.datetime64(DAY, "s")
+    now = start + rng.integers(0, 3 * 24 * 3600, count).astype("timedelta64[s]")
+    battery = rng.integers(0, 101, count)
+    target = rng.integers(0, 101, count)
+
+    schedules = charge_schedules(env, now, battery, target)
+    configs = get_configs(env, now, battery, target)
+    for i in range(count):
+        status = Status(to_datetime(now[i]), int(battery[i]), 0, False)
+        intent = Intent(int(target[i]))
+        schedule = charge_schedule(env, intent, status)
+        assert to_datetime(schedules.start[i]) == schedule.start
+        assert to_datetime(schedules.end[i]) == schedule.end
+        assert (
+            configs.charge_from_grid[i]
+            == get_config(env, intent, status).charge_from_grid
+        )
@@ -0,0 +1,38 @@
+import datetime as dt
+import pytest
+
+from .config import get_config
+from .environment import Environment
+from .intent import Intent
+from .status import Status
+from .wakeup import next_wakeup
+
+ENV = Environment(
+    cheap_rate_start=dt.time(0),
+    cheap_rate_end=dt.time(5),
+    ready_by=dt.time(7),
+    battery_capacity_kwh=100,
+    charge_rate_kw=10,
+)
+
+
+@pytest.mark.parametrize(
+    "now,battery,target,wakeup",
+    [
+        # idle in the afternoon: only the heartbeat
+        ("2024-07-27T14:00:00", 50, 60, "2024-07-27T15:00:00"),
+        # just before the cheap window opens
+        ("2024-07-27T23:30:00", 50, 60, "2024-07-28T00:00:05"),
+        # charging: wake when the battery passes its target
+        ("2024-07-28T00:00:00", 50, 55, "2024-07-28T00:36:05"),
+        # charging to full: wake at the end of the window
+        ("2024-07-28T04:30:00", 50, 100, "2024-07-28T05:00:05"),
+        # after the window, before ready-by
+        ("2024-07-28T06:30:00", 100, 60, "2024-07-28T07:00:05"),
+    ],
+)
+def test_next_wakeup(now, battery, target, wakeup):
+    intent = Intent(max_grid_charge=target)
+    status = Status(dt.datetime.fromisoformat(now), battery, 0, False)
+    config = get_config(ENV, intent, status)
+    assert next_wakeup(ENV, intent, status, config) == dt.datetime.fromisoformat(wakeup)
@@ -0,0 +1,42 @@
+import datetime as dt
+
+from .config import Config
+from .environment import Environment
+from .intent import Intent
+from .schedule import charge_schedule
+from .status import Status
+
+
+def next_wakeup(
+    env: Environment,
+    intent: Intent,
+    status: Status,
+    config: Config,
+    heartbeat: dt.timedelta = dt.timedelta(hours=1),
+    margin: dt.timedelta = dt.timedelta(seconds=5),
+) -> dt.datetime:
+    """
+    The next time a decision could change: the start or end of the cheap
+    rate window, the ready-by time, either end of the planned charge, or the
+    time the battery is predicted to pass its target while charging. Falls
+    back to the heartbeat when nothing is due sooner. The margin keeps us
+    from waking just before a boundary.
+    """
+    now = status.now
+    schedule = config.charge_schedule or charge_schedule(env, intent, status)
+    candidates = [
+        env.next_cheap_rate_start(now),
+        env.next_cheap_rate_end(now),
+        env.next_ready_by(now),
+        schedule.start,
+        schedule.end,
+    ]
+    if config.charge_from_grid:
+        # get_config stops charging once the level passes the target
+        minutes = env.charge_minutes_needed(
+            status.battery_level, intent.max_grid_charge + 1
+        )
+        candidates.append(now + dt.timedelta(minutes=minutes))
+
+    upcoming = [t + margin for t in candidates if t > now]
+    return min(upcoming + [now + heartbeat])
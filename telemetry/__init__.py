@@ -0,0 +1 @@
+from .store import RECORD, TelemetryRecord, TelemetryStore
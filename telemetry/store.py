@@ -0,0 +1,123 @@
+import datetime as dt
+import numpy as np
+import os
+from dataclasses import dataclass
+
+# One fixed-width record per sample, 29 bytes packed. Missing readings are
+# stored as -1, and a missing charge schedule as NaT.
+RECORD = np.dtype(
+    [
+        ("time", "datetime64[s]"),
+        ("battery_level", "i1"),
+        ("estimated_range", "i2"),
+        ("hvac", "?"),
+        ("charge_from_grid", "?"),
+        ("schedule_start", "datetime64[s]"),
+        ("schedule_end", "datetime64[s]"),
+    ]
+)
+
+MISSING = -1
+SEGMENT_SUFFIX = ".bin"
+
+
+@dataclass(slots=True)
+class TelemetryRecord:
+    time: dt.datetime
+    battery_level: int | None
+    estimated_range: int | None
+    hvac: bool
+    charge_from_grid: bool
+    schedule_start: dt.datetime | None = None
+    schedule_end: dt.datetime | None = None
+
+    def to_bytes(self) -> bytes:
+        return np.array(
+            (
+                np.datetime64(self.time, "s"),
+                MISSING if self.battery_level is None else self.battery_level,
+                MISSING if self.estimated_range is None else self.estimated_range,
+                self.hvac,
+                self.charge_from_grid,
+                np.datetime64(self.schedule_start or "NaT", "s"),
+                np.datetime64(self.schedule_end or "NaT", "s"),
+            ),
+            dtype=RECORD,
+        ).tobytes()
+
+
+class TelemetryStore:
+    """
+    An append-only store of telemetry records, in one file per vehicle per
+    day. Segments are memory mapped for queries, so only the days asked for
+    are read and nothing is held in memory between queries. Records have to
+    be appended in time order.
+    """
+
+    def __init__(self, root: str):
+        self._root = root
+
+    def _segment(self, vehicle: str, day: dt.date) -> str:
+        return os.path.join(self._root, vehicle, day.isoformat() + SEGMENT_SUFFIX)
+
+    def append(self, vehicle: str, record: TelemetryRecord):
+        path = self._segment(vehicle, record.time.date())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "ab") as f:
+            # drop any partly written record left by a crash, which would
+            # otherwise misalign every record after it
+            size = f.seek(0, os.SEEK_END)
+            if size % RECORD.itemsize:
+                f.truncate(size - size % RECORD.itemsize)
+            f.write(record.to_bytes())
+
+    def vehicles(self) -> list[str]:
+        if not os.path.isdir(self._root):
+            return []
+        return sorted(
+            name
+            for name in os.listdir(self._root)
+            if os.path.isdir(os.path.join(self._root, name))
+        )
+
+    def days(self, vehicle: str) -> list[dt.date]:
+        directory = os.path.join(self._root, vehicle)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(
+            dt.date.fromisoformat(name.removesuffix(SEGMENT_SUFFIX))
+            for name in os.listdir(directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _map(self, vehicle: str, day: dt.date) -> np.ndarray | None:
+        path = self._segment(vehicle, day)
+        try:
+            # a partly written last record is ignored
+            count = os.path.getsize(path) // RECORD.itemsize
+        except FileNotFoundError:
+            return None
+        if count == 0:
+            return None
+        return np.memmap(path, dtype=RECORD, mode="r", shape=(count,))
+
+    def query(self, vehicle: str, start: dt.datetime, end: dt.datetime) -> np.ndarray:
+        """
+        The records of a vehicle with start <= time < end, as a structured
+        array with the fields of RECORD
+        """
+        start64, end64 = np.datetime64(start, "s"), np.datetime64(end, "s")
+        parts = []
+        day = start.date()
+        while day <= end.date():
+            segment = self._map(vehicle, day)
+            if segment is not None:
+                times = segment["time"]
+                lo = np.searchsorted(times, start64, side="left")
+                hi = np.searchsorted(times, end64, side="left")
+                if hi > lo:
+                    parts.append(np.array(segment[lo:hi]))
+            day += dt.timedelta(days=1)
+        if not parts:
+            return np.empty(0, dtype=RECORD)
+        return np.concatenate(parts)
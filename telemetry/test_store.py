@@ -0,0 +1,98 @@
+import datetime as dt
+import numpy as np
+import pytest
+from .store import RECORD, TelemetryRecord, TelemetryStore
+
+START = dt.datetime(2024, 7, 27, 22, 0)
+
+
+def sample(time: dt.datetime, battery_level: int = 50, **kwargs) -> TelemetryRecord:
+    return TelemetryRecord(
+        time=time,
+        battery_level=battery_level,
+        estimated_range=kwargs.get("estimated_range", 150),
+        hvac=kwargs.get("hvac", False),
+        charge_from_grid=kwargs.get("charge_from_grid", False),
+        schedule_start=kwargs.get("schedule_start"),
+        schedule_end=kwargs.get("schedule_end"),
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TelemetryStore(str(tmp_path))
+    # every 15 minutes for four hours, crossing midnight
+    for i in range(16):
+        store.append("zoe", sample(START + i * dt.timedelta(minutes=15), 40 + i))
+    return store
+
+
+def test_records_are_packed():
+    assert RECORD.itemsize == 29
+
+
+def test_query_spans_daily_segments(store):
+    records = store.query(
+        "zoe", START + dt.timedelta(hours=1), START + dt.timedelta(hours=3)
+    )
+    assert len(records) == 8
+    assert records["battery_level"].tolist() == list(range(44, 52))
+    assert records["time"][0] == np.datetime64("2024-07-27T23:00:00")
+    assert records["time"][-1] == np.datetime64("2024-07-28T00:45:00")
+    assert store.days("zoe") == [dt.date(2024, 7, 27), dt.date(2024, 7, 28)]
+
+
+def test_query_outside_the_data_is_empty(store):
+    assert len(store.query("zoe", START - dt.timedelta(days=2), START)) == 0
+    assert len(store.query("megane", START, START + dt.timedelta(days=1))) == 0
+
+
+def test_fields_round_trip(tmp_path):
+    store = TelemetryStore(str(tmp_path))
+    store.append(
+        "zoe",
+        sample(
+            START,
+            80,
+            estimated_range=240,
+            hvac=True,
+            charge_from_grid=True,
+            schedule_start=dt.datetime(2024, 7, 28, 0, 0),
+            schedule_end=dt.datetime(2024, 7, 28, 2, 30),
+        ),
+    )
+    store.append(
+        "zoe", TelemetryRecord(START + dt.timedelta(hours=1), None, None, False, False)
+    )
+    records = store.query("zoe", START, START + dt.timedelta(days=1))
+    first, second = records
+    assert (first["battery_level"], first["estimated_range"]) == (80, 240)
+    assert first["hvac"] and first["charge_from_grid"]
+    assert first["schedule_end"] - first["schedule_start"] == np.timedelta64(150, "m")
+    assert (second["battery_level"], second["estimated_range"]) == (-1, -1)
+    assert np.isnat(second["schedule_start"])
+
+
+def test_vehicles_are_stored_separately(tmp_path):
+    store = TelemetryStore(str(tmp_path))
+    store.append("zoe", sample(START, 50))
+    store.append("megane", sample(START, 70))
+    assert store.vehicles() == ["megane", "zoe"]
+    day = (START, START + dt.timedelta(days=1))
+    assert store.query("megane", *day)["battery_level"].tolist() == [70]
+
+
+def test_partly_written_record_is_ignored(store, tmp_path):
+    with open(tmp_path / "zoe" / "2024-07-28.bin", "ab") as f:
+        f.write(b"\x00" * 10)
+    records = store.query("zoe", START, START + dt.timedelta(days=1))
+    assert len(records) == 16
+
+
+def test_append_after_partly_written_record(store, tmp_path):
+    with open(tmp_path / "zoe" / "2024-07-28.bin", "ab") as f:
+        f.write(b"\x00" * 10)
+    store.append("zoe", sample(START + dt.timedelta(hours=4), 90))
+    records = store.query("zoe", START, START + dt.timedelta(days=1))
+    assert len(records) == 17
+    assert records["battery_level"][-1] == 90
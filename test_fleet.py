@@ -0,0 +1,42 @@
+import pytest
+from fleet import parse_fleet_config
+
+
+def car(name: str, **shadows) -> dict:
+    return {
+        "name": name,
+        "renault": {"username": "u", "password": "p", "registration": name},
+        "andersen": {"username": "u", "password": "p", "device_name": name},
+        **shadows,
+    }
+
+
+def test_cars_with_their_own_shadows():
+    fleet = parse_fleet_config(
+        {
+            "cars": [
+                car("zoe", heater_thing="zoe_heater", status_thing="zoe_status"),
+                car(
+                    "megane", heater_thing="megane_heater", status_thing="megane_status"
+                ),
+            ]
+        }
+    )
+    assert [c.status_thing for c in fleet.cars] == ["zoe_status", "megane_status"]
+
+
+@pytest.mark.parametrize(
+    "cars",
+    [
+        # both left with the default shadow names
+        [car("zoe"), car("megane")],
+        [
+            car("zoe", heater_thing="zoe_heater", status_thing="status"),
+            car("megane", heater_thing="megane_heater", status_thing="status"),
+        ],
+        [car("zoe", heater_thing="zoe", status_thing="zoe")],
+    ],
+)
+def test_shared_shadows_are_rejected(cars):
+    with pytest.raises(ValueError):
+        parse_fleet_config({"cars": cars})